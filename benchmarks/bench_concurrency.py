@@ -0,0 +1,160 @@
+"""
+Throughput de gunicorn con muchos clientes lentos segun la clase de worker.
+
+    python benchmarks/bench_concurrency.py --worker-class sync gthread gevent --slow-clients 16
+
+Para cada clase de worker se arranca `gunicorn wsgi` con la configuracion de gunicorn.conf.py.
+Durante `--duration` segundos, `--slow-clients` conexiones envian su peticion byte a byte, como
+un movil con mala cobertura, y ocupan lo que el worker les dedique mientras tanto. A la vez,
+`--fast-clients` hilos piden `--path` lo mas rapido que pueden. Se mide cuantas peticiones rapidas
+salen adelante y con que latencia.
+
+Con `--admission 0 1` se repite cada clase de worker sin y con control de admision (ver
+src/admission.py): los 503 que devuelve al saturarse se cuentan aparte como `shed`, y la latencia
+es la de las peticiones admitidas.
+"""
+import argparse
+import http.client
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, 'src')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from run import free_port, percentile  # noqa: E402
+
+
+def seed_database(database_url, catalog):
+    code = (
+        'import sys; sys.path[:0] = [%r, %r]\n'
+        'from app import app\n'
+        'from seed import seed\n'
+        'with app.app_context(): seed(10, %d, 5)\n'
+    ) % (SRC, os.path.dirname(os.path.abspath(__file__)), catalog)
+    subprocess.run([sys.executable, '-c', code], env=dict(os.environ, DATABASE_URL=database_url), check=True)
+
+
+def slow_client(port, path, stop, trickle_interval):
+    while not stop.is_set():
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=30) as sock:
+                sock.sendall(f'GET {path} HTTP/1.1\r\nHost: localhost\r\n'.encode())
+                for byte in b'X-Slow: ' + b'a' * 20:
+                    if stop.is_set():
+                        break
+                    sock.sendall(bytes([byte]))
+                    time.sleep(trickle_interval)
+                sock.sendall(b'\r\nConnection: close\r\n\r\n')
+                while sock.recv(65536):
+                    pass
+        except OSError:
+            time.sleep(0.05)
+
+
+def fast_client(port, path, stop, latencies, errors, shed):
+    while not stop.is_set():
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        started = time.perf_counter()
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            if response.status == 200:
+                latencies.append(time.perf_counter() - started)
+            elif response.status == 503 and response.getheader('Retry-After'):
+                shed.append(time.perf_counter() - started)
+            else:
+                errors.append(response.status)
+        except OSError as error:
+            errors.append(type(error).__name__)
+        finally:
+            connection.close()
+
+
+def run_worker_class(worker_class, database_url, args, admission='1'):
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=database_url, GUNICORN_WORKER_CLASS=worker_class,
+               WEB_CONCURRENCY=str(args.workers), GUNICORN_THREADS=str(args.threads), ADMISSION_CONTROL=admission)
+    command = ['gunicorn', 'wsgi', '--chdir', SRC, '--bind', f'127.0.0.1:{port}']
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + 30
+        while True:
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=1).read()
+                break
+            except OSError:
+                if server.poll() is not None or time.time() > deadline:
+                    raise RuntimeError(f'gunicorn ({worker_class}) no arranco')
+                time.sleep(0.2)
+
+        stop = threading.Event()
+        latencies, errors, shed = [], [], []
+        threads = [threading.Thread(target=slow_client, args=(port, args.path, stop, args.trickle_ms / 1000), daemon=True)
+                   for _ in range(args.slow_clients)]
+        threads += [threading.Thread(target=fast_client, args=(port, args.path, stop, latencies, errors, shed), daemon=True)
+                    for _ in range(args.fast_clients)]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join(timeout=5)
+
+        latencies.sort()
+        return {
+            'completed': len(latencies),
+            'errors': len(errors),
+            'shed': len(shed),
+            'shed_ms_p99': round(percentile(sorted(shed), 0.99) * 1000, 2) if shed else None,
+            'throughput_rps': round(len(latencies) / args.duration, 1),
+            'latency_ms': {
+                'p50': round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+                'p95': round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+                'p99': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+            },
+        }
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--worker-class', nargs='+', default=['sync', 'gthread'])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=16, help='hilos por worker con gthread')
+    parser.add_argument('--slow-clients', type=int, default=16)
+    parser.add_argument('--fast-clients', type=int, default=4)
+    parser.add_argument('--trickle-ms', type=int, default=100, help='pausa entre bytes de un cliente lento')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--catalog', type=int, default=200)
+    parser.add_argument('--path', default='/planets?limit=50')
+    parser.add_argument('--admission', nargs='+', default=['1'], choices=['0', '1'], help='ADMISSION_CONTROL de cada pasada')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    database_url = f'sqlite:///{os.path.join(tmpdir, "bench.db")}'
+    try:
+        seed_database(database_url, args.catalog)
+        results = {}
+        for worker_class in args.worker_class:
+            for admission in args.admission:
+                name = worker_class if len(args.admission) == 1 else f'{worker_class} admission={admission}'
+                results[name] = run_worker_class(worker_class, database_url, args, admission)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    print(json.dumps({'settings': vars(args), 'results': results}, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
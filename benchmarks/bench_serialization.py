@@ -0,0 +1,97 @@
+"""
+Compara el camino antiguo de los listados (objetos ORM + serialize() + json de la libreria
+estandar) con el actual (consulta proyectada a tuplas + FastJSONProvider/orjson).
+
+    python benchmarks/bench_serialization.py --rows 10000 100000
+
+Usa una base de datos SQLite temporal; imprime filas/s y pico de memoria (tracemalloc) en JSON.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'bench_serialization.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+from app import app  # noqa: E402
+from models import db, project, Planet  # noqa: E402
+from utils import FastJSONProvider, paginate_rows, orjson  # noqa: E402
+
+
+def seed(rows):
+    db.drop_all()
+    db.create_all()
+    batch = 5000
+    for start in range(0, rows, batch):
+        db.session.execute(insert(Planet), [
+            {'name': f'planet-{i}', 'population': i * 1000, 'climate': 'temperate'}
+            for i in range(start, min(start + batch, rows))
+        ])
+    db.session.commit()
+
+
+def orm_path():
+    body = {'planet': [planet.serialize() for planet in Planet.query.all()]}
+    return DefaultJSONProvider(app).response(body).get_data()
+
+
+def projection_path():
+    planets, _ = paginate_rows(project(Planet), Planet.id, Planet.serialize_columns, None, None)
+    return FastJSONProvider(app).response({'planet': planets}).get_data()
+
+
+def measure(fn, rows, repeat):
+    db.session.expunge_all()
+    fn()  # calentamiento
+    timings = []
+    for _ in range(repeat):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        size = len(fn())
+        timings.append(time.perf_counter() - started)
+    db.session.expunge_all()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    best = min(timings)
+    return {
+        'seconds': round(best, 4),
+        'rows_per_second': round(rows / best),
+        'peak_memory_mb': round(peak / 1024 / 1024, 2),
+        'bytes': size,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    results = {'orjson': orjson is not None, 'runs': []}
+    with app.app_context(), app.test_request_context():
+        for rows in args.rows:
+            seed(rows)
+            before = measure(orm_path, rows, args.repeat)
+            after = measure(projection_path, rows, args.repeat)
+            results['runs'].append({
+                'rows': rows,
+                'orm_serialize': before,
+                'projection_fast_json': after,
+                'speedup': round(before['seconds'] / after['seconds'], 2),
+            })
+    shutil.rmtree(os.path.dirname(DB_PATH), ignore_errors=True)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Arranque y memoria de la app con y sin Flask-Admin.
+
+    python benchmarks/bench_startup.py --runs 10 --workers 4
+
+Para cada valor de ENABLE_ADMIN:
+  - `import app` en un interprete nuevo, `--runs` veces: tiempo de importacion (mediana) y RSS maximo
+  - `gunicorn wsgi` con `--workers` procesos (y `--preload` si se pide): segundos hasta responder la
+    primera peticion y RSS de cada worker despues de atenderla (leido de /proc, solo Linux)
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, 'src')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from run import free_port  # noqa: E402
+
+IMPORT_PROBE = (
+    'import resource, sys, time, json\n'
+    'sys.path.insert(0, %r)\n'
+    'started = time.perf_counter()\n'
+    'import app\n'
+    'elapsed = time.perf_counter() - started\n'
+    'print(json.dumps({"seconds": elapsed, "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))\n'
+) % SRC
+
+
+def measure_import(env, runs):
+    seconds, rss = [], []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', IMPORT_PROBE], env=env, check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        seconds.append(result['seconds'])
+        rss.append(result['max_rss_kb'])
+    return {
+        'import_ms_median': round(statistics.median(seconds) * 1000, 1),
+        'import_ms_min': round(min(seconds) * 1000, 1),
+        'max_rss_mb_median': round(statistics.median(rss) / 1024, 1),
+    }
+
+
+def rss_kb(pid):
+    with open(f'/proc/{pid}/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def worker_pids(master_pid):
+    with open(f'/proc/{master_pid}/task/{master_pid}/children') as children:
+        return [int(pid) for pid in children.read().split()]
+
+
+def measure_gunicorn(env, workers, preload):
+    port = free_port()
+    command = ['gunicorn', 'wsgi', '--chdir', SRC, '--bind', f'127.0.0.1:{port}', '--workers', str(workers)]
+    if preload:
+        command.append('--preload')
+    started = time.perf_counter()
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + 60
+        while True:
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{port}/planets?limit=1', timeout=1).read()
+                break
+            except OSError:
+                if server.poll() is not None or time.time() > deadline:
+                    raise RuntimeError('gunicorn no arranco')
+                time.sleep(0.05)
+        ready = time.perf_counter() - started
+        # Cada worker atiende unas cuantas peticiones para que su RSS refleje un worker en uso
+        for _ in range(workers * 10):
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/planets?limit=50', timeout=5).read()
+        time.sleep(0.5)
+        workers_rss = [rss_kb(pid) / 1024 for pid in worker_pids(server.pid)]
+        return {
+            'first_response_s': round(ready, 3),
+            'master_rss_mb': round(rss_kb(server.pid) / 1024, 1),
+            'worker_rss_mb': [round(value, 1) for value in sorted(workers_rss)],
+            'worker_rss_mb_total': round(sum(workers_rss), 1),
+        }
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10, help='importaciones por configuracion')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--preload', action='store_true', help='arranca gunicorn con --preload')
+    parser.add_argument('--skip-gunicorn', action='store_true')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    database_url = f'sqlite:///{os.path.join(tmpdir, "bench.db")}'
+    results = {}
+    try:
+        seed = 'import sys; sys.path[:0] = [%r, %r]\nfrom app import app\nfrom seed import seed\nwith app.app_context(): seed(10, 200, 5)\n' % (
+            SRC, os.path.dirname(os.path.abspath(__file__)))
+        subprocess.run([sys.executable, '-c', seed], env=dict(os.environ, DATABASE_URL=database_url), check=True)
+        for enable_admin in ('1', '0'):
+            env = dict(os.environ, DATABASE_URL=database_url, ENABLE_ADMIN=enable_admin)
+            env.pop('FLASK_RUN_FROM_CLI', None)
+            result = measure_import(env, args.runs)
+            if not args.skip_gunicorn:
+                result.update(measure_gunicorn(env, args.workers, args.preload))
+            results[f'ENABLE_ADMIN={enable_admin}'] = result
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    print(json.dumps({'settings': vars(args), 'results': results}, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
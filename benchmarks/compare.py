@@ -0,0 +1,58 @@
+"""
+Compara dos informes de benchmarks/run.py escenario a escenario.
+
+    python benchmarks/compare.py before.json after.json [--threshold 10]
+
+Marca con ! los escenarios cuyo p95 o numero de sentencias SQL empeora mas que el umbral (%).
+"""
+import argparse
+import json
+
+
+def change(before, after):
+    if before in (None, 0) or after is None:
+        return None
+    return (after - before) / before * 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=10.0)
+    args = parser.parse_args()
+
+    with open(args.before) as source:
+        before = json.load(source)
+    with open(args.after) as source:
+        after = json.load(source)
+    print(f"{before['meta'].get('git_commit')} -> {after['meta'].get('git_commit')}")
+
+    regressions = 0
+    for mode, results in after['results'].items():
+        previous = before['results'].get(mode, {})
+        print(f'\n[{mode}]')
+        print(f"{'escenario':<28}{'p50 ms':>18}{'p95 ms':>18}{'rps':>16}{'sql/req':>14}")
+        for name, current in sorted(results.items()):
+            old = previous.get(name)
+            if old is None:
+                print(f'{name:<28}  (nuevo)')
+                continue
+            p95 = change(old['latency_ms']['p95'], current['latency_ms']['p95'])
+            sql = change(old.get('sql_statements_per_request'), current.get('sql_statements_per_request'))
+            worse = (p95 is not None and p95 > args.threshold) or (sql is not None and sql > args.threshold)
+            regressions += worse
+
+            def cell(key, group='latency_ms'):
+                old_value = old[group][key] if group else old.get(key)
+                new_value = current[group][key] if group else current.get(key)
+                delta = change(old_value, new_value)
+                return f"{new_value}" + (f" ({delta:+.0f}%)" if delta is not None else '')
+
+            print(f"{('! ' if worse else '  ') + name:<28}{cell('p50'):>18}{cell('p95'):>18}"
+                  f"{cell('throughput_rps', None):>16}{cell('sql_statements_per_request', None):>14}")
+    print(f'\n{regressions} escenario(s) empeoran mas de un {args.threshold:g}%')
+
+
+if __name__ == '__main__':
+    main()
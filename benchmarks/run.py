@@ -0,0 +1,237 @@
+"""
+Benchmark de todas las rutas de la API.
+
+    python benchmarks/run.py --mode testclient --catalog 10000 --requests 200 --output before.json
+    python benchmarks/run.py --mode gunicorn --workers 4 --concurrency 16 --output before.json
+    python benchmarks/compare.py before.json after.json
+
+Modos:
+  testclient  peticiones secuenciales con el test client de Flask; mide tambien cuantas
+              sentencias SQL ejecuta cada peticion.
+  gunicorn    arranca `gunicorn wsgi` con varios workers y lo ataca con `--concurrency` hilos.
+
+Por defecto siembra una base de datos SQLite temporal. Con --database-url se puede usar un
+Postgres local, pero ten en cuenta que se BORRAN y recrean todas las tablas.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, 'src')
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, statuses, wall_seconds, statements=None):
+    latencies = sorted(latencies)
+    status_counts = {}
+    for status in statuses:
+        status_counts[str(status)] = status_counts.get(str(status), 0) + 1
+    result = {
+        'requests': len(latencies),
+        'errors': sum(1 for status in statuses if not isinstance(status, int) or status >= 500),
+        'status_counts': status_counts,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50) * 1000, 3),
+            'p95': round(percentile(latencies, 0.95) * 1000, 3),
+            'p99': round(percentile(latencies, 0.99) * 1000, 3),
+            'mean': round(sum(latencies) / len(latencies) * 1000, 3),
+            'max': round(latencies[-1] * 1000, 3),
+        },
+        'throughput_rps': round(len(latencies) / wall_seconds, 1) if wall_seconds > 0 else None,
+    }
+    if statements is not None:
+        result['sql_statements_per_request'] = round(sum(statements) / len(statements), 2)
+        result['sql_statements_max'] = max(statements)
+    return result
+
+
+def run_testclient(app, db, scenarios, ctx, requests):
+    from sqlalchemy import event
+
+    counter = {'statements': 0}
+
+    def count(*args):
+        counter['statements'] += 1
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    client = app.test_client()
+    results = {}
+    try:
+        for name, _, make_request in scenarios:
+            latencies, statuses, statements = [], [], []
+            started = time.perf_counter()
+            for i in range(requests):
+                method, path, body, *headers = make_request(i, ctx)
+                counter['statements'] = 0
+                request_started = time.perf_counter()
+                response = client.open(path, method=method, json=body, headers=headers[0] if headers else None)
+                response.get_data()
+                latencies.append(time.perf_counter() - request_started)
+                statuses.append(response.status_code)
+                statements.append(counter['statements'])
+            results[name] = summarize(latencies, statuses, time.perf_counter() - started, statements)
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    return results
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def http_request(base_url, method, path, body, headers=None):
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(base_url + path, data=data, method=method, headers=headers or {})
+    if data is not None:
+        request.add_header('Content-Type', 'application/json')
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as error:
+        error.read()
+        status = error.code
+    except (urllib.error.URLError, OSError) as error:
+        status = type(error).__name__
+    return time.perf_counter() - started, status
+
+
+def run_gunicorn(database_url, scenarios, ctx, requests, workers, concurrency, worker_args):
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    env = dict(os.environ, DATABASE_URL=database_url)
+    command = ['gunicorn', 'wsgi', '--chdir', SRC, '--workers', str(workers), '--bind', f'127.0.0.1:{port}'] + worker_args
+    server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        deadline = time.time() + 30
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError('gunicorn no arranco:\n' + server.stderr.read().decode())
+            try:
+                urllib.request.urlopen(base_url + '/', timeout=1).read()
+                break
+            except (urllib.error.URLError, OSError):
+                if time.time() > deadline:
+                    raise RuntimeError('gunicorn no respondio en 30 segundos')
+                time.sleep(0.2)
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for name, _, make_request in scenarios:
+                started = time.perf_counter()
+                outcomes = list(pool.map(lambda i: http_request(base_url, *make_request(i, ctx)), range(requests)))
+                wall = time.perf_counter() - started
+                results[name] = summarize([latency for latency, _ in outcomes], [status for _, status in outcomes], wall)
+        return results
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=('testclient', 'gunicorn', 'both'), default='testclient')
+    parser.add_argument('--database-url', help='por defecto, un SQLite temporal (las tablas se borran)')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--catalog', type=int, default=5000, help='filas de cada entidad del catalogo')
+    parser.add_argument('--favorites', type=int, default=20, help='favoritos por usuario y tipo')
+    parser.add_argument('--requests', type=int, default=100, help='peticiones por escenario')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--worker-arg', action='append', default=[], help='argumento extra para gunicorn (repetible)')
+    parser.add_argument('--only', nargs='+', help='nombres de escenario a ejecutar')
+    parser.add_argument('--output', help='fichero JSON de resultados (por defecto, stdout)')
+    args = parser.parse_args()
+
+    tmpdir = None
+    database_url = args.database_url
+    if database_url is None:
+        tmpdir = tempfile.mkdtemp()
+        database_url = f'sqlite:///{os.path.join(tmpdir, "bench.db")}'
+    os.environ['DATABASE_URL'] = database_url
+    sys.path.insert(0, SRC)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    from app import app
+    from models import db
+    from scenarios import SCENARIOS
+    from seed import seed
+
+    scenarios = [scenario for scenario in SCENARIOS
+                 if (not args.only or scenario[0] in args.only) and scenario[1] in app.view_functions]
+    covered = {endpoint for _, endpoint, _ in SCENARIOS}
+    uncovered = sorted(
+        rule.rule for rule in app.url_map.iter_rules()
+        if rule.endpoint not in covered and rule.endpoint != 'static' and not rule.rule.startswith('/admin')
+    )
+    # Cada modo borra filas reservadas: hacen falta al menos `requests` por entidad
+    reserve = args.requests
+
+    report = {
+        'meta': {
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'database': database_url.split('://')[0],
+            'requests_per_scenario': args.requests,
+        },
+        'uncovered_routes': uncovered,
+        'results': {},
+    }
+    try:
+        modes = ('testclient', 'gunicorn') if args.mode == 'both' else (args.mode,)
+        for mode in modes:
+            with app.app_context():
+                ctx = seed(args.users, args.catalog + reserve, args.favorites, reserve=reserve)
+                db.session.remove()
+            report['meta']['volumes'] = ctx
+            if mode == 'testclient':
+                report['results'][mode] = run_testclient(app, db, scenarios, ctx, args.requests)
+            else:
+                with app.app_context():
+                    db.engine.dispose()
+                report['meta']['workers'] = args.workers
+                report['meta']['concurrency'] = args.concurrency
+                report['results'][mode] = run_gunicorn(database_url, scenarios, ctx, args.requests, args.workers, args.concurrency, args.worker_arg)
+    finally:
+        if tmpdir is not None:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as target:
+            target.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
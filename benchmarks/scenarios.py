@@ -0,0 +1,88 @@
+"""
+Un escenario por ruta de la API. Cada escenario es una funcion `(i, ctx) -> (metodo, ruta, json)`
+que genera la peticion numero `i`; `ctx` trae los volumenes sembrados (ver seed.py). Puede devolver
+un cuarto elemento con cabeceras extra.
+Las peticiones son deterministas para que dos ejecuciones sobre commits distintos sean comparables.
+"""
+
+
+def user_id(i, ctx):
+    return i % ctx['users'] + 1
+
+
+def entity_id(i, ctx):
+    # Solo ids que pueden ser favoritos; los reservados se dejan para los escenarios de borrado
+    favoritable = ctx['catalog'] - ctx['reserve']
+    return (i * 7919) % favoritable + 1
+
+
+def reserved_id(i, ctx):
+    return ctx['catalog'] - (i % ctx['reserve'])
+
+
+def batch_operations(i, ctx):
+    return {'operations': [
+        {'op': 'add' if n % 2 == 0 else 'remove', 'type': ('character', 'planet', 'starship')[n % 3], 'id': entity_id(i * 20 + n, ctx)}
+        for n in range(20)
+    ]}
+
+
+def import_records(i, ctx):
+    return [{'name': f'bench-import-{i}-{n}', 'population': n, 'climate': 'arid'} for n in range(100)]
+
+
+# (nombre, endpoint de Flask que cubre, generador de la peticion)
+SCENARIOS = [
+    ('sitemap', 'sitemap', lambda i, ctx: ('GET', '/', None)),
+    ('cache_stats', 'cache_stats', lambda i, ctx: ('GET', '/cache/stats', None)),
+    ('metrics', 'prometheus_metrics', lambda i, ctx: ('GET', '/metrics', None)),
+    ('users', 'handle_hello', lambda i, ctx: ('GET', '/users', None)),
+    ('users_page', 'handle_hello', lambda i, ctx: ('GET', '/users?limit=100', None)),
+    ('add_user', 'add_user', lambda i, ctx: ('POST', '/user', {'email': f'bench-{i}@example.com', 'password': 'secret'})),
+    ('user_favorites', 'get_favorites', lambda i, ctx: ('GET', f'/user_favorites/{user_id(i, ctx)}', None)),
+
+    ('add_favorite_character', 'add_favorite_character', lambda i, ctx: ('POST', f'/user/{user_id(i, ctx)}/favorite/character/{entity_id(i, ctx)}', None)),
+    ('delete_favorite_character', 'delete_favorite_character', lambda i, ctx: ('DELETE', f'/user/{user_id(i, ctx)}/favorite/character/{entity_id(i, ctx)}', None)),
+    ('add_favorite_planet', 'add_favorite_planet', lambda i, ctx: ('POST', f'/user/{user_id(i, ctx)}/favorite/planet/{entity_id(i, ctx)}', None)),
+    ('delete_favorite_planet', 'delete_favorite_planet', lambda i, ctx: ('DELETE', f'/user/{user_id(i, ctx)}/favorite/planet/{entity_id(i, ctx)}', None)),
+    ('add_favorite_starship', 'add_favorite_starship', lambda i, ctx: ('POST', f'/user/{user_id(i, ctx)}/favorite/starship/{entity_id(i, ctx)}', None)),
+    ('delete_favorite_starship', 'delete_favorite_starship', lambda i, ctx: ('DELETE', f'/user/{user_id(i, ctx)}/favorite/starship/{entity_id(i, ctx)}', None)),
+    ('batch_favorites', 'batch_favorites', lambda i, ctx: ('POST', f'/user/{user_id(i, ctx)}/favorites:batch', batch_operations(i, ctx))),
+
+    ('characters', 'all_characters', lambda i, ctx: ('GET', '/characters', None)),
+    ('characters_page', 'all_characters', lambda i, ctx: ('GET', '/characters?limit=100', None)),
+    ('planets', 'all_planets', lambda i, ctx: ('GET', '/planets', None)),
+    ('planets_gzip', 'all_planets', lambda i, ctx: ('GET', '/planets', None, {'Accept-Encoding': 'gzip'})),
+    ('planets_stream', 'all_planets', lambda i, ctx: ('GET', '/planets?stream=1', None)),
+    ('starships', 'all_starships', lambda i, ctx: ('GET', '/starships', None)),
+    ('characters_filtered', 'all_characters', lambda i, ctx: ('GET', '/characters?height__gte=150&sort=-height&fields=name,height&limit=50', None)),
+    ('planets_filtered', 'all_planets', lambda i, ctx: ('GET', '/planets?climate=arid&fields=name&limit=50', None)),
+    ('starships_prefix', 'all_starships', lambda i, ctx: ('GET', '/starships?name__prefix=s&sort=name&fields=name,model&limit=50', None)),
+    ('search', 'search', lambda i, ctx: ('GET', f'/search?q=starship {entity_id(i, ctx)}', None)),
+    ('search_typeahead', 'search', lambda i, ctx: ('GET', f'/search?q=planet {i % 1000}&limit=20', None)),
+    ('search_all_prefix', 'search', lambda i, ctx: ('GET', f'/search?q=chara {i % 1000}&type=character', None)),
+    ('popular', 'popular_entities', lambda i, ctx: ('GET', f"/popular/{('character', 'planet', 'starship')[i % 3]}?limit=20", None)),
+
+    ('get_character', 'get_character', lambda i, ctx: ('GET', f'/character/{entity_id(i % 50, ctx)}', None)),
+    ('get_planet', 'get_planet', lambda i, ctx: ('GET', f'/planet/{entity_id(i, ctx)}', None)),
+    ('get_starship', 'get_starship', lambda i, ctx: ('GET', f'/starship/{entity_id(i % 50, ctx)}', None)),
+
+    ('add_character', 'add_character', lambda i, ctx: ('POST', '/character', {'name': f'bench-character-{i}', 'height': 170, 'weigth': 70})),
+    ('add_planet', 'add_planet', lambda i, ctx: ('POST', '/planet', {'name': f'bench-planet-{i}', 'population': 10, 'climate': 'arid'})),
+    ('add_starship', 'add_starship', lambda i, ctx: ('POST', '/starship', {'name': f'bench-starship-{i}', 'model': 'x', 'manufacturer': 'y'})),
+    ('update_character', 'update_character', lambda i, ctx: ('PUT', f'/character/{entity_id(i, ctx)}', {'height': 100 + i % 100})),
+    ('update_planet', 'update_planet', lambda i, ctx: ('PUT', f'/planet/{entity_id(i, ctx)}', {'population': i})),
+    ('update_starship', 'update_starship', lambda i, ctx: ('PUT', f'/starship/{entity_id(i, ctx)}', {'model': f'model-{i}'})),
+    ('delete_character', 'delete_character', lambda i, ctx: ('DELETE', f'/character/{reserved_id(i, ctx)}', None)),
+    ('delete_planet', 'delete_planet', lambda i, ctx: ('DELETE', f'/planet/{reserved_id(i, ctx)}', None)),
+    ('delete_starship', 'delete_starship', lambda i, ctx: ('DELETE', f'/starship/{reserved_id(i, ctx)}', None)),
+
+    ('changes', 'get_changes', lambda i, ctx: ('GET', '/changes?limit=100', None)),
+    ('bulk_import', 'bulk_import', lambda i, ctx: ('POST', '/import/planet', import_records(i, ctx))),
+
+    # Listados de Flask-Admin (solo con ENABLE_ADMIN=1): paginas consecutivas, como quien recorre la tabla
+    ('admin_users', 'user.index_view', lambda i, ctx: ('GET', f'/admin/user/?page={i % 10}', None)),
+    ('admin_characters', 'character.index_view', lambda i, ctx: ('GET', f'/admin/character/?page={i % 10}', None)),
+    ('admin_favorite_characters', 'favoritecharacter.index_view', lambda i, ctx: ('GET', f'/admin/favoritecharacter/?page={i % 10}', None)),
+    ('admin_favorite_planets_sorted', 'favoriteplanet.index_view', lambda i, ctx: ('GET', f'/admin/favoriteplanet/?page={i % 3}&sort=0', None)),
+]
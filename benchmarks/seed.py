@@ -0,0 +1,44 @@
+"""
+Llena la base de datos configurada en DATABASE_URL con volumenes controlados para los benchmarks.
+Borra y vuelve a crear todas las tablas: no lo apuntes a una base de datos con datos reales.
+"""
+import random
+from sqlalchemy import insert
+from popularity import FAVORITE_COUNTERS, recount_favorite_counts
+from models import db, User, Character, Planet, Starship, FavoriteCharacter, FavoritePlanet, FavoriteStarship
+
+BATCH = 5000
+
+
+def insert_rows(model, rows):
+    for start in range(0, len(rows), BATCH):
+        db.session.execute(insert(model), rows[start:start + BATCH])
+
+
+def seed(users, catalog, favorites, reserve=0, seed_value=42):
+    """
+    Crea `users` usuarios, `catalog` filas de cada entidad del catalogo y `favorites` favoritos por
+    usuario y tipo. Los ultimos `reserve` ids de cada entidad no se marcan como favoritos, para que
+    los escenarios de borrado puedan eliminarlos sin violar claves foraneas.
+    """
+    rng = random.Random(seed_value)
+    db.drop_all()
+    db.create_all()
+
+    insert_rows(User, [{'email': f'user{i}@example.com', 'password': 'secret', 'is_active': True} for i in range(users)])
+    insert_rows(Character, [{'name': f'character-{i}', 'height': 150 + i % 80, 'weigth': 50 + i % 70} for i in range(catalog)])
+    insert_rows(Planet, [{'name': f'planet-{i}', 'population': i * 1000, 'climate': ('arid', 'temperate', 'frozen')[i % 3]} for i in range(catalog)])
+    insert_rows(Starship, [{'name': f'starship-{i}', 'model': f'model-{i % 50}', 'manufacturer': f'maker-{i % 20}'} for i in range(catalog)])
+
+    favoritable = max(catalog - reserve, 0)
+    per_user = min(favorites, favoritable)
+    for model, column in ((FavoriteCharacter, 'character_id'), (FavoritePlanet, 'planet_id'), (FavoriteStarship, 'starship_id')):
+        rows = []
+        for user_id in range(1, users + 1):
+            for entity_id in rng.sample(range(1, favoritable + 1), per_user):
+                rows.append({'user_id': user_id, column: entity_id})
+        insert_rows(model, rows)
+    for entity in FAVORITE_COUNTERS:
+        recount_favorite_counts(entity)
+    db.session.commit()
+    return {'users': users, 'catalog': catalog, 'favorites_per_user': per_user, 'reserve': reserve}
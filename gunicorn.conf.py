@@ -0,0 +1,51 @@
+"""
+Configuracion de gunicorn. Se carga automaticamente al lanzar `gunicorn` desde la raiz del repo
+(Procfile, render.yaml), y todo se controla con variables de entorno:
+
+  WEB_CONCURRENCY              procesos worker (gunicorn la lee por su cuenta; por defecto 1)
+  GUNICORN_WORKER_CLASS        sync (por defecto), gthread o gevent
+  GUNICORN_THREADS             hilos por worker con gthread (por defecto 4 con gthread, 1 si no)
+  GUNICORN_WORKER_CONNECTIONS  conexiones concurrentes por worker con gevent (por defecto 100)
+  GUNICORN_TIMEOUT             segundos antes de reiniciar un worker bloqueado (por defecto 30)
+  GUNICORN_PRELOAD             1 importa la app una vez en el master y los workers la heredan con
+                               fork (arranque mas rapido y memoria compartida); por defecto 0
+  ENABLE_ADMIN                 1 carga Flask-Admin (o arrancar `gunicorn wsgi_admin`); por defecto 0 y la API no lo importa
+
+Con `sync` cada consulta lenta bloquea un worker entero. `gthread` atiende varias peticiones por
+worker con hilos y es el modo recomendado: la sesion de SQLAlchemy es por hilo y los caches del
+proceso usan locks. `gevent` sirve miles de conexiones lentas por worker; necesita `gevent` y,
+con Postgres, `psycogreen` para que psycopg2 ceda el control mientras espera a la base de datos.
+
+El pool de conexiones (src/database.py) se dimensiona a partir de GUNICORN_THREADS, asi que cada
+modo obtiene tantas conexiones como peticiones puede tener en vuelo. Los limites del control de
+admision (src/admission.py) se derivan del mismo numero.
+"""
+import os
+
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'sync')
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+# Los engines no abren conexiones al importar la app, asi que ningun socket se comparte tras el fork
+preload_app = os.getenv('GUNICORN_PRELOAD', '0') == '1'
+
+if worker_class == 'gthread':
+    threads = int(os.getenv('GUNICORN_THREADS', 4))
+    os.environ.setdefault('GUNICORN_THREADS', str(threads))
+elif worker_class == 'gevent':
+    worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 100))
+    # Con gevent las peticiones en vuelo no las limita un numero de hilos: el pool decide
+    # cuantas consultas concurrentes llegan a la base de datos y el resto espera su turno
+    os.environ.setdefault('DB_POOL_SIZE', '10')
+    os.environ.setdefault('DB_MAX_OVERFLOW', '10')
+    # El control de admision (src/admission.py) encola por encima de lo que admite el pool
+    os.environ.setdefault('ADMISSION_CONCURRENCY', str(int(os.environ['DB_POOL_SIZE']) + int(os.environ['DB_MAX_OVERFLOW'])))
+
+
+def post_fork(server, worker):
+    if worker_class != 'gevent':
+        return
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        server.log.warning('psycogreen no esta instalado: las consultas a Postgres bloquearan el worker gevent')
+        return
+    patch_psycopg()
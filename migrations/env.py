@@ -80,6 +80,13 @@ def run_migrations_online():
     connectable = current_app.extensions['migrate'].db.get_engine()
 
     with connectable.connect() as connection:
+        # SQLite: batch_alter_table reconstruye la tabla (DROP + RENAME) y con las claves foraneas
+        # activas (database._configure_sqlite) el DROP de una tabla referenciada falla a medias
+        sqlite = connection.dialect.name == 'sqlite'
+        if sqlite:
+            connection.exec_driver_sql('PRAGMA foreign_keys=OFF')
+            # cierra la transaccion implicita para que alembic abra y confirme la suya
+            connection.commit()
         context.configure(
             connection=connection,
             target_metadata=get_metadata(),
@@ -87,8 +94,14 @@ def run_migrations_online():
             **current_app.extensions['migrate'].configure_args
         )
 
-        with context.begin_transaction():
-            context.run_migrations()
+        try:
+            with context.begin_transaction():
+                context.run_migrations()
+        finally:
+            # la conexion vuelve al pool: que no se quede sin validar claves foraneas
+            if sqlite:
+                connection.exec_driver_sql('PRAGMA foreign_keys=ON')
+                connection.commit()
 
 
 if context.is_offline_mode():
@@ -0,0 +1,54 @@
+"""timestamps and deleted records
+
+Revision ID: 1f6857022a69
+Revises: efdf76946671
+Create Date: 2026-10-18 10:02:54.118390
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1f6857022a69'
+down_revision = 'efdf76946671'
+branch_labels = None
+depends_on = None
+
+TABLES = ('characters', 'planets', 'starships', 'favorite_characters', 'favorite_planets', 'favorite_starships')
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table in TABLES:
+        # SQLite can't add a column with a non-constant default: add it nullable, backfill, then tighten.
+        # SQLite DDL isn't transactional, so skip the columns a previous failed run already added
+        existing = {column['name'] for column in inspector.get_columns(table)}
+        for column in ('created_at', 'updated_at'):
+            if column not in existing:
+                op.add_column(table, sa.Column(column, sa.DateTime(), nullable=True))
+        op.execute(f'UPDATE {table} SET created_at = COALESCE(created_at, CURRENT_TIMESTAMP), '
+                   f'updated_at = COALESCE(updated_at, CURRENT_TIMESTAMP)')
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False)
+            batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+        op.create_index(f'ix_{table}_updated_at', table, ['updated_at'], unique=False)
+
+    op.create_table('deleted_records',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('entity', sa.String(length=20), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_deleted_records_deleted_at', 'deleted_records', ['deleted_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_deleted_records_deleted_at', table_name='deleted_records')
+    op.drop_table('deleted_records')
+    for table in reversed(TABLES):
+        op.drop_index(f'ix_{table}_updated_at', table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('updated_at')
+            batch_op.drop_column('created_at')
@@ -0,0 +1,64 @@
+"""catalog search index
+
+Revision ID: 4b8d2f6a9e13
+Revises: 7c3e91b05d2a
+Create Date: 2026-10-18 17:21:40.118604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b8d2f6a9e13'
+down_revision = '7c3e91b05d2a'
+branch_labels = None
+depends_on = None
+
+# (table, code): on SQLite the FTS rowid is id * 4 + code
+SOURCES = (('characters', 1), ('planets', 2), ('starships', 3))
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE catalog_search USING fts5(name, tokenize='unicode61 remove_diacritics 2', prefix='2 3')")
+        for table, code in SOURCES:
+            op.execute(
+                f'CREATE TRIGGER {table}_search_insert AFTER INSERT ON {table} BEGIN '
+                f'INSERT INTO catalog_search(rowid, name) VALUES (new.id * 4 + {code}, new.name); END'
+            )
+            op.execute(
+                f'CREATE TRIGGER {table}_search_update AFTER UPDATE OF id, name ON {table} BEGIN '
+                f'DELETE FROM catalog_search WHERE rowid = old.id * 4 + {code}; '
+                f'INSERT INTO catalog_search(rowid, name) VALUES (new.id * 4 + {code}, new.name); END'
+            )
+            op.execute(
+                f'CREATE TRIGGER {table}_search_delete AFTER DELETE ON {table} BEGIN '
+                f'DELETE FROM catalog_search WHERE rowid = old.id * 4 + {code}; END'
+            )
+            op.execute(f'INSERT INTO catalog_search(rowid, name) SELECT id * 4 + {code}, name FROM {table}')
+    elif dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for table, code in SOURCES:
+            op.execute(
+                f"ALTER TABLE {table} ADD COLUMN search_vector tsvector "
+                f"GENERATED ALWAYS AS (to_tsvector('simple', coalesce(name, ''))) STORED"
+            )
+            op.execute(f'CREATE INDEX ix_{table}_search_vector ON {table} USING gin (search_vector)')
+            op.execute(f'CREATE INDEX ix_{table}_name_trgm ON {table} USING gin (name gin_trgm_ops)')
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for table, code in SOURCES:
+            op.execute(f'DROP TRIGGER IF EXISTS {table}_search_delete')
+            op.execute(f'DROP TRIGGER IF EXISTS {table}_search_update')
+            op.execute(f'DROP TRIGGER IF EXISTS {table}_search_insert')
+        op.execute('DROP TABLE IF EXISTS catalog_search')
+    elif dialect == 'postgresql':
+        for table, code in SOURCES:
+            op.execute(f'DROP INDEX IF EXISTS ix_{table}_name_trgm')
+            op.execute(f'DROP INDEX IF EXISTS ix_{table}_search_vector')
+            op.execute(f'ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector')
@@ -0,0 +1,40 @@
+"""catalog filter indexes
+
+Revision ID: 7c3e91b05d2a
+Revises: 1f6857022a69
+Create Date: 2026-10-18 16:58:04.715320
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c3e91b05d2a'
+down_revision = '1f6857022a69'
+branch_labels = None
+depends_on = None
+
+
+def weight_column():
+    # the model maps `weigth` but the first migration created `weight`; index whichever exists
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('characters')}
+    return 'weigth' if 'weigth' in columns else 'weight'
+
+
+def upgrade():
+    op.create_index('ix_characters_height_id', 'characters', ['height', 'id'], unique=False)
+    op.create_index('ix_characters_weigth_id', 'characters', [weight_column(), 'id'], unique=False)
+    op.create_index('ix_planets_population_id', 'planets', ['population', 'id'], unique=False)
+    op.create_index('ix_planets_climate_id', 'planets', ['climate', 'id'], unique=False)
+    op.create_index('ix_starships_model_id', 'starships', ['model', 'id'], unique=False)
+    op.create_index('ix_starships_manufacturer_id', 'starships', ['manufacturer', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_starships_manufacturer_id', table_name='starships')
+    op.drop_index('ix_starships_model_id', table_name='starships')
+    op.drop_index('ix_planets_climate_id', table_name='planets')
+    op.drop_index('ix_planets_population_id', table_name='planets')
+    op.drop_index('ix_characters_weigth_id', table_name='characters')
+    op.drop_index('ix_characters_height_id', table_name='characters')
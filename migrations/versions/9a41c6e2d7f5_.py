@@ -0,0 +1,40 @@
+"""favorite counters
+
+Revision ID: 9a41c6e2d7f5
+Revises: 4b8d2f6a9e13
+Create Date: 2026-10-18 17:54:12.903318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a41c6e2d7f5'
+down_revision = '4b8d2f6a9e13'
+branch_labels = None
+depends_on = None
+
+# (table, favorites table, column pointing at the table)
+COUNTERS = (
+    ('characters', 'favorite_characters', 'character_id'),
+    ('planets', 'favorite_planets', 'planet_id'),
+    ('starships', 'favorite_starships', 'starship_id'),
+)
+
+
+def upgrade():
+    for table, favorites, column in COUNTERS:
+        op.add_column(table, sa.Column('favorite_count', sa.Integer(), server_default='0', nullable=False))
+        op.execute(
+            f'UPDATE {table} SET favorite_count = '
+            f'(SELECT COUNT(*) FROM {favorites} WHERE {favorites}.{column} = {table}.id)'
+        )
+        op.create_index(f'ix_{table}_favorite_count_id', table, ['favorite_count', 'id'], unique=False)
+
+
+def downgrade():
+    for table, favorites, column in reversed(COUNTERS):
+        op.drop_index(f'ix_{table}_favorite_count_id', table_name=table)
+        # plain DROP COLUMN (SQLite >= 3.35): a batch table rebuild would drop the search triggers
+        op.drop_column(table, 'favorite_count')
@@ -0,0 +1,43 @@
+"""favorite composite indexes
+
+Revision ID: efdf76946671
+Revises: 2df9a34d97a6
+Create Date: 2026-10-18 09:12:31.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'efdf76946671'
+down_revision = '2df9a34d97a6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the unique indexes can't be built while duplicated favorites exist, keep the oldest row
+    for table, column in (('favorite_characters', 'character_id'),
+                          ('favorite_planets', 'planet_id'),
+                          ('favorite_starships', 'starship_id')):
+        op.execute(
+            f'DELETE FROM {table} WHERE id NOT IN '
+            f'(SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM {table} GROUP BY user_id, {column}) AS keep)'
+        )
+
+    op.create_index('uq_favorite_characters_user_character', 'favorite_characters', ['user_id', 'character_id'], unique=True)
+    op.create_index('ix_favorite_characters_character_id', 'favorite_characters', ['character_id'], unique=False)
+    op.create_index('uq_favorite_planets_user_planet', 'favorite_planets', ['user_id', 'planet_id'], unique=True)
+    op.create_index('ix_favorite_planets_planet_id', 'favorite_planets', ['planet_id'], unique=False)
+    op.create_index('uq_favorite_starships_user_starship', 'favorite_starships', ['user_id', 'starship_id'], unique=True)
+    op.create_index('ix_favorite_starships_starship_id', 'favorite_starships', ['starship_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_favorite_starships_starship_id', table_name='favorite_starships')
+    op.drop_index('uq_favorite_starships_user_starship', table_name='favorite_starships')
+    op.drop_index('ix_favorite_planets_planet_id', table_name='favorite_planets')
+    op.drop_index('uq_favorite_planets_user_planet', table_name='favorite_planets')
+    op.drop_index('ix_favorite_characters_character_id', table_name='favorite_characters')
+    op.drop_index('uq_favorite_characters_user_character', table_name='favorite_characters')
@@ -1,55 +1,201 @@
 import os
-from flask_admin import Admin
+import threading
+from collections import OrderedDict
+from flask_admin import Admin, BaseView, expose
+from sqlalchemy import func, select, literal, union_all, text
+from sqlalchemy.orm import joinedload
 from models import db, User, Character, FavoriteCharacter, Planet, FavoritePlanet, Starship, FavoriteStarship
 from flask_admin.contrib.sqla import ModelView
+from database import env_int
+
+# Por encima de estas filas el listado no cuenta exacto: en Postgres usa la estimacion de pg_class
+# y con busqueda o filtros deja de mostrar el total (paginador simple anterior / siguiente)
+ADMIN_EXACT_COUNT_LIMIT = env_int('ADMIN_EXACT_COUNT_LIMIT', 100000)
+# Ultimo id visto por pagina, para servir la siguiente por rango de id en lugar de OFFSET. Se guarda
+# por version de la tabla: tras un alta o un borrado los limites viejos dejan de usarse
+ADMIN_PAGE_BOUNDS = 1024
+
+
+class ScalableModelView(ModelView):
+    """
+    ModelView para tablas grandes: ordena por id descendente, pagina por keyset cuando se recorre
+    el listado pagina a pagina y no hace COUNT(*) exacto de toda la tabla.
+    """
+    column_default_sort = ('id', True)
+
+    def __init__(self, *args, data_version=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # funcion que devuelve la version actual de los datos del modelo
+        self.data_version = data_version or (lambda: None)
+        self.page_bounds = OrderedDict()
+        self.bounds_lock = threading.Lock()
+
+    def get_list(self, page, sort_column, sort_desc, search, filters, execute=True, page_size=None):
+        # Mismos pasos que ModelView.get_list, pero el conteo y la paginacion salen de aqui
+        joins = {}
+        query = self.get_query()
+        narrowed = False
+        if self._search_supported and search:
+            query, _, joins, _ = self._apply_search(query, None, joins, {}, search)
+            narrowed = True
+        if filters and self._filters:
+            query, _, joins, _ = self._apply_filters(query, None, joins, {}, filters)
+            narrowed = True
+        count = self.count_rows(query, narrowed)
+
+        for relation in self._auto_joins:
+            query = query.options(joinedload(relation))
+        query, joins = self._apply_sorting(query, joins, sort_column, sort_desc)
+
+        if page_size is None:
+            page_size = self.page_size
+        # Solo se puede seguir por id si el orden es exactamente ese
+        descending = True if sort_column is None else sort_desc
+        bound_key = (self.data_version(), sort_column, descending, search, tuple(filters or ()), page_size)
+        keyset = sort_column in (None, 'id')
+        bound = self.page_bound(bound_key + (page,)) if keyset and page else None
+        if bound is not None:
+            query = query.filter(self.model.id < bound if descending else self.model.id > bound).limit(page_size)
+        else:
+            query = self._apply_pagination(query, page, page_size)
+
+        if not execute:
+            return count, query
+        rows = query.all()
+        if keyset and page_size and len(rows) == page_size:
+            self.remember_bound(bound_key + ((page or 0) + 1,), rows[-1].id)
+        self.annotate(rows)
+        return count, rows
+
+    def count_rows(self, query, narrowed):
+        if not narrowed and self.session.get_bind().dialect.name == 'postgresql':
+            estimate = self.session.execute(
+                text('SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)'),
+                {'table': self.model.__table__.name},
+            ).scalar()
+            # -1 o 0 si la tabla aun no se ha analizado
+            if estimate is not None and estimate > ADMIN_EXACT_COUNT_LIMIT:
+                return estimate
+        # Cuenta como mucho ADMIN_EXACT_COUNT_LIMIT + 1 ids: si los hay, el total no se muestra
+        ids = query.with_entities(self.model.id).order_by(None).limit(ADMIN_EXACT_COUNT_LIMIT + 1).subquery()
+        count = self.session.execute(select(func.count()).select_from(ids)).scalar()
+        return count if count <= ADMIN_EXACT_COUNT_LIMIT else None
+
+    def page_bound(self, key):
+        with self.bounds_lock:
+            return self.page_bounds.get(key)
+
+    def remember_bound(self, key, last_id):
+        with self.bounds_lock:
+            self.page_bounds[key] = last_id
+            self.page_bounds.move_to_end(key)
+            while len(self.page_bounds) > ADMIN_PAGE_BOUNDS:
+                self.page_bounds.popitem(last=False)
+
+    def annotate(self, rows):
+        """Para completar las filas de la pagina con datos agregados en una sola consulta."""
+
 
 #Users
-class UsersModelView(ModelView):
-    column_auto_select_related = True
+FAVORITE_TABLES = (
+    ('characters', FavoriteCharacter),
+    ('planets', FavoritePlanet),
+    ('starships', FavoriteStarship),
+)
+
+def favorites_formatter(view, context, model, name):
+    counts = getattr(model, 'favorite_counts', {})
+    return ', '.join(f'{kind}: {counts.get(kind, 0)}' for kind, _ in FAVORITE_TABLES)
+
+class UsersModelView(ScalableModelView):
     column_list = ['id', 'email', 'password', 'is_active', 'favorites']
+    column_formatters = {'favorites': favorites_formatter}
+    # Las colecciones de favoritos en el formulario cargarian todas las filas de las tres tablas
+    form_excluded_columns = ['favorites_characters', 'favorites_planets', 'favorites_starships']
+
+    def annotate(self, rows):
+        if not rows:
+            return
+        ids = [row.id for row in rows]
+        # Cuantos favoritos de cada tipo tiene cada usuario de la pagina, en una consulta
+        counts = union_all(*(
+            select(model.user_id, literal(kind).label('kind'), func.count().label('total'))
+            .where(model.user_id.in_(ids)).group_by(model.user_id)
+            for kind, model in FAVORITE_TABLES
+        ))
+        by_user = {}
+        for user_id, kind, total in self.session.execute(counts):
+            by_user.setdefault(user_id, {})[kind] = total
+        for row in rows:
+            row.favorite_counts = by_user.get(row.id, {})
 
 
 #Character
-class CharacterModelView(ModelView):
-    column_auto_select_related = True
-    column_list = ['id', 'name', 'height', 'weigth', 'favorite_by']
-class FavoriteCharacterModelView(ModelView):
+class CharacterModelView(ScalableModelView):
+    column_list = ['id', 'name', 'height', 'weigth', 'favorite_count']
+    form_excluded_columns = ['favorite_by', 'favorite_count']
+class FavoriteCharacterModelView(ScalableModelView):
     column_auto_select_related = True
     column_list = ['id', 'user_id', 'character_id', 'user', 'character']
+    form_ajax_refs = {'user': {'fields': ['email']}, 'character': {'fields': ['name']}}
 
 #Planet
-class PlanetModelView(ModelView):
-    column_auto_select_related = True
-    column_list = ['id', 'name', 'population', 'climate', 'favorite_by']
-class FavoritePlanetModelView(ModelView):
+class PlanetModelView(ScalableModelView):
+    column_list = ['id', 'name', 'population', 'climate', 'favorite_count']
+    form_excluded_columns = ['favorite_by', 'favorite_count']
+class FavoritePlanetModelView(ScalableModelView):
     column_auto_select_related = True
     column_list = ['id', 'user_id', 'planet_id', 'user', 'planet']
+    form_ajax_refs = {'user': {'fields': ['email']}, 'planet': {'fields': ['name']}}
 
 #Starship
-class StarshipModelView(ModelView):
-    column_auto_select_related = True
-    column_list = ['id', 'name', 'model', 'manufacturer', 'favorite_by']
-class FavoriteStarshipModelView(ModelView):
+class StarshipModelView(ScalableModelView):
+    column_list = ['id', 'name', 'model', 'manufacturer', 'favorite_count']
+    form_excluded_columns = ['favorite_by', 'favorite_count']
+class FavoriteStarshipModelView(ScalableModelView):
     column_auto_select_related = True
     column_list = ['id', 'user_id', 'starship_id', 'user', 'starship']
+    form_ajax_refs = {'user': {'fields': ['email']}, 'starship': {'fields': ['name']}}
+
+
+#Peticiones lentas capturadas por slowlog.py
+class SlowQueryView(BaseView):
+    def __init__(self, log, **kwargs):
+        self.log = log
+        super().__init__(**kwargs)
 
+    @expose('/')
+    def index(self):
+        return self.render('admin/slow_queries.html', entries=self.log.snapshot())
 
-def setup_admin(app):
+    @expose('/clear', methods=['POST'])
+    def clear(self):
+        self.log.clear()
+        return self.index()
+
+
+def setup_admin(app, slow_query_log=None, data_version=None):
     app.secret_key = os.environ.get('FLASK_APP_KEY', 'sample key')
     app.config['FLASK_ADMIN_SWATCH'] = 'cerulean'
     admin = Admin(app, name='4Geeks Admin', template_mode='bootstrap3')
 
+    def versions(model):
+        return (lambda: data_version(model)) if data_version is not None else None
+
     # Add your models here, for example this is how we add a the User model to the admin
-    admin.add_view(UsersModelView(User, db.session))
-    
-    admin.add_view(CharacterModelView(Character, db.session))
-    admin.add_view(FavoriteCharacterModelView(FavoriteCharacter, db.session))
-    
-    admin.add_view(PlanetModelView(Planet, db.session))
-    admin.add_view(FavoritePlanetModelView(FavoritePlanet, db.session))
-    
-    admin.add_view(StarshipModelView(Starship, db.session))
-    admin.add_view(FavoriteStarshipModelView(FavoriteStarship, db.session))
+    admin.add_view(UsersModelView(User, db.session, data_version=versions(User)))
+
+    admin.add_view(CharacterModelView(Character, db.session, data_version=versions(Character)))
+    admin.add_view(FavoriteCharacterModelView(FavoriteCharacter, db.session, data_version=versions(FavoriteCharacter)))
+
+    admin.add_view(PlanetModelView(Planet, db.session, data_version=versions(Planet)))
+    admin.add_view(FavoritePlanetModelView(FavoritePlanet, db.session, data_version=versions(FavoritePlanet)))
+
+    admin.add_view(StarshipModelView(Starship, db.session, data_version=versions(Starship)))
+    admin.add_view(FavoriteStarshipModelView(FavoriteStarship, db.session, data_version=versions(FavoriteStarship)))
+
+    if slow_query_log is not None:
+        admin.add_view(SlowQueryView(slow_query_log, name='Slow queries', endpoint='slow_queries'))
 
     # You can duplicate that line to add mew models
-    # admin.add_view(ModelView(YourModelName, db.session))
\ No newline at end of file
+    # admin.add_view(ModelView(YourModelName, db.session))
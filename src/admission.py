@@ -0,0 +1,285 @@
+"""
+Control de admision: limita cuantas peticiones de cada clase se atienden a la vez en el worker y
+cuantas esperan turno. Si la espera prevista supera el plazo de la clase, la peticion se rechaza
+al momento con 503 + Retry-After en vez de hacer trabajo en base de datos para un cliente que ya
+se habra cansado de esperar.
+
+Clases (ver ADMISSION_CLASSES), cada una configurable con variables de entorno:
+  ADMISSION_<CLASE>_LIMIT       peticiones en curso a la vez
+  ADMISSION_<CLASE>_QUEUE       peticiones esperando turno como mucho
+  ADMISSION_<CLASE>_TIMEOUT_MS  espera maxima en cola
+
+Los limites por defecto salen de ADMISSION_CONCURRENCY, las peticiones que el worker puede tener
+en vuelo: GUNICORN_THREADS con gthread; con gevent gunicorn.conf.py la fija al tamano del pool
+(DB_POOL_SIZE + DB_MAX_OVERFLOW). Las lecturas dejan siempre un hilo libre para las escrituras.
+Sin ninguna de las dos (servidor de desarrollo) se usan los valores fijos de ADMISSION_CLASSES.
+
+Los 503 llevan las mismas cabeceras CORS que el resto de respuestas de la app, y exponen
+Retry-After para que un cliente del navegador pueda leerlo.
+
+Con workers `sync` cada proceso atiende una peticion cada vez y la cola real esta en el socket de
+gunicorn. Para ese caso se usa la cabecera X-Request-Start del router (Heroku, Render, nginx con
+`proxy_set_header X-Request-Start "t=${msec}"`): si la peticion ya lleva en cola mas que el plazo
+de su clase, se descarta sin ejecutarla.
+
+ADMISSION_CONTROL=0 lo desactiva. La profundidad de cola, las peticiones en curso y los rechazos
+se publican en /metrics.
+"""
+import json
+import math
+import os
+import threading
+import time
+from flask_cors.core import get_cors_headers, get_cors_options
+from werkzeug.datastructures import EnvironHeaders
+from werkzeug.exceptions import HTTPException
+from metrics import Histogram, DURATION_BUCKETS
+from database import env_int
+
+# clase -> (limite, cola, plazo en ms) por defecto sin ADMISSION_CONCURRENCY ni GUNICORN_THREADS
+ADMISSION_CLASSES = {
+    'read': (16, 64, 1000),
+    'write': (8, 16, 2000),
+    'favorites': (8, 32, 1000),
+    'bulk': (1, 2, 5000),
+}
+# clase -> funcion que da (limite, cola) a partir de las peticiones en vuelo del worker
+CONCURRENCY_LIMITS = {
+    'read': lambda n: (max(1, n - 1), 4 * n),
+    'write': lambda n: (max(1, n // 2), 2 * n),
+    'favorites': lambda n: (max(1, n // 2), 4 * n),
+    'bulk': lambda n: (1, 2),
+}
+# endpoints con clase propia; el resto es `read` (GET/HEAD) o `write`
+ENDPOINT_CLASSES = {
+    'add_favorite_character': 'favorites',
+    'delete_favorite_character': 'favorites',
+    'add_favorite_planet': 'favorites',
+    'delete_favorite_planet': 'favorites',
+    'add_favorite_starship': 'favorites',
+    'delete_favorite_starship': 'favorites',
+    'batch_favorites': 'favorites',
+    'bulk_import': 'bulk',
+}
+# nunca se limitan: sirven para observar un worker saturado
+EXEMPT_ENDPOINTS = {'sitemap', 'prometheus_metrics', 'cache_stats', 'static'}
+# peso del ultimo tiempo de servicio en la media movil con que se estima la espera
+SERVICE_TIME_WEIGHT = 0.2
+
+
+class Shed(Exception):
+    def __init__(self, reason, retry_after):
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Gate:
+    """Limite de concurrencia con cola acotada y plazo para una clase de peticiones."""
+
+    def __init__(self, name, limit, queue, timeout):
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self.service_time = 0.0
+        self.admitted = 0
+        self.shed = {}
+        self.condition = threading.Condition()
+
+    def expected_wait(self, position):
+        # Cada "ronda" libera `limit` plazas y tarda lo que tarda de media una peticion
+        return math.ceil(position / self.limit) * self.service_time
+
+    def reject(self, reason, wait):
+        self.shed[reason] = self.shed.get(reason, 0) + 1
+        raise Shed(reason, max(1, math.ceil(wait)))
+
+    def acquire(self):
+        """Devuelve los segundos esperados en cola; lanza Shed si la peticion no cabe a tiempo."""
+        with self.condition:
+            if self.active < self.limit and self.waiting == 0:
+                self.active += 1
+                self.admitted += 1
+                return 0.0
+            if self.waiting >= self.queue:
+                self.reject('queue_full', self.expected_wait(self.waiting + 1))
+            if self.expected_wait(self.waiting + 1) > self.timeout:
+                self.reject('predicted_timeout', self.expected_wait(self.waiting + 1))
+
+            started = time.monotonic()
+            deadline = started + self.timeout
+            self.waiting += 1
+            try:
+                while self.active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.reject('timeout', self.expected_wait(self.waiting))
+                    self.condition.wait(remaining)
+                self.active += 1
+                self.admitted += 1
+                return time.monotonic() - started
+            finally:
+                self.waiting -= 1
+
+    def release(self, service_seconds):
+        with self.condition:
+            self.active -= 1
+            if self.service_time:
+                self.service_time += SERVICE_TIME_WEIGHT * (service_seconds - self.service_time)
+            else:
+                self.service_time = service_seconds
+            self.condition.notify()
+
+
+def default_limits(concurrency):
+    """clase -> (limite, cola, plazo en ms) para un worker con `concurrency` peticiones en vuelo."""
+    if concurrency <= 0:
+        return dict(ADMISSION_CLASSES)
+    return {
+        name: CONCURRENCY_LIMITS[name](concurrency) + (timeout_ms,)
+        for name, (_, _, timeout_ms) in ADMISSION_CLASSES.items()
+    }
+
+
+def request_queue_seconds(environ, now):
+    """Segundos que la peticion espero antes de llegar al worker, segun X-Request-Start."""
+    header = environ.get('HTTP_X_REQUEST_START')
+    if not header:
+        return None
+    try:
+        value = float(header.split('=', 1)[-1])
+    except ValueError:
+        return None
+    # El router puede mandar segundos, milisegundos o microsegundos desde epoch
+    for scale in (1, 1e3, 1e6):
+        started = value / scale
+        if abs(now - started) < 86400:
+            return max(now - started, 0.0)
+    return None
+
+
+class AdmissionControl:
+    """Middleware WSGI que envuelve `app.wsgi_app`."""
+
+    def __init__(self, app):
+        self.app = app
+        self.enabled = os.getenv('ADMISSION_CONTROL', '1') == '1'
+        self.gates = {}
+        concurrency = env_int('ADMISSION_CONCURRENCY', env_int('GUNICORN_THREADS', 0))
+        for name, (limit, queue, timeout_ms) in default_limits(concurrency).items():
+            prefix = f'ADMISSION_{name.upper()}'
+            self.gates[name] = Gate(
+                name,
+                max(1, env_int(f'{prefix}_LIMIT', limit)),
+                max(0, env_int(f'{prefix}_QUEUE', queue)),
+                env_int(f'{prefix}_TIMEOUT_MS', timeout_ms) / 1000,
+            )
+        self.wait = Histogram('admission_queue_wait_seconds', 'Espera en la cola de admision por clase.', DURATION_BUCKETS)
+        self.lock = threading.Lock()
+        # Las mismas opciones que CORS(app) en app.py
+        self.cors_options = get_cors_options(app)
+        self.wsgi_app = app.wsgi_app
+        app.wsgi_app = self
+
+    def classify(self, environ):
+        try:
+            endpoint, _ = self.app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            # 404, 405, redirecciones: Flask responde sin tocar la base de datos
+            return None
+        if environ.get('REQUEST_METHOD') == 'OPTIONS':
+            # preflight CORS: lo responde flask-cors sin llegar a la vista
+            return None
+        if endpoint in EXEMPT_ENDPOINTS or '.' in endpoint:
+            # los endpoints con punto son de blueprints (Flask-Admin)
+            return None
+        if endpoint in ENDPOINT_CLASSES:
+            return ENDPOINT_CLASSES[endpoint]
+        return 'read' if environ.get('REQUEST_METHOD') in ('GET', 'HEAD') else 'write'
+
+    def cors_headers(self, environ):
+        headers = get_cors_headers(self.cors_options, EnvironHeaders(environ), environ.get('REQUEST_METHOD'))
+        if 'Access-Control-Allow-Origin' in headers:
+            headers['Access-Control-Expose-Headers'] = 'Retry-After'
+        return list(headers.items(multi=True))
+
+    def shed_response(self, shed, environ, start_response):
+        body = json.dumps({'msg': f'Servidor saturado, reintenta en {shed.retry_after} s'}).encode()
+        start_response('503 SERVICE UNAVAILABLE', [
+            ('Content-Type', 'application/json'),
+            ('Content-Length', str(len(body))),
+            ('Retry-After', str(shed.retry_after)),
+        ] + self.cors_headers(environ))
+        return [body]
+
+    def __call__(self, environ, start_response):
+        name = self.classify(environ) if self.enabled else None
+        if name is None:
+            return self.wsgi_app(environ, start_response)
+        gate = self.gates[name]
+
+        try:
+            queued = request_queue_seconds(environ, time.time())
+            if queued is not None and queued > gate.timeout:
+                with gate.condition:
+                    gate.reject('stale', 1)
+            waited = gate.acquire()
+        except Shed as shed:
+            return self.shed_response(shed, environ, start_response)
+        with self.lock:
+            self.wait.observe((('class', name),), waited)
+
+        started = time.perf_counter()
+        try:
+            iterable = self.wsgi_app(environ, start_response)
+        except BaseException:
+            gate.release(time.perf_counter() - started)
+            raise
+        # La plaza se libera cuando termina de enviarse el cuerpo (las respuestas NDJSON siguen
+        # leyendo de la base de datos mientras se envian)
+        return ReleasingIterable(iterable, lambda: gate.release(time.perf_counter() - started))
+
+    def prometheus_lines(self):
+        lines = [
+            '# TYPE admission_in_flight gauge',
+            '# TYPE admission_queue_depth gauge',
+            '# TYPE admission_admitted_total counter',
+            '# TYPE admission_shed_total counter',
+        ]
+        for name, gate in self.gates.items():
+            with gate.condition:
+                lines.append(f'admission_in_flight{{class="{name}"}} {gate.active}')
+                lines.append(f'admission_queue_depth{{class="{name}"}} {gate.waiting}')
+                lines.append(f'admission_admitted_total{{class="{name}"}} {gate.admitted}')
+                for reason, count in sorted(gate.shed.items()):
+                    lines.append(f'admission_shed_total{{class="{name}",reason="{reason}"}} {count}')
+        with self.lock:
+            lines += self.wait.render()
+        return lines
+
+
+class ReleasingIterable:
+    """Libera la plaza al terminar de enviar el cuerpo o al cerrarse la respuesta, lo que llegue antes."""
+
+    def __init__(self, iterable, release):
+        self.iterable = iterable
+        self.release = release
+        self.released = False
+
+    def release_once(self):
+        if not self.released:
+            self.released = True
+            self.release()
+
+    def __iter__(self):
+        yield from self.iterable
+        self.release_once()
+
+    def close(self):
+        try:
+            if hasattr(self.iterable, 'close'):
+                self.iterable.close()
+        finally:
+            self.release_once()
@@ -2,17 +2,32 @@
 This module takes care of starting the API Server, Loading the DB and Adding the endpoints
 """
 import os
-from flask import Flask, request, jsonify, url_for
-from flask_migrate import Migrate
-from flask_swagger import swagger
+import json
+import click
+from flask import Flask, Response, request, jsonify, url_for
 from flask_cors import CORS
-from utils import APIException, generate_sitemap
-from admin import setup_admin
-from models import db, User, Character, Planet, Starship, FavoriteCharacter, FavoritePlanet, FavoriteStarship
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from utils import FastJSONProvider, APIException, EntityIdConverter, valid_entity_id, generate_sitemap, get_limit_arg, get_page_args, paginate_rows, wants_stream, NDJSON_MIMETYPE
+from cache import DEFAULT_VERSION_BACKEND, EntityCache, ResponseCache, cached_response, conditional, invalidate_on_commit, version_store_from_url
+from changes import DEFAULT_CHANGES_LIMIT, MAX_CHANGES_LIMIT, changes_since
+from metrics import Metrics, init_metrics
+from database import engine_options, env_int, pool_collector
+from replicas import init_replicas
+from admission import AdmissionControl
+from compression import init_compression
+from slowlog import SlowQueryLog, init_slow_query_log
+from listing import Listing
+from popularity import DEFAULT_POPULAR_LIMIT, FAVORITE_COUNTERS, MAX_POPULAR_LIMIT, bump_favorite_counts, popular, recount_favorite_counts
+from search import include_in_migrations, search_args, search_catalog
+from importer import CATALOG_MODELS, DEFAULT_BATCH_SIZE, MAX_BATCH_SIZE, import_records, iter_ndjson
+from models import db, project, User, Character, Planet, Starship, FavoriteCharacter, FavoritePlanet, FavoriteStarship
 #from models import Person
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 app.url_map.strict_slashes = False
+app.url_map.converters['int'] = EntityIdConverter
 
 db_url = os.getenv("DATABASE_URL")
 if db_url is not None:
@@ -20,11 +35,78 @@ if db_url is not None:
 else:
     app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-MIGRATE = Migrate(app, db)
+# pool, timeouts y PRAGMAs de SQLite segun el entorno (ver database.py)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+
+app.config['RESPONSE_CACHE_MAX_ENTRIES'] = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 256))
+app.config['RESPONSE_CACHE_MAX_BYTES'] = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+# peticiones mas lentas que este umbral guardan sus sentencias SQL y el EXPLAIN en /admin/slow_queries
+app.config['SLOW_REQUEST_THRESHOLD_MS'] = float(os.getenv('SLOW_REQUEST_THRESHOLD_MS', 500))
+app.config['SLOW_QUERY_LOG_SIZE'] = int(os.getenv('SLOW_QUERY_LOG_SIZE', 100))
+app.config['SLOW_QUERY_EXPLAIN'] = os.getenv('SLOW_QUERY_EXPLAIN', '1') == '1'
+# filas sueltas de GET /<entidad>/<id>; cada fila va atada a la version de su entidad (ver cache.py)
+app.config['ENTITY_CACHE_MAX_ENTRIES'] = int(os.getenv('ENTITY_CACHE_MAX_ENTRIES', 10000))
+app.config['ENTITY_CACHE_TTL'] = float(os.getenv('ENTITY_CACHE_TTL', 30))
+# Compresion de respuestas (ver compression.py); br y zstd solo si estan instalados brotli / zstandard
+app.config['COMPRESSION_ENABLED'] = os.getenv('COMPRESSION_ENABLED', '1') == '1'
+app.config['COMPRESSION_MIN_SIZE'] = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+app.config['COMPRESSION_ALGORITHMS'] = [coding.strip() for coding in os.getenv('COMPRESSION_ALGORITHMS', 'br,zstd,gzip').split(',') if coding.strip()]
+app.config['COMPRESSION_GZIP_LEVEL'] = int(os.getenv('COMPRESSION_GZIP_LEVEL', 6))
+app.config['COMPRESSION_BROTLI_LEVEL'] = int(os.getenv('COMPRESSION_BROTLI_LEVEL', 5))
+app.config['COMPRESSION_ZSTD_LEVEL'] = int(os.getenv('COMPRESSION_ZSTD_LEVEL', 3))
+# sqlite:///ruta/compartida.db (por defecto, en el directorio temporal) para los workers de una
+# maquina, redis://... para varias instancias; memory solo con un proceso (WEB_CONCURRENCY=1)
+app.config['CACHE_VERSION_BACKEND'] = os.getenv('CACHE_VERSION_BACKEND', DEFAULT_VERSION_BACKEND)
+# replicas de solo lectura para los GET del catalogo, usuarios y favoritos (ver replicas.py)
+app.config['DATABASE_READ_URLS'] = [url.strip().replace("postgres://", "postgresql://") for url in os.getenv('DATABASE_READ_URLS', '').split(',') if url.strip()]
+app.config['REPLICA_STRATEGY'] = os.getenv('REPLICA_STRATEGY', 'round_robin')
+app.config['REPLICA_STICKY_SECONDS'] = float(os.getenv('REPLICA_STICKY_SECONDS', 5))
+app.config['REPLICA_RETRY_SECONDS'] = float(os.getenv('REPLICA_RETRY_SECONDS', 30))
+# Flask-Admin (y el registro de peticiones lentas que se consulta desde el) solo donde se pida con
+# ENABLE_ADMIN=1 o arrancando `gunicorn wsgi_admin`: los workers de la API arrancan antes y ocupan
+# menos memoria sin el
+app.config['ENABLE_ADMIN'] = os.getenv('ENABLE_ADMIN', '0') == '1'
+
+# Flask-Migrate (y alembic) solo hacen falta para `flask db ...`, no en los workers web
+if os.getenv('FLASK_RUN_FROM_CLI') == 'true':
+    from flask_migrate import Migrate
+    MIGRATE = Migrate(app, db, include_object=include_in_migrations)
 db.init_app(app)
 CORS(app)
-setup_admin(app)
+metrics = Metrics()
+init_metrics(app, metrics)
+response_cache = ResponseCache(
+    app.config['RESPONSE_CACHE_MAX_ENTRIES'],
+    app.config['RESPONSE_CACHE_MAX_BYTES'],
+    version_store_from_url(app.config['CACHE_VERSION_BACKEND'], env_int('WEB_CONCURRENCY', 1)),
+)
+# tabla -> entidad cuya version se sube al confirmar una escritura
+TABLE_ENTITIES = {
+    'user': 'user',
+    'characters': 'character',
+    'planets': 'planet',
+    'starships': 'starship',
+    'favorite_characters': 'favorite',
+    'favorite_planets': 'favorite',
+    'favorite_starships': 'favorite',
+}
+invalidate_on_commit(response_cache, db.session, TABLE_ENTITIES)
+if app.config['ENABLE_ADMIN']:
+    from admin import setup_admin
+    slow_query_log = SlowQueryLog(app.config['SLOW_QUERY_LOG_SIZE'])
+    # los listados guardan sus limites de pagina por version de la tabla (ver admin.py)
+    setup_admin(app, slow_query_log, lambda model: response_cache.version(TABLE_ENTITIES[model.__tablename__]))
+    init_slow_query_log(app, slow_query_log)
+entity_cache = EntityCache(app.config['ENTITY_CACHE_MAX_ENTRIES'], app.config['ENTITY_CACHE_TTL'])
+metrics.register_collector(response_cache.prometheus_lines)
+metrics.register_collector(entity_cache.prometheus_lines)
+metrics.register_collector(pool_collector(db))
+replica_router, read_replica = init_replicas(app, db, response_cache, app.config['DATABASE_READ_URLS'], engine_options)
+metrics.register_collector(replica_router.prometheus_lines)
+metrics.register_collector(init_compression(app).prometheus_lines)
+# lo ultimo: envuelve todo lo anterior para rechazar la peticion antes de abrir sesion o contar metricas
+admission = AdmissionControl(app)
+metrics.register_collector(admission.prometheus_lines)
 
 # Handle/serialize errors like a JSON object
 @app.errorhandler(APIException)
@@ -36,19 +118,24 @@ def handle_invalid_usage(error):
 def sitemap():
     return generate_sitemap(app)
 
+# contadores del cache de respuestas del catalogo
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify({**response_cache.stats(), 'entity_cache': entity_cache.stats()}), 200
+
 
 #trae todos los usuarios
 @app.route('/users', methods=['GET'])
+@conditional(response_cache, 'user')
+@read_replica('user')
 def handle_hello():
-    users = User.query.all()
-    #print(users)
-    #print(type(users[0]))
-    users_serialized = []
-    for user in users:
-        users_serialized.append(user.serialize())
+    limit, after_id = get_page_args()
+    users_serialized, next_cursor = paginate_rows(project(User), User.id, User.serialize_columns, limit, after_id)
     response_body = {
         'user': users_serialized,
     }
+    if limit is not None:
+        response_body['next_cursor'] = next_cursor
     return jsonify(response_body), 200
 
 #agrega nuevo usuario
@@ -73,8 +160,10 @@ def add_user():
 
 #dime los favoritos de usuarios segun id
 @app.route('/user_favorites/<int:user_id>', methods=['GET'])
+@conditional(response_cache, 'user', 'favorite', 'character', 'planet', 'starship')
+@read_replica('user', 'favorite', 'character', 'planet', 'starship')
 def get_favorites(user_id):
-    user = User.query.get(user_id)
+    user = User.query.options(*User.favorites_loader()).filter_by(id=user_id).first()
     if user is None:
         return jsonify({'msg': f'El usuario con id {user_id} no existe'}), 404
 
@@ -86,142 +175,277 @@ def get_favorites(user_id):
     }), 200   
 
 
+# Inserta un favorito apoyandose en el indice unico (user_id, entidad_id) y en las claves foraneas,
+# y sube el contador de la entidad en la misma transaccion. Devuelve False si la base de datos lo rechaza.
+def insert_favorite(favorite, model, entity_id):
+    db.session.add(favorite)
+    try:
+        db.session.flush()
+        bump_favorite_counts(model, [entity_id], 1)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return False
+    return True
+
+
+# Borra un favorito y baja el contador de la entidad en la misma transaccion
+def remove_favorite(favorite_model, column, user_id, model, entity_id):
+    deleted = db.session.query(favorite_model).filter(favorite_model.user_id == user_id, column == entity_id).delete()
+    if deleted:
+        bump_favorite_counts(model, [entity_id], -1)
+        db.session.commit()
+    return deleted
+
+
 # Añade personaje favorito
 @app.route('/user/<int:user_id>/favorite/character/<int:character_id>', methods=['POST'])
 def add_favorite_character(user_id, character_id):
-    user = User.query.get(user_id)
-    character = Character.query.get(character_id)
-
-    if user is None or character is None:
+    if not insert_favorite(FavoriteCharacter(user_id=user_id, character_id=character_id), Character, character_id):
+        if FavoriteCharacter.query.filter_by(user_id=user_id, character_id=character_id).first():
+            return jsonify({'msg': 'El personaje ya está en favoritos'}), 400
         return jsonify({'msg': 'Usuario o personaje no encontrado'}), 404
-
-    existing_fav = FavoriteCharacter.query.filter_by(user_id=user_id, character_id=character_id).first()
-    if existing_fav:
-        return jsonify({'msg': 'El personaje ya está en favoritos'}), 400
-
-    favorite = FavoriteCharacter(user_id=user_id, character_id=character_id)
-    db.session.add(favorite)
-    db.session.commit()
     return jsonify({'msg': 'Personaje agregado a favoritos'}), 200
 
 
 # Elimina personaje favorito
 @app.route('/user/<int:user_id>/favorite/character/<int:character_id>', methods=['DELETE'])
 def delete_favorite_character(user_id, character_id):
-    favorite = FavoriteCharacter.query.filter_by(user_id=user_id, character_id=character_id).first()
-    if favorite is None:
+    deleted = remove_favorite(FavoriteCharacter, FavoriteCharacter.character_id, user_id, Character, character_id)
+    if deleted == 0:
         return jsonify({'msg': 'El personaje no está en favoritos'}), 404
 
-    db.session.delete(favorite)
-    db.session.commit()
     return jsonify({'msg': 'Personaje eliminado de favoritos'}), 200
 
 
 # Añade planeta favorito
 @app.route('/user/<int:user_id>/favorite/planet/<int:planet_id>', methods=['POST'])
 def add_favorite_planet(user_id, planet_id):
-    user = User.query.get(user_id)
-    planet = Planet.query.get(planet_id)
-
-    if user is None or planet is None:
+    if not insert_favorite(FavoritePlanet(user_id=user_id, planet_id=planet_id), Planet, planet_id):
+        if FavoritePlanet.query.filter_by(user_id=user_id, planet_id=planet_id).first():
+            return jsonify({'msg': 'El planeta ya está en favoritos'}), 400
         return jsonify({'msg': 'Usuario o planeta no encontrado'}), 404
-
-    existing_fav = FavoritePlanet.query.filter_by(user_id=user_id, planet_id=planet_id).first()
-    if existing_fav:
-        return jsonify({'msg': 'El planeta ya está en favoritos'}), 400
-
-    favorite = FavoritePlanet(user_id=user_id, planet_id=planet_id)
-    db.session.add(favorite)
-    db.session.commit()
     return jsonify({'msg': 'Planeta agregado a favoritos'}), 200
 
 
 # Elimina planeta favorito
 @app.route('/user/<int:user_id>/favorite/planet/<int:planet_id>', methods=['DELETE'])
 def delete_favorite_planet(user_id, planet_id):
-    favorite = FavoritePlanet.query.filter_by(user_id=user_id, planet_id=planet_id).first()
-    if favorite is None:
+    deleted = remove_favorite(FavoritePlanet, FavoritePlanet.planet_id, user_id, Planet, planet_id)
+    if deleted == 0:
         return jsonify({'msg': 'El planeta no está en favoritos'}), 404
 
-    db.session.delete(favorite)
-    db.session.commit()
     return jsonify({'msg': 'Planeta eliminado de favoritos'}), 200
 
 
 # Añade nave favorita
 @app.route('/user/<int:user_id>/favorite/starship/<int:starship_id>', methods=['POST'])
 def add_favorite_starship(user_id, starship_id):
-    user = User.query.get(user_id)
-    starship = Starship.query.get(starship_id)
-
-    if user is None or starship is None:
+    if not insert_favorite(FavoriteStarship(user_id=user_id, starship_id=starship_id), Starship, starship_id):
+        if FavoriteStarship.query.filter_by(user_id=user_id, starship_id=starship_id).first():
+            return jsonify({'msg': 'La nave ya está en favoritos'}), 400
         return jsonify({'msg': 'Usuario o nave no encontrado'}), 404
-
-    existing_fav = FavoriteStarship.query.filter_by(user_id=user_id, starship_id=starship_id).first()
-    if existing_fav:
-        return jsonify({'msg': 'La nave ya está en favoritos'}), 400
-
-    favorite = FavoriteStarship(user_id=user_id, starship_id=starship_id)
-    db.session.add(favorite)
-    db.session.commit()
     return jsonify({'msg': 'Nave agregada a favoritos'}), 200
 
 
 # Elimina nave favorita
 @app.route('/user/<int:user_id>/favorite/starship/<int:starship_id>', methods=['DELETE'])
 def delete_favorite_starship(user_id, starship_id):
-    favorite = FavoriteStarship.query.filter_by(user_id=user_id, starship_id=starship_id).first()
-    if favorite is None:
+    deleted = remove_favorite(FavoriteStarship, FavoriteStarship.starship_id, user_id, Starship, starship_id)
+    if deleted == 0:
         return jsonify({'msg': 'La nave no está en favoritos'}), 404
 
-    db.session.delete(favorite)
-    db.session.commit()
     return jsonify({'msg': 'Nave eliminada de favoritos'}), 200
 
 
+# Los tipos de favorito (entidad, tabla de favoritos y columna) son los de FAVORITE_COUNTERS
+MAX_BATCH_OPERATIONS = 500
+
+# Añade y elimina varios favoritos en una sola transaccion
+@app.route('/user/<int:user_id>/favorites:batch', methods=['POST'])
+def batch_favorites(user_id):
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get('operations'), list):
+        return jsonify({'msg': 'Envia una lista operations'}), 400
+    operations = body['operations']
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return jsonify({'msg': f'Maximo {MAX_BATCH_OPERATIONS} operaciones por peticion'}), 400
+
+    if db.session.query(User.id).filter_by(id=user_id).first() is None:
+        return jsonify({'msg': f'El usuario con id {user_id} no existe'}), 404
+
+    # Ids pedidos por tipo, para validarlos con un IN por tabla
+    requested = {fav_type: set() for fav_type in FAVORITE_COUNTERS}
+    for operation in operations:
+        if isinstance(operation, dict) and operation.get('type') in FAVORITE_COUNTERS and valid_entity_id(operation.get('id')):
+            requested[operation['type']].add(operation['id'])
+
+    existing_entities = {}
+    current = {}
+    for fav_type, ids in requested.items():
+        model, favorite_model, column = FAVORITE_COUNTERS[fav_type]
+        if not ids:
+            existing_entities[fav_type] = set()
+            current[fav_type] = set()
+            continue
+        existing_entities[fav_type] = {row[0] for row in db.session.query(model.id).filter(model.id.in_(ids))}
+        current[fav_type] = {row[0] for row in db.session.query(column).filter(favorite_model.user_id == user_id, column.in_(ids))}
+    initial = {fav_type: set(ids) for fav_type, ids in current.items()}
+
+    # Se aplican en orden sobre el estado en memoria; a la base de datos solo va el resultado neto
+    results = []
+    for operation in operations:
+        if not isinstance(operation, dict):
+            results.append({'status': 'invalid'})
+            continue
+        op, fav_type, entity_id = operation.get('op'), operation.get('type'), operation.get('id')
+        # un id invalido no se devuelve: puede no ser serializable (enteros de mas de 64 bits)
+        result = {'op': op, 'type': fav_type, 'id': entity_id if valid_entity_id(entity_id) else None}
+        results.append(result)
+        if op not in ('add', 'remove') or fav_type not in FAVORITE_COUNTERS or not valid_entity_id(entity_id):
+            result['status'] = 'invalid'
+        elif entity_id not in existing_entities[fav_type]:
+            result['status'] = 'not_found'
+        elif op == 'add':
+            if entity_id in current[fav_type]:
+                result['status'] = 'already_favorite'
+            else:
+                current[fav_type].add(entity_id)
+                result['status'] = 'added'
+        else:
+            if entity_id not in current[fav_type]:
+                result['status'] = 'not_favorite'
+            else:
+                current[fav_type].discard(entity_id)
+                result['status'] = 'removed'
+
+    for fav_type, (model, favorite_model, column) in FAVORITE_COUNTERS.items():
+        to_add = current[fav_type] - initial[fav_type]
+        to_remove = initial[fav_type] - current[fav_type]
+        if to_add:
+            db.session.execute(insert(favorite_model), [{'user_id': user_id, column.key: entity_id} for entity_id in to_add])
+        if to_remove:
+            db.session.query(favorite_model).filter(favorite_model.user_id == user_id, column.in_(to_remove)).delete(synchronize_session=False)
+        bump_favorite_counts(model, to_add, 1)
+        bump_favorite_counts(model, to_remove, -1)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Otra peticion modifico los mismos favoritos a la vez
+        db.session.rollback()
+        return jsonify({'msg': 'Conflicto al guardar los favoritos, reintenta'}), 409
+
+    return jsonify({'msg': 'Favoritos actualizados', 'results': results}), 200
+
+
+#los personajes, planetas o naves con mas favoritos
+@app.route('/popular/<entity>', methods=['GET'])
+@conditional(response_cache, 'favorite', 'character', 'planet', 'starship')
+@read_replica('favorite', 'character', 'planet', 'starship')
+def popular_entities(entity):
+    if entity not in FAVORITE_COUNTERS:
+        return jsonify({'msg': f'Entidad {entity} no soportada'}), 404
+    return jsonify({entity: popular(entity, get_limit_arg(DEFAULT_POPULAR_LIMIT, MAX_POPULAR_LIMIT))}), 200
+
+
 #trae todos los personajes
 @app.route('/characters', methods=['GET'])
+@conditional(response_cache, 'character')
+@cached_response(response_cache, 'character')
+@read_replica('character')
 def all_characters():
-    characters = Character.query.all()
-    #print(characters)
-    #print(type(characters[0]))
-    characters_serialized = []
-    for character in characters:
-        characters_serialized.append(character.serialize())
+    listing = Listing(Character)
+    if wants_stream():
+        return listing.stream()
+    characters_serialized, next_cursor, limit = listing.page()
     response_body = {
         'character': characters_serialized,
     }
+    if limit is not None:
+        response_body['next_cursor'] = next_cursor
     return jsonify(response_body), 200
 
 #trae todos los planetas
 @app.route('/planets', methods=['GET'])
+@conditional(response_cache, 'planet')
+@cached_response(response_cache, 'planet')
+@read_replica('planet')
 def all_planets():
-    planets = Planet.query.all()
-    #print(planets)
-    #print(type(planets[0]))
-    planets_serialized = []
-    for planet in planets:
-        planets_serialized.append(planet.serialize())
+    listing = Listing(Planet)
+    if wants_stream():
+        return listing.stream()
+    planets_serialized, next_cursor, limit = listing.page()
     response_body = {
         'planet': planets_serialized,
     }
+    if limit is not None:
+        response_body['next_cursor'] = next_cursor
     return jsonify(response_body), 200
 
 #trae todos los naves
 @app.route('/starships', methods=['GET'])
+@conditional(response_cache, 'starship')
+@cached_response(response_cache, 'starship')
+@read_replica('starship')
 def all_starships():
-    starships = Starship.query.all()
-    #print(starships)
-    #print(type(starships[0]))
-    starships_serialized = []
-    for starship in starships:
-        starships_serialized.append(starship.serialize())
+    listing = Listing(Starship)
+    if wants_stream():
+        return listing.stream()
+    starships_serialized, next_cursor, limit = listing.page()
     response_body = {
         'starship': starships_serialized,
     }
+    if limit is not None:
+        response_body['next_cursor'] = next_cursor
     return jsonify(response_body), 200
 
 
+#busca por nombre en personajes, planetas y naves
+@app.route('/search', methods=['GET'])
+@conditional(response_cache, 'character', 'planet', 'starship')
+@read_replica('character', 'planet', 'starship')
+def search():
+    terms, entities, limit = search_args()
+    return jsonify({'results': search_catalog(terms, entities, limit)}), 200
+
+
+# Cuerpo JSON de GET /<entidad>/<id>, el que guarda el cache de filas
+def entity_body(entity, values):
+    return app.json.dumps({entity: values}).encode()
+
+
+# Sirve una fila desde el cache de filas; en un fallo la lee proyectando solo serialize_columns
+def get_entity(model, entity, entity_id, not_found):
+    def load():
+        row = project(model).filter(model.id == entity_id).first()
+        return None if row is None else entity_body(entity, dict(zip(model.serialize_columns, row[1:])))
+    body = entity_cache.get_or_load(entity, entity_id, response_cache.version(entity), load)
+    if body is None:
+        return jsonify({'msg': not_found}), 404
+    return Response(body, mimetype='application/json')
+
+
+#trae un personaje
+@app.route('/character/<int:character_id>', methods=['GET'])
+@conditional(response_cache, 'character')
+@read_replica('character')
+def get_character(character_id):
+    return get_entity(Character, 'character', character_id, f'El personaje con id {character_id} no existe')
+
+#trae un planeta
+@app.route('/planet/<int:planet_id>', methods=['GET'])
+@conditional(response_cache, 'planet')
+@read_replica('planet')
+def get_planet(planet_id):
+    return get_entity(Planet, 'planet', planet_id, f'El planeta con id {planet_id} no existe')
+
+#trae una nave
+@app.route('/starship/<int:starship_id>', methods=['GET'])
+@conditional(response_cache, 'starship')
+@read_replica('starship')
+def get_starship(starship_id):
+    return get_entity(Starship, 'starship', starship_id, f'La nave con id {starship_id} no existe')
+
 #agrega nuevo personaje
 @app.route('/character', methods=['POST'])
 def add_character():
@@ -289,7 +513,7 @@ def update_character(character_id):
     if body is None:
         return jsonify({'msg': 'Envia información'}), 400
 
-    character = Character.query.get(character_id)
+    character = db.session.get(Character, character_id)
     if character is None:
         return jsonify({'msg': f'El personaje con id {character_id} no existe'}), 404
 
@@ -298,17 +522,19 @@ def update_character(character_id):
     character.weigth = body.get('weigth', character.weigth)
 
     db.session.commit()
+    entity_cache.put('character', character_id, response_cache.version('character'), entity_body('character', character.serialize()))
     return jsonify({'msg': 'Personaje actualizado', 'character': character.serialize()}), 200
 
 #elimina personaje
 @app.route('/character/<int:character_id>', methods=['DELETE'])
 def delete_character(character_id):
-    character = Character.query.get(character_id)
+    character = db.session.get(Character, character_id)
     if character is None:
         return jsonify({'msg': f'El personaje con id {character_id} no existe'}), 404
 
     db.session.delete(character)
     db.session.commit()
+    entity_cache.evict('character', character_id)
     return jsonify({'msg': 'Personaje eliminado correctamente'}), 200
 
 
@@ -319,7 +545,7 @@ def update_planet(planet_id):
     if body is None:
         return jsonify({'msg': 'Envia información'}), 400
 
-    planet = Planet.query.get(planet_id)
+    planet = db.session.get(Planet, planet_id)
     if planet is None:
         return jsonify({'msg': f'El planeta con id {planet_id} no existe'}), 404
 
@@ -328,17 +554,19 @@ def update_planet(planet_id):
     planet.climate = body.get('climate', planet.climate)
 
     db.session.commit()
+    entity_cache.put('planet', planet_id, response_cache.version('planet'), entity_body('planet', planet.serialize()))
     return jsonify({'msg': 'Planeta actualizado', 'planet': planet.serialize()}), 200
 
 #elimina planeta
 @app.route('/planet/<int:planet_id>', methods=['DELETE'])
 def delete_planet(planet_id):
-    planet = Planet.query.get(planet_id)
+    planet = db.session.get(Planet, planet_id)
     if planet is None:
         return jsonify({'msg': f'El planeta con id {planet_id} no existe'}), 404
 
     db.session.delete(planet)
     db.session.commit()
+    entity_cache.evict('planet', planet_id)
     return jsonify({'msg': 'Planeta eliminado correctamente'}), 200
 
 #modifica nave
@@ -348,7 +576,7 @@ def update_starship(starship_id):
     if body is None:
         return jsonify({'msg': 'Envia información'}), 400
 
-    starship = Starship.query.get(starship_id)
+    starship = db.session.get(Starship, starship_id)
     if starship is None:
         return jsonify({'msg': f'La nave con id {starship_id} no existe'}), 404
 
@@ -357,21 +585,85 @@ def update_starship(starship_id):
     starship.manufacturer = body.get('manufacturer', starship.manufacturer)
 
     db.session.commit()
+    entity_cache.put('starship', starship_id, response_cache.version('starship'), entity_body('starship', starship.serialize()))
     return jsonify({'msg': 'Nave actualizada', 'starship': starship.serialize()}), 200
 
 #elimina nave
 @app.route('/starship/<int:starship_id>', methods=['DELETE'])
 def delete_starship(starship_id):
-    starship = Starship.query.get(starship_id)
+    starship = db.session.get(Starship, starship_id)
     if starship is None:
         return jsonify({'msg': f'La nave con id {starship_id} no existe'}), 404
 
     db.session.delete(starship)
     db.session.commit()
+    entity_cache.evict('starship', starship_id)
     return jsonify({'msg': 'Nave eliminada correctamente'}), 200
 
 
 
+# cambios del catalogo (altas, modificaciones y borrados) posteriores a `since`
+@app.route('/changes', methods=['GET'])
+def get_changes():
+    limit = get_limit_arg(DEFAULT_CHANGES_LIMIT, MAX_CHANGES_LIMIT)
+    return jsonify(changes_since(request.args.get('since'), limit)), 200
+
+# Carga masiva de personajes, planetas o naves: array JSON o NDJSON (Content-Type: application/x-ndjson)
+@app.route('/import/<entity>', methods=['POST'])
+def bulk_import(entity):
+    if entity not in CATALOG_MODELS:
+        return jsonify({'msg': f'Entidad {entity} no soportada'}), 404
+    batch_size = request.args.get('batch_size', DEFAULT_BATCH_SIZE, type=int)
+    if not 1 <= batch_size <= MAX_BATCH_SIZE:
+        return jsonify({'msg': f'El parametro batch_size debe estar entre 1 y {MAX_BATCH_SIZE}'}), 400
+
+    if request.mimetype == NDJSON_MIMETYPE:
+        records = iter_ndjson(request.stream)
+    else:
+        records = request.get_json(silent=True)
+        if not isinstance(records, list):
+            return jsonify({'msg': 'Envia un array de objetos'}), 400
+
+    try:
+        summary = import_records(entity, records, batch_size)
+    finally:
+        # Los lotes ya confirmados pueden haber cambiado cualquier fila de la entidad
+        entity_cache.evict_entity(entity)
+    return jsonify({'msg': 'Importacion completada', **summary}), 200
+
+
+# flask import-catalog planet planets.ndjson --batch-size 2000
+@app.cli.command('import-catalog')
+@click.argument('entity', type=click.Choice(sorted(CATALOG_MODELS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True, type=click.IntRange(min=1, max=MAX_BATCH_SIZE))
+def import_catalog_command(entity, path, batch_size):
+    """Importa un fichero .json (array) o .ndjson/.jsonl al catalogo."""
+    with open(path, encoding='utf-8') as source:
+        if path.endswith(('.ndjson', '.jsonl')):
+            summary = import_records(entity, iter_ndjson(source), batch_size)
+        else:
+            summary = import_records(entity, json.load(source), batch_size)
+    click.echo(f"{summary['imported']} {entity} importados, {summary['invalid']} invalidos "
+               f"en {summary['seconds']}s ({summary['rows_per_second']} filas/s)")
+    for error in summary['errors']:
+        click.echo(f"  fila {error['row']}: {error['msg']}", err=True)
+
+
+# flask recount-favorites [character|planet|starship]
+@app.cli.command('recount-favorites')
+@click.argument('entities', nargs=-1, type=click.Choice(sorted(FAVORITE_COUNTERS)))
+def recount_favorites_command(entities):
+    """Recalcula favorite_count desde las tablas de favoritos y corrige los que no cuadren."""
+    for entity in entities or sorted(FAVORITE_COUNTERS):
+        fixed = recount_favorite_counts(entity)
+        db.session.commit()
+        if fixed:
+            # el UPDATE va sobre la tabla y no invalida solo; /popular depende de 'favorite'
+            response_cache.invalidate('favorite')
+        click.echo(f'{entity}: {fixed} contadores corregidos')
+
+
 # this only runs if `$ python src/app.py` is executed
 if __name__ == '__main__':
     PORT = int(os.environ.get('PORT', 3000))
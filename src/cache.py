@@ -0,0 +1,490 @@
+"""
+Cache en memoria de respuestas ya codificadas (bytes JSON) para los listados del catalogo.
+Cada entidad tiene un contador de version que los handlers de escritura incrementan; la version
+forma parte de la clave, asi que una escritura deja obsoletas solo las respuestas de esa entidad.
+
+Los cuerpos viven en cada proceso, pero los contadores de version viven en un `VersionStore`
+compartido para que una escritura atendida por un worker de gunicorn invalide el cache de todos
+los demas: por defecto un fichero SQLite en el directorio temporal (workers de la misma maquina)
+o Redis si hay varias instancias. `memory` solo vale con un unico proceso.
+
+`EntityCache` guarda aparte las filas sueltas de los GET por id (y los ids que no existen), cada
+una con la version de su entidad en el momento de leerla y un TTL como limite de vida.
+"""
+import hashlib
+import itertools
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import wraps
+from flask import request, make_response, Response
+from sqlalchemy import event, inspect
+from compression import negotiate, compress, mark_encoded
+
+
+class VersionStore(ABC):
+    """Contadores de version por entidad. `get` se llama en cada lectura cacheada: debe ser barato."""
+
+    @abstractmethod
+    def get(self, entity):
+        pass
+
+    @abstractmethod
+    def incr(self, entity):
+        pass
+
+    @abstractmethod
+    def epoch(self):
+        """Identifica la vida de los contadores: si el almacen se reinicia las versiones vuelven a 0."""
+
+    def snapshot(self, entities):
+        """(epoch, versiones de `entities`) para calcular un ETag; los almacenes remotos lo leen de una vez."""
+        return self.epoch(), [self.get(entity) for entity in entities]
+
+
+class MemoryVersionStore(VersionStore):
+    """Solo para un proceso (desarrollo, tests o un unico worker)."""
+
+    def __init__(self):
+        self.versions = {}
+        self.lock = threading.Lock()
+        self.token = uuid.uuid4().hex
+
+    def get(self, entity):
+        return self.versions.get(entity, 0)
+
+    def incr(self, entity):
+        with self.lock:
+            self.versions[entity] = self.versions.get(entity, 0) + 1
+            return self.versions[entity]
+
+    def epoch(self):
+        return self.token
+
+
+class SQLiteVersionStore(VersionStore):
+    """
+    Contadores en un fichero SQLite local compartido por los workers de la misma maquina.
+    Cada lectura es una consulta sobre un fichero que el sistema operativo mantiene en memoria,
+    sin pasar por la base de datos principal.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        with self.connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS cache_versions (entity TEXT PRIMARY KEY, version INTEGER NOT NULL)')
+            connection.execute('CREATE TABLE IF NOT EXISTS cache_epoch (id INTEGER PRIMARY KEY CHECK (id = 1), token TEXT NOT NULL)')
+            connection.execute('INSERT OR IGNORE INTO cache_epoch (id, token) VALUES (1, ?)', (uuid.uuid4().hex,))
+            self.token = connection.execute('SELECT token FROM cache_epoch').fetchone()[0]
+
+    def connect(self):
+        connection = getattr(self.local, 'connection', None)
+        # Tras el fork de gunicorn cada proceso abre su propia conexion
+        if connection is None or self.local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return connection
+
+    def get(self, entity):
+        row = self.connect().execute('SELECT version FROM cache_versions WHERE entity = ?', (entity,)).fetchone()
+        return row[0] if row else 0
+
+    def incr(self, entity):
+        connection = self.connect()
+        connection.execute(
+            'INSERT INTO cache_versions (entity, version) VALUES (?, 1) '
+            'ON CONFLICT (entity) DO UPDATE SET version = version + 1',
+            (entity,),
+        )
+        return self.get(entity)
+
+    def epoch(self):
+        return self.token
+
+
+class RedisVersionStore(VersionStore):
+    """Contadores en Redis, para workers repartidos en varias maquinas. Requiere el paquete `redis`."""
+
+    def __init__(self, url, prefix='cache-version:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, entity):
+        value = self.client.get(self.prefix + entity)
+        return int(value) if value is not None else 0
+
+    def incr(self, entity):
+        return self.client.incr(self.prefix + entity)
+
+    def epoch(self):
+        value = self.client.get(self.prefix + '__epoch__')
+        return value.decode() if value is not None else self.create_epoch()
+
+    def create_epoch(self):
+        # Solo tras arrancar o vaciarse Redis; si dos workers compiten gana el primer SETNX
+        self.client.setnx(self.prefix + '__epoch__', uuid.uuid4().hex)
+        return self.client.get(self.prefix + '__epoch__').decode()
+
+    def snapshot(self, entities):
+        # Un solo MGET por ETag: el epoch va con las versiones y no cuesta un viaje aparte
+        epoch, *values = self.client.mget([self.prefix + '__epoch__'] + [self.prefix + entity for entity in entities])
+        if epoch is None:
+            return self.create_epoch(), [self.get(entity) for entity in entities]
+        return epoch.decode(), [int(value) if value is not None else 0 for value in values]
+
+
+# Compartido por todos los workers de la maquina
+DEFAULT_VERSION_BACKEND = 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'cache_versions.db')
+
+
+def version_store_from_url(url, workers=1):
+    """`memory`, `sqlite:///ruta/al/fichero.db` o `redis://host:puerto/db`."""
+    if url == 'memory':
+        if workers > 1:
+            # Cada worker subiria solo sus propias versiones y los demas servirian cuerpos viejos
+            raise ValueError(f'CACHE_VERSION_BACKEND=memory no invalida el cache entre {workers} workers')
+        return MemoryVersionStore()
+    url = url or DEFAULT_VERSION_BACKEND
+    if url.startswith('sqlite:///'):
+        return SQLiteVersionStore(url[len('sqlite:///'):])
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisVersionStore(url)
+    raise ValueError(f'Backend de cache no soportado: {url}')
+
+
+class ResponseCache:
+    def __init__(self, max_entries=256, max_bytes=32 * 1024 * 1024, versions=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.versions = versions or MemoryVersionStore()
+        # Ultima version vista por entidad en este proceso, para descartar cuerpos viejos
+        self.seen_versions = {}
+        # Cuando vio este proceso cambiar cada version (lo usa el enrutado a replicas, ver replicas.py)
+        self.observed_versions = {}
+        self.changed_at = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def version(self, entity):
+        version = self.versions.get(entity)
+        if self.observed_versions.get(entity) != version:
+            self.observed_versions[entity] = version
+            self.changed_at[entity] = time.monotonic()
+        return version
+
+    def seconds_since_change(self, entity):
+        self.version(entity)
+        return time.monotonic() - self.changed_at[entity]
+
+    def invalidate(self, entity):
+        version = self.versions.incr(entity)
+        with self.lock:
+            self.seen_versions[entity] = version
+            self.observed_versions[entity] = version
+            self.changed_at[entity] = time.monotonic()
+            self.purge(entity)
+
+    def purge(self, entity, keep_version=None):
+        for key in [key for key in self.entries if key[0] == entity and key[1] != keep_version]:
+            self.size -= len(self.entries.pop(key))
+
+    def get(self, entity, version, key):
+        with self.lock:
+            body = self.entries.get((entity, version, key))
+            if body is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end((entity, version, key))
+            self.hits += 1
+            return body
+
+    def set(self, entity, version, key, body):
+        if len(body) > self.max_bytes:
+            return
+        # Una escritura concurrente ya invalido esta version: no guardamos datos viejos
+        if version != self.versions.get(entity):
+            return
+        with self.lock:
+            # Otro worker subio la version: los cuerpos anteriores de esta entidad ya no sirven
+            if version != self.seen_versions.get(entity):
+                self.seen_versions[entity] = version
+                self.purge(entity, keep_version=version)
+            previous = self.entries.pop((entity, version, key), None)
+            if previous is not None:
+                self.size -= len(previous)
+            self.entries[(entity, version, key)] = body
+            self.size += len(body)
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'versions': dict(self.seen_versions),
+            }
+
+    def prometheus_lines(self):
+        stats = self.stats()
+        lines = []
+        for name, kind in (('hits', 'counter'), ('misses', 'counter'), ('evictions', 'counter'), ('entries', 'gauge'), ('bytes', 'gauge')):
+            metric = f'response_cache_{name}' + ('_total' if kind == 'counter' else '')
+            lines += [f'# TYPE {metric} {kind}', f'{metric} {stats[name]}']
+        return lines
+
+
+# Entrada negativa del EntityCache: la fila no existia en la version guardada
+MISSING = object()
+
+
+class EntityCache:
+    """
+    Cache LRU con TTL de filas ya codificadas (bytes JSON) por (entidad, id) para los GET de una sola
+    fila. Cada fila se guarda con la version de su entidad en el ResponseCache (la misma del ETag):
+    si la version cambio desde entonces, por cualquier escritura de cualquier worker, Flask-Admin o
+    la importacion masiva, la fila cuenta como fallo. Los handlers de escritura del propio proceso
+    ademas refrescan (`put`) o borran (`evict`) su clave.
+
+    Las peticiones que fallan a la vez en la misma clave se coalescen: solo la primera consulta la
+    base de datos y las demas esperan su resultado, tambien cuando la fila no existe (se guarda una
+    entrada negativa con la misma version, que cualquier alta de la entidad deja obsoleta).
+    """
+
+    def __init__(self, max_entries=10000, ttl=30, wait_timeout=5):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self.entries = OrderedDict()
+        # clave -> carga en curso: {'done': Event, 'stale': bool}
+        self.loading = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def lookup(self, key, version):
+        """Bytes de la fila, MISSING si se sabe que no existe o None si no esta en el cache."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, stored_version, body = entry
+        if expires_at <= time.monotonic() or stored_version != version:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return body
+
+    def store(self, key, version, body):
+        self.entries[key] = (time.monotonic() + self.ttl, version, body)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_load(self, entity, entity_id, version, load):
+        """
+        Devuelve los bytes de (entity, entity_id) en `version`; si no estan, llama a `load()` (que
+        devuelve bytes, o None si la fila no existe) una sola vez aunque lleguen varias peticiones a la vez.
+        `version` se lee antes de cargar: si una escritura la sube durante la carga, lo guardado ya
+        no coincide con la version nueva y la siguiente lectura vuelve a la base de datos.
+        """
+        key = (entity, entity_id)
+        with self.lock:
+            body = self.lookup(key, version)
+            if body is not None:
+                self.hits += 1
+                return None if body is MISSING else body
+            self.misses += 1
+            pending = self.loading.get(key)
+            leader = pending is None
+            if leader:
+                pending = self.loading[key] = {'done': threading.Event(), 'stale': False}
+
+        if not leader:
+            # Otra peticion ya esta consultando esta fila: se espera su resultado
+            if pending['done'].wait(self.wait_timeout):
+                with self.lock:
+                    body = self.lookup(key, version)
+                if body is not None:
+                    with self.lock:
+                        self.coalesced += 1
+                    return None if body is MISSING else body
+            return load()
+
+        try:
+            body = load()
+            with self.lock:
+                # Un put/evict durante la carga gana: lo leido puede ser anterior a esa escritura
+                if not pending['stale']:
+                    self.store(key, version, MISSING if body is None else body)
+            return body
+        finally:
+            with self.lock:
+                self.loading.pop(key, None)
+            pending['done'].set()
+
+    def put(self, entity, entity_id, version, body):
+        key = (entity, entity_id)
+        with self.lock:
+            self.store(key, version, body)
+            if key in self.loading:
+                self.loading[key]['stale'] = True
+
+    def evict(self, entity, entity_id):
+        key = (entity, entity_id)
+        with self.lock:
+            self.entries.pop(key, None)
+            if key in self.loading:
+                self.loading[key]['stale'] = True
+
+    def evict_entity(self, entity):
+        """Borra todas las filas de `entity`, p. ej. tras una importacion masiva."""
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == entity]:
+                del self.entries[key]
+            for key, pending in self.loading.items():
+                if key[0] == entity:
+                    pending['stale'] = True
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+            }
+
+    def prometheus_lines(self):
+        stats = self.stats()
+        lines = []
+        for name, kind in (('hits', 'counter'), ('misses', 'counter'), ('coalesced', 'counter'), ('evictions', 'counter'), ('entries', 'gauge')):
+            metric = f'entity_cache_{name}' + ('_total' if kind == 'counter' else '')
+            lines += [f'# TYPE {metric} {kind}', f'{metric} {stats[name]}']
+        return lines
+
+
+def invalidate_on_commit(cache, session, entities_by_table):
+    """
+    Sube la version de las entidades cuyas tablas se escribieron en la transaccion, justo despues
+    del commit. Cubre los handlers, Flask-Admin y las escrituras masivas (insert/update/delete ORM).
+    """
+    def pending(session):
+        return session.info.setdefault('cache_invalidate', set())
+
+    def mark(session, mapper):
+        entity = entities_by_table.get(mapper.local_table.name)
+        if entity is not None:
+            pending(session).add(entity)
+
+    @event.listens_for(session, 'after_flush')
+    def collect_flushed(session, flush_context):
+        for instance in itertools.chain(session.new, session.dirty, session.deleted):
+            mark(session, inspect(instance).mapper)
+
+    @event.listens_for(session, 'do_orm_execute')
+    def collect_bulk(orm_execute_state):
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            if orm_execute_state.bind_mapper is not None:
+                mark(orm_execute_state.session, orm_execute_state.bind_mapper)
+
+    @event.listens_for(session, 'after_commit')
+    def invalidate(session):
+        for entity in session.info.pop('cache_invalidate', ()):
+            cache.invalidate(entity)
+
+    @event.listens_for(session, 'after_rollback')
+    def discard(session):
+        session.info.pop('cache_invalidate', None)
+
+
+def etag_for(cache, entities, extra=''):
+    """ETag fuerte a partir de las versiones de las entidades, sin tocar la base de datos ni el cuerpo."""
+    epoch, versions = cache.versions.snapshot(entities)
+    fingerprint = '|'.join([epoch, extra] + [f'{entity}:{version}' for entity, version in zip(entities, versions)])
+    return hashlib.sha1(fingerprint.encode()).hexdigest()[:20]
+
+
+def conditional(cache, *entities):
+    """Responde 304 si `If-None-Match` coincide, antes de ejecutar la consulta del endpoint."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # La representacion depende de la ruta, la query string y el Accept (JSON o NDJSON)
+            etag = etag_for(cache, entities, f'{request.full_path}|{request.accept_mimetypes.best}')
+            # Comparacion debil: las variantes comprimidas llevan el mismo ETag marcado W/
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+                response.set_etag(etag)
+                return response
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag, weak='Content-Encoding' in response.headers)
+            return response
+        return wrapper
+    return decorator
+
+
+def cached_response(cache, entity):
+    """
+    Sirve desde `cache` las respuestas JSON 200 del endpoint, por ruta, query string y Accept.
+    Las variantes comprimidas se guardan con la misma version, bajo la clave + la codificacion.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # El Accept entra en la clave porque decide entre JSON y NDJSON
+            key = (request.full_path, request.accept_mimetypes.best)
+            version = cache.version(entity)
+            coding = negotiate()
+            if coding is not None:
+                encoded = cache.get(entity, version, key + (coding,))
+                if encoded is not None:
+                    return encoded_response(encoded, coding, 'HIT')
+            body = cache.get(entity, version, key)
+            if body is not None:
+                return cached_body(cache, entity, version, key, body, 'HIT')
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed and response.mimetype == 'application/json':
+                body = response.get_data()
+                cache.set(entity, version, key, body)
+                return cached_body(cache, entity, version, key, body, 'MISS')
+            return response
+        return wrapper
+    return decorator
+
+
+def cached_body(cache, entity, version, key, body, status):
+    coding = negotiate(len(body))
+    if coding is None:
+        return Response(body, mimetype='application/json', headers={'X-Cache': status})
+    encoded = compress(body, coding, 'cache')
+    cache.set(entity, version, key + (coding,), encoded)
+    return encoded_response(encoded, coding, status)
+
+
+def encoded_response(encoded, coding, status):
+    response = Response(encoded, mimetype='application/json', headers={'X-Cache': status})
+    mark_encoded(response, coding)
+    return response
@@ -0,0 +1,90 @@
+"""
+Sincronizacion incremental del catalogo: devuelve las filas creadas, modificadas o borradas
+despues de un token, en orden (marca de tiempo, fuente, id), para que un cliente que replica el
+catalogo solo descargue lo que cambio.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_
+from models import utcnow, Character, Planet, Starship, DeletedRecord
+from utils import APIException, valid_entity_id
+
+# (nombre, modelo, columna de tiempo); la posicion en la lista desempata marcas de tiempo iguales
+SOURCES = [
+    ('character', Character, Character.updated_at),
+    ('planet', Planet, Planet.updated_at),
+    ('starship', Starship, Starship.updated_at),
+    ('deleted', DeletedRecord, DeletedRecord.deleted_at),
+]
+DEFAULT_CHANGES_LIMIT = 500
+MAX_CHANGES_LIMIT = 5000
+# Un commit lento puede confirmar filas con una marca anterior a un token ya entregado:
+# no se sirven cambios mas recientes que este margen para no saltarnoslos
+SAFETY_LAG = timedelta(seconds=2)
+
+
+def encode_token(timestamp, rank, row_id):
+    raw = json.dumps([timestamp.isoformat(), rank, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_token(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        timestamp, rank, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        timestamp = datetime.fromisoformat(timestamp)
+    except (ValueError, TypeError, binascii.Error):
+        raise APIException('Token invalido', status_code=400)
+    # Las columnas de tiempo son UTC sin zona: una marca con zona no se puede comparar con ellas,
+    # y un id fuera de BIGINT llegaria al driver como OverflowError
+    if timestamp.tzinfo is not None or type(rank) is not int or not 0 <= rank < len(SOURCES) or not valid_entity_id(row_id):
+        raise APIException('Token invalido', status_code=400)
+    return timestamp, rank, row_id
+
+
+def after_position(column, model, rank, position):
+    """Condicion `(column, rank, id) > position` para una fuente con posicion fija `rank`."""
+    if position is None:
+        return None
+    timestamp, since_rank, since_id = position
+    if rank > since_rank:
+        return column >= timestamp
+    if rank < since_rank:
+        return column > timestamp
+    return or_(column > timestamp, and_(column == timestamp, model.id > since_id))
+
+
+def changes_since(token, limit):
+    position = decode_token(token) if token else None
+    until = utcnow() - SAFETY_LAG
+
+    # Cada fuente aporta como mucho `limit` filas por su indice de tiempo; luego se mezclan
+    candidates = []
+    for rank, (name, model, column) in enumerate(SOURCES):
+        query = model.query.filter(column <= until)
+        condition = after_position(column, model, rank, position)
+        if condition is not None:
+            query = query.filter(condition)
+        for row in query.order_by(column, model.id).limit(limit + 1):
+            candidates.append((getattr(row, column.key), rank, row.id, name, row))
+    candidates.sort(key=lambda candidate: candidate[:3])
+
+    page = candidates[:limit]
+    changes = []
+    for timestamp, rank, row_id, name, row in page:
+        if name == 'deleted':
+            changes.append({'entity': row.entity, 'id': row.entity_id, 'op': 'delete', 'at': timestamp.isoformat()})
+        else:
+            changes.append({'entity': name, 'id': row_id, 'op': 'upsert', 'at': timestamp.isoformat(), 'data': row.serialize()})
+
+    if page:
+        next_token = encode_token(*page[-1][:3])
+    else:
+        next_token = token
+    return {
+        'changes': changes,
+        'next_token': next_token,
+        'has_more': len(candidates) > limit,
+    }
@@ -0,0 +1,126 @@
+"""
+Compresion de respuestas segun Accept-Encoding: gzip siempre, brotli (`br`) y zstd si estan
+instalados los paquetes `brotli` y `zstandard`.
+
+Las respuestas que pasan por `cached_response` (cache.py) guardan cada variante comprimida junto al
+cuerpo en el ResponseCache, con la misma version: se comprime una vez por version y codificacion,
+no en cada peticion. El resto se comprime al vuelo en `after_request` si supera
+COMPRESSION_MIN_SIZE. Las respuestas NDJSON en streaming se envian sin comprimir.
+"""
+import gzip
+import threading
+from flask import request, current_app
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/html', 'text/plain'}
+
+
+def compress_gzip(body, level):
+    # mtime=0: el mismo cuerpo da siempre los mismos bytes
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def compress_brotli(body, level):
+    return brotli.compress(body, quality=level)
+
+
+def compress_zstd(body, level):
+    return zstandard.ZstdCompressor(level=level).compress(body)
+
+
+# codificacion -> (funcion, clave de configuracion del nivel); solo las que se pueden usar aqui
+CODINGS = {'gzip': (compress_gzip, 'COMPRESSION_GZIP_LEVEL')}
+if brotli is not None:
+    CODINGS['br'] = (compress_brotli, 'COMPRESSION_BROTLI_LEVEL')
+if zstandard is not None:
+    CODINGS['zstd'] = (compress_zstd, 'COMPRESSION_ZSTD_LEVEL')
+
+
+class CompressionStats:
+    def __init__(self):
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def record(self, coding, source, raw_size, compressed_size):
+        with self.lock:
+            count, raw, compressed = self.counts.get((coding, source), (0, 0, 0))
+            self.counts[(coding, source)] = (count + 1, raw + raw_size, compressed + compressed_size)
+
+    def prometheus_lines(self):
+        lines = [
+            '# TYPE compression_total counter',
+            '# TYPE compression_input_bytes_total counter',
+            '# TYPE compression_output_bytes_total counter',
+        ]
+        with self.lock:
+            for (coding, source), (count, raw, compressed) in sorted(self.counts.items()):
+                labels = f'coding="{coding}",source="{source}"'
+                lines.append(f'compression_total{{{labels}}} {count}')
+                lines.append(f'compression_input_bytes_total{{{labels}}} {raw}')
+                lines.append(f'compression_output_bytes_total{{{labels}}} {compressed}')
+        return lines
+
+
+stats = CompressionStats()
+
+
+def negotiate(body_size=None):
+    """Codificacion a usar para esta peticion, o None si no hay que comprimir. Sin `body_size` no mira el tamano."""
+    config = current_app.config
+    if not config['COMPRESSION_ENABLED']:
+        return None
+    if body_size is not None and body_size < config['COMPRESSION_MIN_SIZE']:
+        return None
+    accepted = request.accept_encodings
+    best, best_quality = None, 0
+    # En caso de empate gana el primero de COMPRESSION_ALGORITHMS
+    for coding in config['COMPRESSION_ALGORITHMS']:
+        if coding not in CODINGS:
+            continue
+        quality = accepted[coding]
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compress(body, coding, source):
+    function, level_key = CODINGS[coding]
+    compressed = function(body, current_app.config[level_key])
+    stats.record(coding, source, len(body), len(compressed))
+    return compressed
+
+
+def mark_encoded(response, coding):
+    response.headers['Content-Encoding'] = coding
+    # Cada codificacion es una representacion distinta: el ETag fuerte pasa a debil
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def init_compression(app):
+    @app.after_request
+    def compress_response(response):
+        if response.mimetype in COMPRESSIBLE_MIMETYPES:
+            response.vary.add('Accept-Encoding')
+        if (response.status_code < 200 or response.status_code in (204, 206, 304)
+                or response.is_streamed or response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+        body = response.get_data()
+        coding = negotiate(len(body))
+        if coding is None:
+            return response
+        response.set_data(compress(body, coding, 'dynamic'))
+        mark_encoded(response, coding)
+        return response
+
+    return stats
@@ -0,0 +1,136 @@
+"""
+Configuracion del engine de SQLAlchemy a partir de variables de entorno.
+
+Postgres/MySQL (DATABASE_URL):
+  DB_POOL_SIZE            conexiones fijas por worker (por defecto GUNICORN_THREADS + 1)
+  DB_MAX_OVERFLOW         conexiones extra en picos (por defecto 2)
+  DB_MAX_CONNECTIONS      limite total del servidor; si se define, el pool de cada worker se
+                          recorta para que WEB_CONCURRENCY * (pool + overflow) no lo supere
+  DB_POOL_TIMEOUT         segundos esperando una conexion libre antes de fallar (por defecto 10)
+  DB_POOL_RECYCLE         segundos de vida maxima de una conexion (por defecto 1800)
+  DB_POOL_PRE_PING        1/0, comprueba la conexion antes de usarla (por defecto 1)
+  DB_STATEMENT_TIMEOUT_MS statement_timeout de Postgres (por defecto 15000, 0 lo desactiva)
+
+SQLite (sin DATABASE_URL): modo WAL, `busy_timeout` (SQLITE_BUSY_TIMEOUT_MS, por defecto 5000)
+y un pool pequeño, porque SQLite solo admite un escritor a la vez. Las claves foraneas se validan
+salvo con SQLITE_FOREIGN_KEYS=0; las migraciones las desactivan en su conexion (migrations/env.py)
+porque reconstruir una tabla referenciada con ellas activas falla.
+
+Las esperas y saturacion del pool se publican en /metrics (ver `pool_collector`).
+"""
+import os
+import sqlite3
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool, StaticPool
+from metrics import Histogram, DURATION_BUCKETS
+
+
+def env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, '') else default
+
+
+class PoolStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wait = Histogram('db_pool_checkout_wait_seconds', 'Espera hasta obtener una conexion del pool.', DURATION_BUCKETS)
+        self.timeouts = 0
+
+    def record_wait(self, seconds):
+        with self.lock:
+            self.wait.observe((), seconds)
+
+    def record_timeout(self):
+        with self.lock:
+            self.timeouts += 1
+
+
+pool_stats = PoolStats()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool que mide cuanto espera cada checkout y cuantos acaban en timeout."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_stats.record_timeout()
+            raise
+        pool_stats.record_wait(time.perf_counter() - started)
+        return connection
+
+
+def engine_options(database_uri):
+    if database_uri.startswith('sqlite'):
+        if database_uri in ('sqlite://', 'sqlite:///:memory:'):
+            return {'poolclass': StaticPool, 'connect_args': {'check_same_thread': False}}
+        return {
+            'poolclass': InstrumentedQueuePool,
+            'pool_size': env_int('DB_POOL_SIZE', 5),
+            'max_overflow': env_int('DB_MAX_OVERFLOW', 5),
+            'pool_timeout': env_int('DB_POOL_TIMEOUT', 10),
+            'connect_args': {'check_same_thread': False},
+        }
+
+    threads = env_int('GUNICORN_THREADS', 1)
+    pool_size = env_int('DB_POOL_SIZE', threads + 1)
+    max_overflow = env_int('DB_MAX_OVERFLOW', 2)
+    max_connections = env_int('DB_MAX_CONNECTIONS', 0)
+    if max_connections:
+        per_worker = max(1, max_connections // env_int('WEB_CONCURRENCY', 1))
+        pool_size = max(1, min(pool_size, per_worker))
+        max_overflow = max(0, min(max_overflow, per_worker - pool_size))
+
+    options = {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': env_int('DB_POOL_TIMEOUT', 10),
+        'pool_recycle': env_int('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', '1') == '1',
+    }
+    statement_timeout = env_int('DB_STATEMENT_TIMEOUT_MS', 15000)
+    if database_uri.startswith('postgresql') and statement_timeout:
+        options['connect_args'] = {'options': f'-c statement_timeout={statement_timeout}'}
+    return options
+
+
+@event.listens_for(Engine, 'connect')
+def _configure_sqlite(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        # WAL deja leer mientras otro proceso escribe; NORMAL es seguro en WAL y evita un fsync por commit
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute(f"PRAGMA busy_timeout={env_int('SQLITE_BUSY_TIMEOUT_MS', 5000)}")
+        # SQLite no valida las claves foraneas salvo que se active por conexion (Postgres siempre lo hace)
+        if os.getenv('SQLITE_FOREIGN_KEYS', '1') == '1':
+            cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+
+def pool_collector(db):
+    """Lineas de /metrics con el estado del pool del engine principal."""
+    def collect():
+        pool = db.engine.pool
+        lines = []
+        if isinstance(pool, QueuePool):
+            capacity = pool.size() + max(pool._max_overflow, 0)
+            checked_out = pool.checkedout()
+            lines += [
+                '# TYPE db_pool_size gauge', f'db_pool_size {pool.size()}',
+                '# TYPE db_pool_checked_out gauge', f'db_pool_checked_out {checked_out}',
+                '# TYPE db_pool_overflow gauge', f'db_pool_overflow {max(pool.overflow(), 0)}',
+                '# TYPE db_pool_saturation gauge', f'db_pool_saturation {checked_out / capacity if capacity else 0}',
+            ]
+        with pool_stats.lock:
+            lines += ['# TYPE db_pool_checkout_timeouts_total counter', f'db_pool_checkout_timeouts_total {pool_stats.timeouts}']
+            lines += pool_stats.wait.render()
+        return lines
+    return collect
@@ -0,0 +1,152 @@
+"""
+Carga masiva del catalogo (personajes, planetas y naves) desde un array JSON o NDJSON.
+Los registros se validan por lotes y cada lote se escribe con un solo INSERT ... ON CONFLICT
+sobre la columna unica `name`, de modo que reimportar un fichero actualiza las filas existentes.
+"""
+import json
+import time
+from sqlalchemy import BigInteger, Integer, String, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, utcnow, Character, Planet, Starship
+
+# Entidad -> (modelo, campos obligatorios ademas de name)
+CATALOG_MODELS = {
+    'character': (Character, ('height', 'weigth')),
+    'planet': (Planet, ('population', 'climate')),
+    'starship': (Starship, ('model', 'manufacturer')),
+}
+DEFAULT_BATCH_SIZE = 1000
+# Cada fila ocupa un parametro por columna en el INSERT: SQLite admite 32766 por sentencia
+MAX_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 20
+
+
+def iter_ndjson(lines):
+    """Lee un registro por linea sin cargar el fichero entero; las lineas vacias se ignoran."""
+    for number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield {'__error__': f'Linea {number}: JSON invalido'}
+
+
+def validate(record, fields):
+    if not isinstance(record, dict):
+        return 'El registro debe ser un objeto'
+    if '__error__' in record:
+        return record['__error__']
+    for field in ('name',) + fields:
+        if field not in record:
+            return f'Campo {field} ogligatorio'
+    if not isinstance(record['name'], str) or not record['name']:
+        return 'Campo name invalido'
+    return None
+
+
+def validate_value(column, value):
+    """Comprueba un valor contra el tipo de su columna antes de que llegue al driver."""
+    if value is None:
+        return None if column.nullable else f'Campo {column.key} no puede ser null'
+    if isinstance(column.type, Integer):
+        bits = 63 if isinstance(column.type, BigInteger) else 31
+        # bool es subclase de int; los floats no se truncan en silencio
+        if type(value) is not int or not -2 ** bits <= value < 2 ** bits:
+            return f'Campo {column.key} debe ser un entero'
+    elif isinstance(column.type, String):
+        if not isinstance(value, str):
+            return f'Campo {column.key} debe ser texto'
+        if column.type.length is not None and len(value) > column.type.length:
+            return f'Campo {column.key} admite como mucho {column.type.length} caracteres'
+    return None
+
+
+def validate_columns(record, columns):
+    for column in columns:
+        error = validate_value(column, record[column.key])
+        if error is not None:
+            return error
+    return None
+
+
+def upsert_batch(model, fields, rows):
+    # Si el mismo nombre se repite en el lote gana el ultimo, Postgres no admite tocar una fila dos veces
+    rows = list({row['name']: row for row in rows}.values())
+    # ON CONFLICT no aplica los `default`/`onupdate` del modelo: las marcas de tiempo van explicitas
+    now = utcnow()
+    for row in rows:
+        row['created_at'] = row['updated_at'] = now
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert_fn = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        statement = insert_fn(model).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=[model.name],
+            set_={field: statement.excluded[field] for field in fields + ('updated_at',)},
+        )
+        db.session.execute(statement)
+        return len(rows)
+
+    # Resto de motores: se separan las filas nuevas de las existentes con una consulta por lote
+    names = [row['name'] for row in rows]
+    existing = {name: pk for pk, name in db.session.query(model.id, model.name).filter(model.name.in_(names))}
+    new_rows = [row for row in rows if row['name'] not in existing]
+    updates = [dict(row, id=existing[row['name']]) for row in rows if row['name'] in existing]
+    for row in updates:
+        del row['created_at']
+    if new_rows:
+        db.session.execute(insert(model), new_rows)
+    if updates:
+        db.session.bulk_update_mappings(model, updates)
+    return len(rows)
+
+
+def import_records(entity, records, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Importa `records` (cualquier iterable de dicts) por lotes de `batch_size`, confirmando cada lote.
+    Devuelve un resumen con filas recibidas, importadas, invalidas y filas por segundo.
+    """
+    model, fields = CATALOG_MODELS[entity]
+    columns = ('name',) + fields
+    table_columns = [model.__table__.columns[column] for column in columns]
+    started = time.perf_counter()
+    received = imported = invalid = 0
+    errors = []
+    batch = []
+
+    def flush():
+        nonlocal imported
+        if batch:
+            imported += upsert_batch(model, fields, batch)
+            db.session.commit()
+            batch.clear()
+
+    for record in records:
+        received += 1
+        error = validate(record, fields)
+        if error is None:
+            error = validate_columns(record, table_columns)
+        if error is not None:
+            invalid += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({'row': received, 'msg': error})
+            continue
+        batch.append({column: record[column] for column in columns})
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+
+    seconds = time.perf_counter() - started
+    return {
+        'entity': entity,
+        'received': received,
+        'imported': imported,
+        'invalid': invalid,
+        'errors': errors,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(imported / seconds, 1) if seconds > 0 else None,
+    }
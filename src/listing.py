@@ -0,0 +1,180 @@
+"""
+Filtros, orden y campos a medida para los listados del catalogo (/characters, /planets, /starships).
+
+    /planets?climate=arid&population__gte=1000&sort=-population&fields=name,population&limit=50
+
+  <columna>=valor           igualdad
+  <columna>__prefix=valor   empieza por `valor` (distingue mayusculas)
+  <columna>__gt|gte|lt|lte  comparaciones, solo en columnas numericas
+  sort=<columna>|-<columna> orden ascendente/descendente (los NULL al final), desempata por id
+  fields=a,b                solo devuelve (y solo lee de la base de datos) esas columnas
+
+Solo se admiten las columnas de `filter_columns` de cada modelo, todas con indice (columna, id),
+asi cada filtro y cada orden se resuelve recorriendo un indice. Con `sort` la paginacion por cursor
+sigue siendo keyset: el cursor guarda el valor de la columna y el id de la ultima fila.
+"""
+import base64
+import binascii
+import json
+from sqlalchemy import Integer, and_, or_
+from flask import request
+from models import db
+from utils import APIException, MAX_ENTITY_ID, valid_entity_id, get_page_args, paginate_rows, stream_rows
+
+RESERVED_PARAMS = {'limit', 'cursor', 'stream', 'sort', 'fields'}
+STRING_OPERATORS = ('eq', 'prefix')
+MAX_CODE_POINT = 0x10FFFF
+NUMBER_OPERATORS = ('eq', 'gt', 'gte', 'lt', 'lte')
+
+
+def encode_sort_cursor(value, last_id):
+    raw = json.dumps([value, last_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_sort_cursor(cursor, column):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, last_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError, binascii.Error):
+        raise APIException('Cursor invalido', status_code=400)
+    # El valor viene del cliente: se le aplican las mismas reglas que a un filtro sobre la columna
+    if value is not None:
+        expected = int if isinstance(column.type, Integer) else str
+        if type(value) is not expected:
+            raise APIException('Cursor invalido', status_code=400)
+        try:
+            value = parse_value(column, value)
+        except APIException:
+            raise APIException('Cursor invalido', status_code=400)
+    if not valid_entity_id(last_id):
+        raise APIException('Cursor invalido', status_code=400)
+    return value, last_id
+
+
+def parse_value(column, raw):
+    if isinstance(column.type, Integer):
+        try:
+            value = int(raw)
+        except ValueError:
+            raise APIException(f'El filtro {column.key} debe ser un entero', status_code=400)
+        # Fuera de 64 bits el driver lanza OverflowError
+        if not -MAX_ENTITY_ID - 1 <= value <= MAX_ENTITY_ID:
+            raise APIException(f'El filtro {column.key} esta fuera de rango', status_code=400)
+        return value
+    return raw
+
+
+def prefix_condition(column, prefix):
+    if prefix == '':
+        return None
+    condition = column.startswith(prefix, autoescape=True)
+    # En SQLite el LIKE no usa el indice (y no distingue mayusculas): se acota con un rango sobre el
+    # indice, valido porque las columnas usan la collation BINARY. En Postgres el orden depende de la
+    # collation de la base de datos y un rango podria dejar fuera filas que si empiezan por `prefix`
+    if db.session.get_bind().dialect.name != 'sqlite':
+        return condition
+    # Los caracteres finales con el mayor code point no tienen siguiente: se quitan del limite superior
+    stem = prefix.rstrip(chr(MAX_CODE_POINT))
+    if not stem:
+        return and_(column >= prefix, condition)
+    upper = stem[:-1] + chr(ord(stem[-1]) + 1)
+    return and_(column >= prefix, column < upper, condition)
+
+
+def filter_condition(model, name, raw):
+    column_name, _, operator = name.partition('__')
+    operator = operator or 'eq'
+    if column_name not in model.filter_columns:
+        raise APIException(f'Filtro no permitido: {name}', status_code=400)
+    column = getattr(model, column_name)
+    allowed = NUMBER_OPERATORS if isinstance(column.type, Integer) else STRING_OPERATORS
+    if operator not in allowed:
+        raise APIException(f'Operador no permitido en {column_name}: {operator}', status_code=400)
+    if operator == 'prefix':
+        return prefix_condition(column, raw)
+    value = parse_value(column, raw)
+    return {
+        'eq': column == value,
+        'gt': column > value,
+        'gte': column >= value,
+        'lt': column < value,
+        'lte': column <= value,
+    }[operator]
+
+
+class Listing:
+    """Consulta de un listado del catalogo construida a partir de la query string."""
+
+    def __init__(self, model):
+        self.model = model
+        self.conditions = []
+        for name, raw in request.args.items(multi=True):
+            if name in RESERVED_PARAMS:
+                continue
+            condition = filter_condition(model, name, raw)
+            if condition is not None:
+                self.conditions.append(condition)
+
+        self.columns = model.serialize_columns
+        fields = request.args.get('fields')
+        if fields:
+            self.columns = tuple(dict.fromkeys(field.strip() for field in fields.split(',') if field.strip()))
+            unknown = [field for field in self.columns if field not in model.serialize_columns]
+            if unknown or not self.columns:
+                raise APIException(f"Campos no validos: {', '.join(unknown) or fields}", status_code=400)
+
+        self.sort_column = None
+        self.descending = False
+        sort = request.args.get('sort')
+        if sort:
+            self.descending = sort.startswith('-')
+            sort_name = sort.lstrip('-+')
+            if sort_name not in model.filter_columns:
+                raise APIException(f'Orden no permitido: {sort_name}', status_code=400)
+            self.sort_column = getattr(model, sort_name)
+
+    def query(self):
+        # (id, *campos pedidos[, columna de orden]): la columna de orden va al final para el cursor
+        selected = [self.model.id, *(getattr(self.model, column) for column in self.columns)]
+        if self.sort_column is not None:
+            selected.append(self.sort_column)
+        return db.session.query(*selected).filter(*self.conditions)
+
+    def order(self):
+        if self.sort_column is None:
+            return (self.model.id,)
+        direction = self.sort_column.desc() if self.descending else self.sort_column.asc()
+        return (direction.nulls_last(), self.model.id)
+
+    def after(self, value, last_id):
+        """Filas posteriores a (value, last_id) en el orden de `order()`."""
+        column, key = self.sort_column, self.model.id
+        if value is None:
+            return and_(column.is_(None), key > last_id)
+        beyond = column < value if self.descending else column > value
+        return or_(beyond, and_(column == value, key > last_id), column.is_(None))
+
+    def page(self):
+        """Devuelve (filas serializadas, next_cursor, limit) segun `limit` y `cursor`."""
+        if self.sort_column is None:
+            limit, after_id = get_page_args()
+            rows, next_cursor = paginate_rows(self.query(), self.model.id, self.columns, limit, after_id)
+            return rows, next_cursor, limit
+
+        limit, after = get_page_args(decode=lambda cursor: decode_sort_cursor(cursor, self.sort_column))
+        query = self.query()
+        if after is not None:
+            query = query.filter(self.after(*after))
+        query = query.order_by(*self.order())
+        if limit is None:
+            return [dict(zip(self.columns, row[1:])) for row in query.all()], None, None
+        rows = query.limit(limit + 1).all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_sort_cursor(rows[-1][-1], rows[-1][0])
+        return [dict(zip(self.columns, row[1:])) for row in rows], next_cursor, limit
+
+    def stream(self):
+        return stream_rows(self.query(), self.model.id, self.columns, order=self.order())
@@ -0,0 +1,149 @@
+"""
+Instrumentacion por peticion: numero de sentencias SQL, tiempo en base de datos, tiempo de
+serializacion JSON y tiempo total, agrupados por endpoint en histogramas que se publican en
+/metrics con el formato de texto de Prometheus. En modo debug cada respuesta lleva ademas una
+cabecera `Server-Timing` con los valores de esa peticion.
+
+Los valores son por proceso: con varios workers de gunicorn cada scrape ve el worker que lo atiende.
+"""
+import threading
+import time
+from flask import g, request, has_request_context, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+MAX_STATEMENTS_PER_REQUEST = 200
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.setdefault(labels, [[0] * len(self.buckets), 0.0, 0])
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total, count) in sorted(self.series.items()):
+            label_text = format_labels(labels)
+            bucket_prefix = label_text + ',' if label_text else ''
+            suffix = f'{{{label_text}}}' if label_text else ''
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{bucket_prefix}le="{bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{bucket_prefix}le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{suffix} {total}')
+            lines.append(f'{self.name}_count{suffix} {count}')
+        return lines
+
+
+def format_labels(labels):
+    return ','.join(f'{key}="{value}"' for key, value in labels)
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.histograms = {
+            'duration': Histogram('http_request_duration_seconds', 'Tiempo total del handler por endpoint.', DURATION_BUCKETS),
+            'db': Histogram('http_request_db_seconds', 'Tiempo en base de datos por peticion.', DURATION_BUCKETS),
+            'queries': Histogram('http_request_db_queries', 'Sentencias SQL por peticion.', QUERY_BUCKETS),
+            'serialization': Histogram('http_request_serialization_seconds', 'Tiempo de codificacion JSON por peticion.', DURATION_BUCKETS),
+        }
+        # Funciones que devuelven lineas extra para /metrics (cache, pool de conexiones...)
+        self.collectors = []
+
+    def register_collector(self, collector):
+        self.collectors.append(collector)
+
+    def observe(self, endpoint, method, status, total, db_seconds, queries, serialization):
+        labels = (('endpoint', endpoint),)
+        with self.lock:
+            key = (('endpoint', endpoint), ('method', method), ('status', str(status)))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.histograms['duration'].observe(labels, total)
+            self.histograms['db'].observe(labels, db_seconds)
+            self.histograms['queries'].observe(labels, queries)
+            self.histograms['serialization'].observe(labels, serialization)
+
+    def render(self):
+        with self.lock:
+            lines = ['# HELP http_requests_total Peticiones atendidas.', '# TYPE http_requests_total counter']
+            for key, count in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{{{format_labels(key)}}} {count}')
+            for histogram in self.histograms.values():
+                lines.extend(histogram.render())
+        for collector in self.collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+
+def record_serialization(seconds):
+    """Lo llama el proveedor JSON para sumar el tiempo de codificacion a la peticion en curso."""
+    if has_request_context():
+        g.serialization_seconds = g.get('serialization_seconds', 0.0) + seconds
+
+
+def init_metrics(app, metrics):
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append((time.perf_counter(), context))
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def end_query(conn, cursor, statement, parameters, context, executemany):
+        record_query(conn, statement, parameters)
+
+    @event.listens_for(Engine, 'handle_error')
+    def failed_query(context):
+        # Una sentencia que falla no pasa por after_cursor_execute: sin esto su inicio se quedaria
+        # en la pila de la conexion y descuadraria las duraciones de las siguientes
+        conn = context.connection
+        started = conn.info.get('query_started') if conn is not None else None
+        # Solo si fallo la propia sentencia, no algo anterior a before_cursor_execute
+        if started and started[-1][1] is context.execution_context:
+            record_query(conn, context.statement, context.parameters)
+
+    def record_query(conn, statement, parameters):
+        started, _ = conn.info['query_started'].pop()
+        elapsed = time.perf_counter() - started
+        if has_request_context():
+            g.db_queries = g.get('db_queries', 0) + 1
+            g.db_seconds = g.get('db_seconds', 0.0) + elapsed
+            # Para el registro de peticiones lentas (slowlog.py); acotado por si una peticion lanza miles
+            statements = g.setdefault('sql_statements', [])
+            if len(statements) < MAX_STATEMENTS_PER_REQUEST:
+                statements.append((statement, parameters, elapsed, conn.engine))
+
+    @app.before_request
+    def start_request():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def finish_request(response):
+        if 'request_started' not in g:
+            return response
+        total = time.perf_counter() - g.request_started
+        queries = g.get('db_queries', 0)
+        db_seconds = g.get('db_seconds', 0.0)
+        serialization = g.get('serialization_seconds', 0.0)
+        metrics.observe(request.endpoint or 'unmatched', request.method, response.status_code, total, db_seconds, queries, serialization)
+        # METRICS_SERVER_TIMING fuerza la cabecera fuera de debug (o la quita en debug)
+        if app.config.get('METRICS_SERVER_TIMING', app.debug):
+            response.headers.add('Server-Timing', f'db;dur={db_seconds * 1000:.2f};desc="{queries} queries"')
+            response.headers.add('Server-Timing', f'serialize;dur={serialization * 1000:.2f}')
+            response.headers.add('Server-Timing', f'total;dur={total * 1000:.2f}')
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -1,8 +1,19 @@
+from datetime import datetime, timezone
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import String, Boolean, Integer, ForeignKey
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import String, Boolean, Integer, DateTime, ForeignKey, Index, event, insert
+from sqlalchemy.orm import Mapped, mapped_column, relationship, selectinload
+from replicas import RoutingSession
 
-db = SQLAlchemy()
+# la sesion enruta los SELECT a una replica cuando el handler lo pide (ver replicas.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# Las marcas de tiempo se guardan en UTC sin zona horaria
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+# Consulta que trae solo el id y las columnas serializadas, como tuplas y sin identity map
+def project(model):
+    return db.session.query(model.id, *(getattr(model, column) for column in model.serialize_columns))
 
 #User
 class User(db.Model):
@@ -18,7 +29,19 @@ class User(db.Model):
 
     def __repr__(self):
             return f'Usuario {self.email}'
+
+    @staticmethod
+    def favorites_loader():
+        # Carga los tres tipos de favoritos con su entidad: una consulta por tabla, sin N+1
+        return (
+            selectinload(User.favorites_characters).joinedload(FavoriteCharacter.character),
+            selectinload(User.favorites_planets).joinedload(FavoritePlanet.planet),
+            selectinload(User.favorites_starships).joinedload(FavoriteStarship.starship),
+        )
     
+    # columnas que devuelve serialize(), para las consultas que proyectan solo esas columnas
+    serialize_columns = ('id', 'email', 'is_active')
+
     def serialize(self):
         return{
              'id': self.id,
@@ -29,15 +52,31 @@ class User(db.Model):
 #Character
 class Character(db.Model):
     __tablename__ = 'characters'
+    # (columna, id) sirve a los filtros y al orden con desempate por id de listing.py
+    __table_args__ = (
+        Index('ix_characters_height_id', 'height', 'id'),
+        Index('ix_characters_weigth_id', 'weigth', 'id'),
+        # ranking de /popular sin GROUP BY sobre la tabla de favoritos
+        Index('ix_characters_favorite_count_id', 'favorite_count', 'id'),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(80), unique=True, nullable=False)
     height: Mapped[int] = mapped_column(Integer)
     weigth: Mapped[int] = mapped_column(Integer)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow, onupdate=utcnow, nullable=False, index=True)
+    # favoritos que apuntan a la fila; lo mantienen los handlers de favoritos (ver popularity.py)
+    favorite_count: Mapped[int] = mapped_column(Integer, default=0, server_default='0', nullable=False)
     favorite_by: Mapped[list['FavoriteCharacter']] = relationship(back_populates='character')
 
     def __repr__(self):
             return f'Personaje {self.name}'
     
+    # columnas que devuelve serialize(), para las consultas que proyectan solo esas columnas
+    serialize_columns = ('name', 'height', 'weigth')
+    # columnas por las que se puede filtrar y ordenar en el listado (ver listing.py)
+    filter_columns = ('name', 'height', 'weigth')
+
     def serialize(self):
         return{
              'name': self.name,
@@ -47,9 +86,15 @@ class Character(db.Model):
 
 class FavoriteCharacter(db.Model):
     __tablename__ = 'favorite_characters'
+    __table_args__ = (
+        Index('uq_favorite_characters_user_character', 'user_id', 'character_id', unique=True),
+        Index('ix_favorite_characters_character_id', 'character_id'),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey('user.id'))
     character_id: Mapped[int] = mapped_column(ForeignKey('characters.id'))
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow, onupdate=utcnow, nullable=False, index=True)
     user: Mapped['User'] = relationship(back_populates='favorites_characters')
     character: Mapped['Character'] = relationship(back_populates='favorite_by')
 
@@ -59,15 +104,31 @@ class FavoriteCharacter(db.Model):
 #Planet
 class Planet(db.Model):
     __tablename__ = 'planets'
+    # (columna, id) sirve a los filtros y al orden con desempate por id de listing.py
+    __table_args__ = (
+        Index('ix_planets_population_id', 'population', 'id'),
+        Index('ix_planets_climate_id', 'climate', 'id'),
+        # ranking de /popular sin GROUP BY sobre la tabla de favoritos
+        Index('ix_planets_favorite_count_id', 'favorite_count', 'id'),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(80), unique=True, nullable=False)
     population: Mapped[int] = mapped_column(Integer)
     climate: Mapped[str] = mapped_column(String(120))
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow, onupdate=utcnow, nullable=False, index=True)
+    # favoritos que apuntan a la fila; lo mantienen los handlers de favoritos (ver popularity.py)
+    favorite_count: Mapped[int] = mapped_column(Integer, default=0, server_default='0', nullable=False)
     favorite_by: Mapped[list['FavoritePlanet']] = relationship(back_populates='planet')
 
     def __repr__(self):
             return f'Planeta {self.name}'
     
+    # columnas que devuelve serialize(), para las consultas que proyectan solo esas columnas
+    serialize_columns = ('name', 'population', 'climate')
+    # columnas por las que se puede filtrar y ordenar en el listado (ver listing.py)
+    filter_columns = ('name', 'population', 'climate')
+
     def serialize(self):
         return{
              'name': self.name,
@@ -77,9 +138,15 @@ class Planet(db.Model):
 
 class FavoritePlanet(db.Model):
     __tablename__ = 'favorite_planets'
+    __table_args__ = (
+        Index('uq_favorite_planets_user_planet', 'user_id', 'planet_id', unique=True),
+        Index('ix_favorite_planets_planet_id', 'planet_id'),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey('user.id'))
     planet_id: Mapped[int] = mapped_column(ForeignKey('planets.id'))
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow, onupdate=utcnow, nullable=False, index=True)
     user: Mapped['User'] = relationship(back_populates='favorites_planets')
     planet: Mapped['Planet'] = relationship(back_populates='favorite_by')
 
@@ -90,15 +157,31 @@ class FavoritePlanet(db.Model):
 #Starship
 class Starship(db.Model):
     __tablename__ = 'starships'
+    # (columna, id) sirve a los filtros y al orden con desempate por id de listing.py
+    __table_args__ = (
+        Index('ix_starships_model_id', 'model', 'id'),
+        Index('ix_starships_manufacturer_id', 'manufacturer', 'id'),
+        # ranking de /popular sin GROUP BY sobre la tabla de favoritos
+        Index('ix_starships_favorite_count_id', 'favorite_count', 'id'),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(80), unique=True, nullable=False)
     model: Mapped[str] = mapped_column(String(120))
     manufacturer: Mapped[str] = mapped_column(String(120))
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow, onupdate=utcnow, nullable=False, index=True)
+    # favoritos que apuntan a la fila; lo mantienen los handlers de favoritos (ver popularity.py)
+    favorite_count: Mapped[int] = mapped_column(Integer, default=0, server_default='0', nullable=False)
     favorite_by: Mapped[list['FavoriteStarship']] = relationship(back_populates='starship')
 
     def __repr__(self):
             return f'Starship {self.name}'
     
+    # columnas que devuelve serialize(), para las consultas que proyectan solo esas columnas
+    serialize_columns = ('name', 'model', 'manufacturer')
+    # columnas por las que se puede filtrar y ordenar en el listado (ver listing.py)
+    filter_columns = ('name', 'model', 'manufacturer')
+
     def serialize(self):
         return{
              'name': self.name,
@@ -108,11 +191,47 @@ class Starship(db.Model):
 
 class FavoriteStarship(db.Model):
     __tablename__ = 'favorite_starships'
+    __table_args__ = (
+        Index('uq_favorite_starships_user_starship', 'user_id', 'starship_id', unique=True),
+        Index('ix_favorite_starships_starship_id', 'starship_id'),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey('user.id'))
     starship_id: Mapped[int] = mapped_column(ForeignKey('starships.id'))
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow, onupdate=utcnow, nullable=False, index=True)
     user: Mapped['User'] = relationship(back_populates='favorites_starships')
     starship: Mapped['Starship'] = relationship(back_populates='favorite_by')
 
     def __repr__(self):
-            return f'Al usuario {self.user_id} le gusta la starship {self.starship_id}'
\ No newline at end of file
+            return f'Al usuario {self.user_id} le gusta la starship {self.starship_id}'
+
+
+#Registro de borrados del catalogo, para que /changes pueda informar de ellos
+class DeletedRecord(db.Model):
+    __tablename__ = 'deleted_records'
+    id: Mapped[int] = mapped_column(primary_key=True)
+    entity: Mapped[str] = mapped_column(String(20), nullable=False)
+    entity_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    deleted_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow, nullable=False, index=True)
+
+    def __repr__(self):
+            return f'Borrado {self.entity} {self.entity_id}'
+
+    def serialize(self):
+        return{
+             'entity': self.entity,
+             'entity_id': self.entity_id,
+             'deleted_at': self.deleted_at.isoformat()
+        }
+
+
+# Cada borrado de personaje, planeta o nave deja su lapida en la misma transaccion
+def record_deletion(entity):
+    def after_delete(mapper, connection, target):
+        connection.execute(insert(DeletedRecord).values(entity=entity, entity_id=target.id, deleted_at=utcnow()))
+    return after_delete
+
+event.listen(Character, 'after_delete', record_deletion('character'))
+event.listen(Planet, 'after_delete', record_deletion('planet'))
+event.listen(Starship, 'after_delete', record_deletion('starship'))
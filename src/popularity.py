@@ -0,0 +1,67 @@
+"""
+Contadores de favoritos desnormalizados (`favorite_count` en personajes, planetas y naves) y el
+ranking de /popular/<entidad>.
+
+Los handlers de favoritos suben o bajan el contador en la misma transaccion que insertan o borran
+el favorito, asi nunca se confirma uno sin el otro. Las escrituras que no pasan por ellos
+(Flask-Admin, SQL a mano) se corrigen con `flask recount-favorites`.
+
+Los contadores se actualizan con un UPDATE sobre la tabla, no sobre el modelo: no tocan
+`updated_at` (no es un cambio del catalogo para /changes) ni invalidan el cache de los listados,
+que no incluyen el contador.
+"""
+from sqlalchemy import func, select, update
+from models import db, Character, Planet, Starship, FavoriteCharacter, FavoritePlanet, FavoriteStarship
+
+# entidad -> (modelo, tabla de favoritos, columna de la tabla de favoritos que apunta a la entidad)
+FAVORITE_COUNTERS = {
+    'character': (Character, FavoriteCharacter, FavoriteCharacter.character_id),
+    'planet': (Planet, FavoritePlanet, FavoritePlanet.planet_id),
+    'starship': (Starship, FavoriteStarship, FavoriteStarship.starship_id),
+}
+DEFAULT_POPULAR_LIMIT = 10
+MAX_POPULAR_LIMIT = 100
+
+
+def bump_favorite_counts(model, ids, delta):
+    """Suma `delta` al contador de las filas `ids`, dentro de la transaccion de la sesion."""
+    if not ids:
+        return
+    table = model.__table__
+    db.session.execute(
+        update(table)
+        .where(table.c.id.in_(ids))
+        # updated_at se reasigna a si mismo para que no salte su onupdate
+        .values(favorite_count=table.c.favorite_count + delta, updated_at=table.c.updated_at)
+    )
+
+
+def recount_favorite_counts(entity):
+    """Recalcula el contador desde la tabla de favoritos; devuelve cuantas filas estaban mal."""
+    model, favorite_model, column = FAVORITE_COUNTERS[entity]
+    table = model.__table__
+    actual = (
+        select(func.count())
+        .select_from(favorite_model.__table__)
+        .where(column == table.c.id)
+        .scalar_subquery()
+    )
+    result = db.session.execute(
+        update(table)
+        .where(table.c.favorite_count != actual)
+        .values(favorite_count=actual, updated_at=table.c.updated_at)
+    )
+    return result.rowcount
+
+
+def popular(entity, limit):
+    """Las filas con mas favoritos, recorriendo el indice (favorite_count, id) de mayor a menor."""
+    model = FAVORITE_COUNTERS[entity][0]
+    rows = (
+        db.session.query(model.id, model.name, model.favorite_count)
+        .filter(model.favorite_count > 0)
+        .order_by(model.favorite_count.desc(), model.id.desc())
+        .limit(limit)
+        .all()
+    )
+    return [{'id': row_id, 'name': name, 'favorite_count': count} for row_id, name, count in rows]
@@ -0,0 +1,129 @@
+"""
+Enrutado de lecturas a replicas (DATABASE_READ_URLS, separadas por comas).
+
+Los GET marcados con `@read_replica(...)` ejecutan sus SELECT en una replica; las escrituras y
+cualquier sentencia fuera de esos handlers van siempre al primario. Se vuelve al primario cuando:
+  - no hay replicas sanas (una replica que da error de conexion se aparta REPLICA_RETRY_SECONDS),
+  - el cliente escribio hace menos de REPLICA_STICKY_SECONDS (cookie `read_primary_until`),
+    para que lea sus propias escrituras aunque la replica vaya con retraso,
+  - alguna entidad que lee el endpoint cambio de version hace menos de REPLICA_STICKY_SECONDS,
+    para no guardar en el cache de respuestas una version nueva con datos viejos de la replica.
+"""
+import itertools
+import threading
+import time
+from functools import wraps
+from flask import request, g
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import DBAPIError
+
+READ_PRIMARY_COOKIE = 'read_primary_until'
+
+
+class RoutingSession(Session):
+    """Sesion que usa la replica elegida para la peticion en los SELECT fuera de un flush."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = self.info.get('replica')
+        if replica is not None and bind is None and not self._flushing and getattr(clause, 'is_select', False):
+            return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReplicaRouter:
+    def __init__(self, engines, strategy='round_robin', retry_seconds=30):
+        self.engines = engines
+        self.strategy = strategy
+        self.retry_seconds = retry_seconds
+        self.down_until = {}
+        self.cycle = itertools.cycle(range(len(engines))) if engines else None
+        self.lock = threading.Lock()
+        self.reads = {'replica': 0, 'primary': 0}
+        for engine in engines:
+            event.listen(engine, 'handle_error', self.on_error)
+
+    def on_error(self, context):
+        # Un error de conexion aparta la replica un rato; las lecturas siguientes van al primario
+        if context.is_disconnect or context.connection is None:
+            with self.lock:
+                self.down_until[context.engine] = time.monotonic() + self.retry_seconds
+
+    def healthy(self):
+        now = time.monotonic()
+        return [engine for engine in self.engines if self.down_until.get(engine, 0) <= now]
+
+    def choose(self):
+        candidates = self.healthy()
+        if not candidates:
+            return None
+        if self.strategy == 'least_busy':
+            return min(candidates, key=lambda engine: engine.pool.checkedout())
+        with self.lock:
+            for _ in range(len(self.engines)):
+                engine = self.engines[next(self.cycle)]
+                if engine in candidates:
+                    return engine
+        return None
+
+    def count(self, target):
+        with self.lock:
+            self.reads[target] += 1
+
+    def prometheus_lines(self):
+        lines = ['# TYPE db_reads_routed_total counter']
+        for target, total in self.reads.items():
+            lines.append(f'db_reads_routed_total{{target="{target}"}} {total}')
+        lines += ['# TYPE db_replicas_healthy gauge', f'db_replicas_healthy {len(self.healthy())}']
+        return lines
+
+
+def init_replicas(app, db, cache, urls, engine_options):
+    router = ReplicaRouter(
+        [create_engine(url, **engine_options(url)) for url in urls],
+        strategy=app.config['REPLICA_STRATEGY'],
+        retry_seconds=app.config['REPLICA_RETRY_SECONDS'],
+    )
+    sticky = app.config['REPLICA_STICKY_SECONDS']
+
+    @app.after_request
+    def stick_to_primary_after_write(response):
+        if router.engines and request.method in ('POST', 'PUT', 'PATCH', 'DELETE') and response.status_code < 400:
+            response.set_cookie(READ_PRIMARY_COOKIE, str(time.time() + sticky), max_age=int(sticky) + 1, httponly=True, samesite='Lax')
+        return response
+
+    def read_replica(*entities):
+        """Lleva las lecturas del endpoint a una replica si es seguro hacerlo."""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                replica = None
+                if router.engines and not wrote_recently() and not any(cache.seconds_since_change(entity) < sticky for entity in entities):
+                    replica = router.choose()
+                if replica is not None:
+                    db.session.info['replica'] = replica
+                    g.read_replica = True
+                router.count('replica' if replica is not None else 'primary')
+                try:
+                    return view(*args, **kwargs)
+                except DBAPIError:
+                    # Si la replica acaba de caerse se repite la lectura en el primario
+                    if replica is None or replica in router.healthy():
+                        raise
+                    db.session.rollback()
+                    db.session.info.pop('replica', None)
+                    g.read_replica = False
+                    router.count('primary')
+                    return view(*args, **kwargs)
+                finally:
+                    db.session.info.pop('replica', None)
+            return wrapper
+        return decorator
+
+    def wrote_recently():
+        try:
+            return float(request.cookies.get(READ_PRIMARY_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    return router, read_replica
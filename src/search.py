@@ -0,0 +1,178 @@
+"""
+Busqueda por nombre en personajes, planetas y naves (GET /search?q=).
+
+El indice vive en la propia base de datos y se mantiene solo, sin tocar los handlers: tambien
+cubre la importacion masiva (importer.py), Flask-Admin y las escrituras hechas a mano.
+
+  SQLite    tabla FTS5 `catalog_search` alimentada por triggers de insert/update/delete. El rowid
+            codifica la entidad y el id (id * 4 + tipo), asi cada trigger toca una sola fila.
+            La ultima palabra de `q` se busca como prefijo (y todas si asi no hay resultados);
+            se ordena por bm25.
+  Postgres  columna generada `search_vector` (tsvector 'simple') con indice GIN en cada tabla,
+            mas un indice trigram (pg_trgm) sobre `name` para coincidencias dentro de la palabra.
+            Se ordena por ts_rank y similitud.
+
+El DDL se instala con `db.create_all()` (evento after_create) y en la migracion 4b8d2f6a9e13.
+"""
+import re
+from flask import request
+from sqlalchemy import event, text
+from models import db
+from utils import APIException
+
+# (entidad, tabla, codigo en el rowid de SQLite)
+SEARCH_SOURCES = [
+    ('character', 'characters', 1),
+    ('planet', 'planets', 2),
+    ('starship', 'starships', 3),
+]
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+MAX_SEARCH_TERMS = 8
+
+
+def sqlite_ddl():
+    statements = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS catalog_search USING fts5(name, tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    ]
+    for entity, table, code in SEARCH_SOURCES:
+        statements += [
+            f'CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} BEGIN '
+            f'INSERT INTO catalog_search(rowid, name) VALUES (new.id * 4 + {code}, new.name); END',
+            f'CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE OF id, name ON {table} BEGIN '
+            f'DELETE FROM catalog_search WHERE rowid = old.id * 4 + {code}; '
+            f'INSERT INTO catalog_search(rowid, name) VALUES (new.id * 4 + {code}, new.name); END',
+            f'CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} BEGIN '
+            f'DELETE FROM catalog_search WHERE rowid = old.id * 4 + {code}; END',
+            f'INSERT INTO catalog_search(rowid, name) SELECT id * 4 + {code}, name FROM {table} '
+            f'WHERE id * 4 + {code} NOT IN (SELECT rowid FROM catalog_search)',
+        ]
+    return statements
+
+
+def postgresql_ddl():
+    statements = ['CREATE EXTENSION IF NOT EXISTS pg_trgm']
+    for entity, table, code in SEARCH_SOURCES:
+        statements += [
+            f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            f"GENERATED ALWAYS AS (to_tsvector('simple', coalesce(name, ''))) STORED",
+            f'CREATE INDEX IF NOT EXISTS ix_{table}_search_vector ON {table} USING gin (search_vector)',
+            f'CREATE INDEX IF NOT EXISTS ix_{table}_name_trgm ON {table} USING gin (name gin_trgm_ops)',
+        ]
+    return statements
+
+
+SEARCH_DDL = {
+    'sqlite': sqlite_ddl,
+    'postgresql': postgresql_ddl,
+}
+
+
+@event.listens_for(db.metadata, 'after_create')
+def install_search_index(target, connection, **kwargs):
+    ddl = SEARCH_DDL.get(connection.dialect.name)
+    if ddl is None:
+        return
+    for statement in ddl():
+        connection.exec_driver_sql(statement)
+
+
+@event.listens_for(db.metadata, 'before_drop')
+def drop_search_index(target, connection, **kwargs):
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql('DROP TABLE IF EXISTS catalog_search')
+
+
+def include_in_migrations(object, name, type_, reflected, compare_to):
+    """`include_object` de alembic: el indice de busqueda no esta en los modelos, que no lo borre."""
+    if type_ == 'table' and name.startswith('catalog_search'):
+        return False
+    if type_ == 'column' and name == 'search_vector':
+        return False
+    if type_ == 'index' and name and name.endswith(('_search_vector', '_name_trgm')):
+        return False
+    return True
+
+
+def search_terms(q):
+    terms = re.findall(r'\w+', q or '')
+    if not terms:
+        raise APIException('El parametro q es obligatorio', status_code=400)
+    return terms[:MAX_SEARCH_TERMS]
+
+
+def search_args():
+    """Lee `q`, `type` y `limit` de la query string."""
+    terms = search_terms(request.args.get('q'))
+    types = request.args.get('type')
+    entities = [entity for entity, table, code in SEARCH_SOURCES]
+    if types:
+        entities = [entity.strip() for entity in types.split(',') if entity.strip()]
+        unknown = [entity for entity in entities if entity not in {source[0] for source in SEARCH_SOURCES}]
+        if unknown:
+            raise APIException(f"Tipo no valido: {', '.join(unknown)}", status_code=400)
+    try:
+        limit = int(request.args.get('limit', DEFAULT_SEARCH_LIMIT))
+    except ValueError:
+        raise APIException('El parametro limit debe ser un entero', status_code=400)
+    if limit < 1:
+        raise APIException('El parametro limit debe ser mayor que 0', status_code=400)
+    return terms, entities, min(limit, MAX_SEARCH_LIMIT)
+
+
+def fts_match(terms, prefix_all):
+    # Cada palabra entre comillas para que el usuario no pueda inyectar sintaxis FTS5
+    quoted = ['"%s"' % term.replace('"', '') for term in terms]
+    if prefix_all:
+        return ' '.join(f'{term}*' for term in quoted)
+    return ' '.join(quoted[:-1] + [quoted[-1] + '*'])
+
+
+def search_sqlite(terms, entities, limit):
+    codes = {entity: code for entity, table, code in SEARCH_SOURCES}
+    by_code = {code: entity for entity, table, code in SEARCH_SOURCES}
+    sql = 'SELECT rowid, name FROM catalog_search WHERE catalog_search MATCH :match'
+    if len(entities) < len(SEARCH_SOURCES):
+        sql += f" AND rowid % 4 IN ({', '.join(str(codes[entity]) for entity in entities)})"
+    sql += ' ORDER BY bm25(catalog_search), rowid LIMIT :limit'
+    # .columns() lo marca como SELECT: asi la sesion puede llevarlo a una replica (ver replicas.py)
+    statement = text(sql).columns()
+    # Primero como al escribir: palabras completas y la ultima como prefijo ("han so"), que evita
+    # expandir prefijos de palabras muy comunes. Si no hay resultados, todas como prefijo ("mill falc")
+    rows = db.session.execute(statement, {'match': fts_match(terms, False), 'limit': limit}).all()
+    if not rows and len(terms) > 1:
+        rows = db.session.execute(statement, {'match': fts_match(terms, True), 'limit': limit}).all()
+    return [{'type': by_code[rowid % 4], 'id': rowid // 4, 'name': name} for rowid, name in rows]
+
+
+def search_postgresql(terms, entities, limit):
+    tsquery = ' & '.join(f'{term}:*' for term in terms)
+    phrase = ' '.join(terms)
+    selects = []
+    for entity, table, code in SEARCH_SOURCES:
+        if entity not in entities:
+            continue
+        # Cada rama usa su indice (GIN del tsvector o trigram) y trae como mucho `limit` filas
+        selects.append(
+            f"(SELECT '{entity}' AS type, id, name, "
+            f"ts_rank(search_vector, to_tsquery('simple', :tsquery)) + similarity(name, :phrase) AS score "
+            f"FROM {table} WHERE search_vector @@ to_tsquery('simple', :tsquery) OR name ILIKE :contains "
+            f"ORDER BY score DESC, id LIMIT :limit)"
+        )
+    sql = ' UNION ALL '.join(selects) + ' ORDER BY score DESC, type, id LIMIT :limit'
+    contains = '%' + phrase.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    rows = db.session.execute(text(sql).columns(), {'tsquery': tsquery, 'phrase': phrase, 'contains': contains, 'limit': limit}).all()
+    return [{'type': entity, 'id': row_id, 'name': name} for entity, row_id, name, score in rows]
+
+
+SEARCH_BACKENDS = {
+    'sqlite': search_sqlite,
+    'postgresql': search_postgresql,
+}
+
+
+def search_catalog(terms, entities, limit):
+    backend = SEARCH_BACKENDS.get(db.session.get_bind().dialect.name)
+    if backend is None:
+        raise APIException('Busqueda no disponible en esta base de datos', status_code=501)
+    return backend(terms, entities, limit)
@@ -0,0 +1,147 @@
+"""
+Registro de peticiones lentas. Cuando una peticion supera SLOW_REQUEST_THRESHOLD_MS se guardan sus
+sentencias SQL mas lentas (con los parametros censurados), su duracion y el plan EXPLAIN del
+motor en un buffer circular acotado que se consulta desde Flask-Admin (ver admin.py).
+
+Los EXPLAIN no se lanzan dentro de la peticion: las sentencias van a una cola acotada que vacia un
+hilo del proceso, una a una, y el plan aparece en la entrada cuando esta listo. Cada plan se pide a
+la misma base de datos (primaria o replica) que ejecuto la sentencia. Si la cola esta
+llena la sentencia se queda sin plan. Los parametros reales solo se guardan hasta lanzar su EXPLAIN.
+
+Se apoya en la instrumentacion de metrics.py, que deja en `g` el inicio de la peticion y la
+lista de sentencias ejecutadas.
+"""
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from flask import g, request
+from sqlalchemy.exc import SQLAlchemyError
+
+EXPLAIN_PREFIX = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+    'mysql': 'EXPLAIN ',
+}
+STATEMENTS_PER_ENTRY = 3
+# Sentencias esperando su EXPLAIN como mucho
+EXPLAIN_QUEUE_SIZE = 100
+
+
+def redact(parameters):
+    """Sustituye cada valor por su tipo: el log no debe guardar emails, contraseñas ni datos de usuarios."""
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (list, tuple, dict)):
+            return f'{len(parameters)} filas'
+        return [type(value).__name__ for value in parameters]
+    return None
+
+
+class SlowQueryLog:
+    def __init__(self, size=100):
+        self.entries = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def add(self, entry):
+        with self.lock:
+            self.entries.appendleft(entry)
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.entries)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def explain(engine, statement, parameters):
+    prefix = EXPLAIN_PREFIX.get(engine.dialect.name)
+    # Solo lecturas y nunca EXPLAIN ANALYZE: el plan no debe volver a ejecutar la sentencia
+    if prefix is None or not statement.lstrip().upper().startswith('SELECT'):
+        return None
+    if isinstance(parameters, list):
+        return None
+    try:
+        with engine.connect() as connection:
+            rows = connection.exec_driver_sql(prefix + statement, parameters or ()).fetchall()
+    except SQLAlchemyError as error:
+        return f'EXPLAIN no disponible: {error.__class__.__name__}'
+    return '\n'.join(' | '.join(str(value) for value in row) for row in rows)
+
+
+class ExplainQueue:
+    """Lanza los EXPLAIN en un hilo aparte y guarda el plan en el dict de cada sentencia."""
+
+    def __init__(self, size=EXPLAIN_QUEUE_SIZE):
+        self.pending = queue.Queue(maxsize=size)
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def submit(self, engine, captured, statement, parameters):
+        self.start()
+        try:
+            self.pending.put_nowait((engine, captured, statement, parameters))
+        except queue.Full:
+            pass
+
+    def start(self):
+        # Tras un fork el hilo del proceso padre no existe en el hijo: se arranca uno por proceso
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='slowlog-explain', daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            engine, captured, statement, parameters = self.pending.get()
+            try:
+                captured['plan'] = explain(engine, statement, parameters)
+            except Exception as error:
+                captured['plan'] = f'EXPLAIN no disponible: {error.__class__.__name__}'
+            finally:
+                self.pending.task_done()
+
+
+def init_slow_query_log(app, log):
+    explainer = ExplainQueue()
+
+    @app.after_request
+    def capture_slow_request(response):
+        if 'request_started' not in g:
+            return response
+        elapsed_ms = (time.perf_counter() - g.request_started) * 1000
+        if elapsed_ms < app.config['SLOW_REQUEST_THRESHOLD_MS']:
+            return response
+
+        queries = g.get('db_queries', 0)
+        db_ms = round(g.get('db_seconds', 0.0) * 1000, 3)
+        statements = sorted(g.get('sql_statements', ()), key=lambda item: item[2], reverse=True)
+        captured = []
+        for statement, parameters, seconds, engine in statements[:STATEMENTS_PER_ENTRY]:
+            captured.append({
+                'sql': statement,
+                'parameters': redact(parameters),
+                'duration_ms': round(seconds * 1000, 3),
+                'database': engine.url.render_as_string(hide_password=True),
+                'plan': None,
+            })
+            if app.config['SLOW_QUERY_EXPLAIN']:
+                explainer.submit(engine, captured[-1], statement, parameters)
+        log.add({
+            'at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': round(elapsed_ms, 3),
+            'queries': queries,
+            'db_ms': db_ms,
+            'statements': captured,
+        })
+        return response
+
+    return explainer
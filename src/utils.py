@@ -1,4 +1,14 @@
-from flask import jsonify, url_for
+import base64
+import time
+import binascii
+from flask import jsonify, url_for, request, current_app, Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.routing import IntegerConverter
+from metrics import record_serialization
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 class APIException(Exception):
     status_code = 400
@@ -15,13 +25,134 @@ class APIException(Exception):
         rv['message'] = self.message
         return rv
 
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Proveedor JSON de Flask que codifica con orjson cuando esta instalado (varias veces mas rapido
+    que el modulo json) y si no se comporta igual que el de Flask. orjson no ordena las claves.
+    """
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def response(self, *args, **kwargs):
+        started = time.perf_counter()
+        if orjson is None:
+            response = super().response(*args, **kwargs)
+        else:
+            obj = self._prepare_response_obj(args, kwargs)
+            option = orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE
+            if (self.compact is None and self._app.debug) or self.compact is False:
+                option |= orjson.OPT_INDENT_2
+            response = self._app.response_class(orjson.dumps(obj, default=self.default, option=option), mimetype=self.mimetype)
+        record_serialization(time.perf_counter() - started)
+        return response
+
+# Mayor id que cabe en un BIGINT; por encima el driver lanza OverflowError
+MAX_ENTITY_ID = 2 ** 63 - 1
+
+def valid_entity_id(value):
+    # bool es subclase de int: {"id": true} no es un id
+    return type(value) is int and 0 < value <= MAX_ENTITY_ID
+
+class EntityIdConverter(IntegerConverter):
+    """`<int:...>` acotado a MAX_ENTITY_ID: un id mayor en la URL da 404 en vez de un 500 del driver."""
+    def __init__(self, map, fixed_digits=0, min=None, max=MAX_ENTITY_ID, signed=False):
+        super().__init__(map, fixed_digits=fixed_digits, min=min, max=max, signed=signed)
+
+# Paginacion por cursor (keyset) sobre la clave primaria
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        last_id = int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise APIException('Cursor invalido', status_code=400)
+    # Un id fuera de BIGINT llegaria al driver como OverflowError
+    if not valid_entity_id(last_id):
+        raise APIException('Cursor invalido', status_code=400)
+    return last_id
+
+def get_limit_arg(default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Lee `limit` de la query string (400 si no es un entero positivo) y lo recorta a `maximum`."""
+    limit = request.args.get('limit')
+    if limit is None:
+        return default
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise APIException('El parametro limit debe ser un entero', status_code=400)
+    if limit < 1:
+        raise APIException('El parametro limit debe ser mayor que 0', status_code=400)
+    return min(limit, maximum)
+
+def get_page_args(decode=decode_cursor):
+    """Lee `limit` y `cursor` de la query string. Devuelve (None, None) si no se pide paginacion."""
+    cursor = request.args.get('cursor')
+    if request.args.get('limit') is None and cursor is None:
+        return None, None
+    limit = get_limit_arg()
+    after_id = decode(cursor) if cursor else None
+    return limit, after_id
+
+def paginate(query, key, limit, after_id):
+    """
+    Devuelve (items, next_cursor). Cada pagina es un rango sobre `key` (la clave primaria),
+    asi la base de datos solo recorre el indice a partir del ultimo id visto.
+    """
+    if limit is None:
+        return query.all(), None
+    if after_id is not None:
+        query = query.filter(key > after_id)
+    items = query.order_by(key).limit(limit + 1).all()
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    return items, encode_cursor(getattr(items[-1], key.key))
+
+def paginate_rows(query, key, columns, limit, after_id):
+    """Como `paginate` sobre una consulta proyectada (id, *columns): devuelve dicts listos para JSON."""
+    rows, next_cursor = paginate(query, key, limit, after_id)
+    return [dict(zip(columns, row[1:])) for row in rows], next_cursor
+
+# Exportacion en streaming (NDJSON): una fila por linea
+NDJSON_MIMETYPE = 'application/x-ndjson'
+STREAM_BATCH_SIZE = 500
+
+def wants_stream():
+    if request.args.get('stream') in ('1', 'true'):
+        return True
+    return request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+def stream_rows(query, key, columns, order=None):
+    """
+    Emite cada fila de una consulta proyectada (id, *columns) como una linea JSON. La consulta se
+    recorre con `yield_per` para que el worker solo tenga en memoria un lote de filas a la vez.
+    """
+    dumps = current_app.json.dumps
+    def generate():
+        rows = query.order_by(*(order or (key,))).yield_per(STREAM_BATCH_SIZE)
+        try:
+            for row in rows:
+                yield dumps(dict(zip(columns, row[1:]))) + '\n'
+        finally:
+            # La sesion de la consulta ya salio del registro al terminar la vista: si no se cierra
+            # aqui, la conexion que abrio el streaming no vuelve nunca al pool
+            query.session.close()
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
     return len(defaults) >= len(arguments)
 
 def generate_sitemap(app):
-    links = ['/admin/']
+    links = ['/admin/'] if app.config.get('ENABLE_ADMIN', True) else []
     for rule in app.url_map.iter_rules():
         # Filter out rules we can't navigate to in a browser
         # and rules that require parameters
@@ -0,0 +1,11 @@
+# Entry point for an instance that serves Flask-Admin as well as the API:
+#   gunicorn wsgi_admin --chdir ./src/
+# API-only instances run `gunicorn wsgi` (ENABLE_ADMIN defaults to 0) and never import Flask-Admin.
+import os
+
+os.environ['ENABLE_ADMIN'] = '1'
+
+from app import app as application
+
+if __name__ == "__main__":
+    application.run()
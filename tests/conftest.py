@@ -0,0 +1,60 @@
+"""
+Fixtures comunes. La app lee su configuracion del entorno al importarse, asi que antes se apunta
+DATABASE_URL a un SQLite temporal y se desactiva el control de admision (el test client no cierra
+las respuestas que no se leen y dejaria plazas ocupadas).
+"""
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATABASE_DIR = tempfile.mkdtemp(prefix='starwars-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(DATABASE_DIR, 'test.db')
+os.environ['DATABASE_READ_URLS'] = ''
+os.environ['CACHE_VERSION_BACKEND'] = 'sqlite:///' + os.path.join(DATABASE_DIR, 'cache_versions.db')
+os.environ['ADMISSION_CONTROL'] = '0'
+os.environ['ENABLE_ADMIN'] = '1'
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from app import app as flask_app, response_cache  # noqa: E402
+from models import db  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        # Las tablas se recrean sin pasar por los handlers: los caches no deben servir filas de otro test
+        for entity in ('user', 'character', 'planet', 'starship', 'favorite'):
+            response_cache.invalidate(entity)
+        yield flask_app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def count_statements(app):
+    """`with count_statements() as statements:` deja en `statements` las sentencias SQL ejecutadas."""
+    @contextmanager
+    def counting():
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+    return counting
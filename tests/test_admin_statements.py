@@ -0,0 +1,94 @@
+"""Los listados de Flask-Admin ejecutan las mismas sentencias SQL con pocas filas que con muchas."""
+import re
+import pytest
+from sqlalchemy import delete, select
+from models import (
+    db, User, Character, Planet, Starship, FavoriteCharacter, FavoritePlanet, FavoriteStarship,
+)
+
+# conteo acotado + pagina; el de usuarios suma el UNION ALL de annotate() con sus favoritos
+LIST_VIEWS = {
+    '/admin/user/': 3,
+    '/admin/character/': 2,
+    '/admin/planet/': 2,
+    '/admin/starship/': 2,
+    '/admin/favoritecharacter/': 2,
+    '/admin/favoriteplanet/': 2,
+    '/admin/favoritestarship/': 2,
+}
+SMALL, LARGE = 3, 60
+
+
+def seed(rows, start=0):
+    for i in range(start, start + rows):
+        user = User(email=f'user{i}@example.com', password='secret', is_active=True)
+        character = Character(name=f'character {i}', height=i, weigth=i)
+        planet = Planet(name=f'planet {i}', population=i, climate='arid')
+        starship = Starship(name=f'starship {i}', model='model', manufacturer='manufacturer')
+        db.session.add_all([user, character, planet, starship])
+        db.session.flush()
+        db.session.add_all([
+            FavoriteCharacter(user_id=user.id, character_id=character.id),
+            FavoritePlanet(user_id=user.id, planet_id=planet.id),
+            FavoriteStarship(user_id=user.id, starship_id=starship.id),
+        ])
+    db.session.commit()
+    db.session.remove()
+
+
+def list_statements(client, count_statements, url):
+    with count_statements() as statements:
+        response = client.get(url)
+    assert response.status_code == 200
+    return len(statements)
+
+
+@pytest.mark.parametrize('url', sorted(LIST_VIEWS))
+def test_list_view_statements_do_not_grow_with_rows(client, count_statements, url):
+    seed(SMALL)
+    small = list_statements(client, count_statements, url)
+    seed(LARGE - SMALL, start=SMALL)
+    large = list_statements(client, count_statements, url)
+
+    assert small == large == LIST_VIEWS[url]
+
+
+@pytest.mark.parametrize('url', sorted(LIST_VIEWS))
+def test_keyset_page_statements(client, count_statements, url):
+    seed(LARGE)
+    first = list_statements(client, count_statements, url)
+    # la primera pagina deja guardado el ultimo id: la segunda se sirve por rango de id
+    second = list_statements(client, count_statements, url + '?page=1')
+
+    assert first == second == LIST_VIEWS[url]
+
+
+def test_user_list_counts_favorites(client):
+    seed(SMALL)
+    body = client.get('/admin/user/').get_data(as_text=True)
+
+    assert body.count('characters: 1, planets: 1, starships: 1') == SMALL
+
+
+def listed_ids(client, url):
+    return [int(value) for value in re.findall(r'name="rowid" class="action-checkbox" value="(\d+)"', client.get(url).get_data(as_text=True))]
+
+
+@pytest.mark.parametrize('change', ['insert', 'delete'])
+def test_keyset_pages_follow_writes(client, change):
+    seed(LARGE)
+    page_size = len(listed_ids(client, '/admin/character/'))
+    listed_ids(client, '/admin/character/?page=1')
+
+    # la escritura desplaza las paginas: el limite guardado para la pagina 1 ya no vale
+    if change == 'insert':
+        db.session.add_all([Character(name=f'new {i}', height=i, weigth=i) for i in range(5)])
+    else:
+        newest = db.session.scalars(select(Character.id).order_by(Character.id.desc()).limit(5)).all()
+        db.session.execute(delete(FavoriteCharacter).where(FavoriteCharacter.character_id.in_(newest)))
+        db.session.execute(delete(Character).where(Character.id.in_(newest)))
+    db.session.commit()
+    ids = db.session.scalars(select(Character.id).order_by(Character.id.desc())).all()
+    db.session.remove()
+
+    assert listed_ids(client, '/admin/character/?page=1') == ids[page_size:2 * page_size]
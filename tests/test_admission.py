@@ -0,0 +1,93 @@
+"""Control de admision: 503 + Retry-After cuando una clase de peticiones no cabe a tiempo."""
+import threading
+import time
+import pytest
+from flask import Flask
+import app as app_module
+from admission import ADMISSION_CLASSES, AdmissionControl, default_limits
+
+
+@pytest.fixture
+def admission(app):
+    control = app_module.admission
+    saved = {name: (gate.limit, gate.queue, gate.timeout) for name, gate in control.gates.items()}
+    control.enabled = True
+    yield control
+    control.enabled = False
+    for name, (limit, queue, timeout) in saved.items():
+        gate = control.gates[name]
+        gate.limit, gate.queue, gate.timeout, gate.active, gate.waiting = limit, queue, timeout, 0, 0
+
+
+def test_default_limits_follow_worker_concurrency():
+    limits = default_limits(4)
+
+    assert limits['read'][:2] == (3, 16)
+    assert limits['write'][0] == limits['favorites'][0] == 2
+    assert limits['bulk'][0] == 1
+    # sin gunicorn (servidor de desarrollo) se usan los valores fijos
+    assert default_limits(0) == ADMISSION_CLASSES
+
+
+def test_concurrency_comes_from_gunicorn_threads(monkeypatch):
+    monkeypatch.setenv('GUNICORN_THREADS', '8')
+    monkeypatch.delenv('ADMISSION_CONCURRENCY', raising=False)
+    monkeypatch.delenv('ADMISSION_READ_LIMIT', raising=False)
+
+    assert AdmissionControl(Flask('threads')).gates['read'].limit == 7
+
+
+def test_full_gate_sheds_with_retry_after_and_cors(client, admission):
+    gate = admission.gates['read']
+    gate.limit, gate.queue, gate.active = 1, 0, 1
+
+    response = client.get('/planets', headers={'Origin': 'https://example.com'})
+
+    assert response.status_code == 503
+    assert int(response.headers['Retry-After']) >= 1
+    assert response.headers['Access-Control-Allow-Origin'] == 'https://example.com'
+    assert response.headers['Access-Control-Expose-Headers'] == 'Retry-After'
+    assert 'admission_shed_total{class="read",reason="queue_full"}' in client.get('/metrics').get_data(as_text=True)
+
+
+def test_preflight_and_exempt_endpoints_are_not_limited(client, admission):
+    for gate in admission.gates.values():
+        gate.limit, gate.queue, gate.active = 1, 0, 1
+
+    preflight = client.options('/planet', headers={'Origin': 'https://example.com', 'Access-Control-Request-Method': 'POST'})
+
+    assert preflight.status_code == 200
+    assert client.get('/metrics').status_code == 200
+    assert client.get('/nope').status_code == 404
+
+
+def test_request_that_waited_too_long_upstream_is_dropped(client, admission):
+    admission.gates['read'].timeout = 1
+    started = f't={int((time.time() - 5) * 1000)}'
+
+    assert client.get('/planets', headers={'X-Request-Start': started}).status_code == 503
+
+
+def test_queued_request_runs_when_a_slot_frees(app, admission):
+    gate = admission.gates['read']
+    gate.limit, gate.queue, gate.timeout = 1, 4, 5
+    holder = app.test_client().get('/planets', buffered=False)
+    assert gate.active == 1
+
+    statuses = []
+
+    def wait_for_slot():
+        response = app.test_client().get('/planets')
+        statuses.append(response.status_code)
+        response.close()
+
+    waiter = threading.Thread(target=wait_for_slot)
+    waiter.start()
+    while gate.waiting == 0 and waiter.is_alive():
+        time.sleep(0.01)
+    # cerrar la primera respuesta libera su plaza
+    holder.close()
+    waiter.join(5)
+
+    assert statuses == [200]
+    assert gate.active == 0
@@ -0,0 +1,32 @@
+"""Almacenes de versiones del cache de respuestas."""
+import pytest
+from cache import MemoryVersionStore, SQLiteVersionStore, VersionStore, version_store_from_url
+
+
+def test_memory_store_refused_with_several_workers():
+    assert isinstance(version_store_from_url('memory'), MemoryVersionStore)
+    with pytest.raises(ValueError):
+        version_store_from_url('memory', workers=4)
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    url = 'sqlite:///' + str(tmp_path / 'versions.db')
+    first, second = version_store_from_url(url, workers=4), version_store_from_url(url, workers=4)
+    assert isinstance(first, SQLiteVersionStore)
+
+    first.incr('planet')
+
+    assert second.get('planet') == 1
+    assert first.epoch() == second.epoch()
+
+
+def test_incomplete_version_store_fails_on_creation():
+    class NoEpoch(VersionStore):
+        def get(self, entity):
+            return 0
+
+        def incr(self, entity):
+            return 1
+
+    with pytest.raises(TypeError):
+        NoEpoch()
@@ -0,0 +1,41 @@
+"""Sincronizacion incremental con /changes."""
+import base64
+import json
+from datetime import timedelta
+import pytest
+from models import db, utcnow, Character
+
+
+def token(timestamp, rank, row_id):
+    return base64.urlsafe_b64encode(json.dumps([timestamp, rank, row_id]).encode()).decode().rstrip('=')
+
+
+def test_changes_walks_every_row(app, client):
+    past = utcnow() - timedelta(minutes=1)
+    db.session.add_all([
+        Character(name=f'character {i}', height=i, weigth=i, created_at=past, updated_at=past) for i in range(3)
+    ])
+    db.session.commit()
+
+    seen, since = [], None
+    while True:
+        body = client.get('/changes', query_string={'limit': 2, **({'since': since} if since else {})}).get_json()
+        seen += [change['data']['name'] for change in body['changes']]
+        since = body['next_token']
+        if not body['has_more']:
+            break
+
+    assert seen == ['character 0', 'character 1', 'character 2']
+
+
+@pytest.mark.parametrize('since', [
+    token('2024-01-01T00:00:00+02:00', 0, 1),
+    token('2024-01-01T00:00:00', 0, 2 ** 70),
+    token('2024-01-01T00:00:00', 0, 0),
+    token('2024-01-01T00:00:00', 9, 1),
+    token('2024-01-01T00:00:00', True, 1),
+    token('yesterday', 0, 1),
+    'not base64!',
+])
+def test_invalid_token_is_rejected(app, client, since):
+    assert client.get('/changes', query_string={'since': since}).status_code == 400
@@ -0,0 +1,86 @@
+"""Compresion de respuestas segun Accept-Encoding."""
+import gzip
+import json
+import pytest
+import compression
+from models import db, Planet, User
+
+
+@pytest.fixture
+def planets(app):
+    # Suficientes filas para pasar de COMPRESSION_MIN_SIZE
+    db.session.add_all([Planet(name=f'planet {i}', population=i, climate='temperate') for i in range(100)])
+    db.session.commit()
+    db.session.remove()
+
+
+def cache_compressions():
+    return sum(count for (_, source), (count, _, _) in compression.stats.counts.items() if source == 'cache')
+
+
+def test_gzip_when_accepted(client, planets):
+    response = client.get('/planets', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert response.headers['ETag'].startswith('W/')
+    assert len(json.loads(gzip.decompress(response.get_data()))['planet']) == 100
+
+
+def test_identity_without_accept_encoding(client, planets):
+    response = client.get('/planets')
+
+    assert 'Content-Encoding' not in response.headers
+    assert len(response.get_json()['planet']) == 100
+
+
+@pytest.mark.parametrize('header', ['gzip;q=0', 'identity', 'compress'])
+def test_refused_or_unknown_codings_are_not_used(client, planets, header):
+    assert 'Content-Encoding' not in client.get('/planets', headers={'Accept-Encoding': header}).headers
+
+
+def test_small_bodies_are_not_compressed(client, planets):
+    response = client.get('/planets?limit=1', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_disabled(app, client, planets):
+    app.config['COMPRESSION_ENABLED'] = False
+    try:
+        assert 'Content-Encoding' not in client.get('/planets', headers={'Accept-Encoding': 'gzip'}).headers
+    finally:
+        app.config['COMPRESSION_ENABLED'] = True
+
+
+def test_cached_listing_is_compressed_once_per_version(client, planets):
+    before = cache_compressions()
+    first = client.get('/planets', headers={'Accept-Encoding': 'gzip'})
+    second = client.get('/planets', headers={'Accept-Encoding': 'gzip'})
+
+    assert (first.headers['X-Cache'], second.headers['X-Cache']) == ('MISS', 'HIT')
+    assert second.get_data() == first.get_data()
+    assert cache_compressions() - before == 1
+
+    client.post('/planet', json={'name': 'hoth', 'population': 0, 'climate': 'frozen'})
+    client.get('/planets', headers={'Accept-Encoding': 'gzip'})
+    assert cache_compressions() - before == 2
+
+
+def test_uncached_responses_are_compressed_on_the_fly(client):
+    db.session.add_all([User(email=f'user{i}@example.com', password='secret', is_active=True) for i in range(100)])
+    db.session.commit()
+
+    response = client.get('/users', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'X-Cache' not in response.headers
+    assert len(json.loads(gzip.decompress(response.get_data()))['user']) == 100
+
+
+def test_streamed_ndjson_is_not_compressed(client, planets):
+    response = client.get('/planets?stream=1', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in response.headers
+    assert len(response.get_data(as_text=True).splitlines()) == 100
+    response.close()
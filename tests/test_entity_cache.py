@@ -0,0 +1,66 @@
+"""Cache de filas sueltas de los GET por id."""
+import threading
+import time
+from cache import EntityCache
+from models import db, Planet
+
+
+def test_row_is_tied_to_the_entity_version():
+    cache = EntityCache()
+    loads = []
+
+    def load():
+        loads.append(1)
+        return b'{"id": 1}'
+
+    assert cache.get_or_load('planet', 1, 0, load) == b'{"id": 1}'
+    assert cache.get_or_load('planet', 1, 0, load) == b'{"id": 1}'
+    assert len(loads) == 1
+    # otra version (una escritura en cualquier worker) es un fallo
+    cache.get_or_load('planet', 1, 1, load)
+    assert len(loads) == 2
+
+
+def test_missing_row_is_coalesced_and_cached():
+    cache = EntityCache()
+    loads = []
+    started = threading.Event()
+
+    def load():
+        loads.append(1)
+        started.set()
+        time.sleep(0.2)
+        return None
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_load('planet', 9, 0, load)))
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=lambda: results.append(cache.get_or_load('planet', 9, 0, load))) for _ in range(5)]
+    for thread in followers:
+        thread.start()
+    for thread in [leader] + followers:
+        thread.join()
+
+    assert results == [None] * 6
+    assert len(loads) == 1
+    assert cache.stats()['coalesced'] == 5
+    # la entrada negativa sirve hasta que cambia la version
+    assert cache.get_or_load('planet', 9, 0, load) is None
+    assert len(loads) == 1
+    cache.get_or_load('planet', 9, 1, load)
+    assert len(loads) == 2
+
+
+def test_missing_row_appears_after_insert(client, count_statements):
+    assert client.get('/planet/1').status_code == 404
+    with count_statements() as statements:
+        assert client.get('/planet/1').status_code == 404
+    assert statements == []
+
+    db.session.add(Planet(name='tatooine', population=200000, climate='arid'))
+    db.session.commit()
+
+    response = client.get('/planet/1')
+    assert response.status_code == 200
+    assert response.get_json()['planet']['name'] == 'tatooine'
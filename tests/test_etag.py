@@ -0,0 +1,114 @@
+"""ETag y GET condicional de los endpoints de lectura."""
+import sys
+import types
+import pytest
+from cache import RedisVersionStore, etag_for
+from models import db, User, Planet
+
+READ_URLS = ['/characters', '/planets', '/starships', '/users', '/user_favorites/1', '/planet/1']
+
+
+@pytest.fixture
+def data(app):
+    db.session.add(User(email='luke@example.com', password='secret', is_active=True))
+    db.session.add(Planet(name='tatooine', population=1, climate='arid'))
+    db.session.commit()
+    db.session.remove()
+
+
+@pytest.mark.parametrize('url', READ_URLS)
+def test_matching_etag_answers_304_without_sql(client, data, count_statements, url):
+    etag = client.get(url).headers['ETag']
+    with count_statements() as statements:
+        response = client.get(url, headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert response.get_data() == b''
+    assert statements == []
+
+
+def test_weak_etag_of_a_compressed_variant_matches(client, data):
+    etag = client.get('/planets').headers['ETag'].strip('"')
+
+    assert client.get('/planets', headers={'If-None-Match': f'W/"{etag}"'}).status_code == 304
+
+
+def test_write_changes_the_etag(client, data):
+    etag = client.get('/planets').headers['ETag']
+    client.post('/planet', json={'name': 'hoth', 'population': 0, 'climate': 'frozen'})
+
+    response = client.get('/planets', headers={'If-None-Match': etag})
+
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_etag_depends_on_query_string_and_format(client, data):
+    plain = client.get('/planets').headers['ETag']
+
+    assert client.get('/planets?limit=1').headers['ETag'] != plain
+    assert client.get('/planets', headers={'Accept': 'application/x-ndjson'}).headers['ETag'] != plain
+
+
+def test_errors_carry_no_etag(client, data):
+    assert 'ETag' not in client.get('/user_favorites/99').headers
+
+
+class FakeRedis:
+    """Lo justo de redis.Redis para contar viajes al servidor."""
+
+    def __init__(self):
+        self.data = {}
+        self.calls = []
+
+    def get(self, key):
+        self.calls.append('get')
+        return self.data.get(key)
+
+    def mget(self, keys):
+        self.calls.append('mget')
+        return [self.data.get(key) for key in keys]
+
+    def setnx(self, key, value):
+        self.calls.append('setnx')
+        self.data.setdefault(key, value.encode())
+
+    def incr(self, key):
+        self.calls.append('incr')
+        self.data[key] = str(int(self.data.get(key, b'0')) + 1).encode()
+        return int(self.data[key])
+
+
+@pytest.fixture
+def redis_store(monkeypatch):
+    server = FakeRedis()
+    monkeypatch.setitem(sys.modules, 'redis',
+                        types.SimpleNamespace(Redis=types.SimpleNamespace(from_url=lambda url: server)))
+    return RedisVersionStore('redis://localhost:6379/0'), server
+
+
+def test_redis_etag_is_one_mget(redis_store):
+    store, server = redis_store
+    cache = types.SimpleNamespace(versions=store)
+    first = etag_for(cache, ('planet', 'user'))
+    store.incr('planet')
+    server.calls.clear()
+
+    second = etag_for(cache, ('planet', 'user'))
+
+    assert server.calls == ['mget']
+    assert second != first
+    assert store.snapshot(['planet', 'user'])[1] == [1, 0]
+
+
+def test_flushed_redis_changes_every_etag(redis_store):
+    store, server = redis_store
+    cache = types.SimpleNamespace(versions=store)
+    before = etag_for(cache, ('planet',))
+
+    # Redis reiniciado: los contadores vuelven a 0 pero el epoch es otro
+    server.data.clear()
+
+    assert etag_for(cache, ('planet',)) != before
+    assert store.epoch() == server.data['cache-version:__epoch__'].decode()
@@ -0,0 +1,86 @@
+"""POST /user/<id>/favorites:batch: varias altas y bajas de favoritos en una transaccion."""
+import json
+import pytest
+from models import db, User, Character, Planet, Starship
+
+
+@pytest.fixture
+def catalog(app, client):
+    db.session.add(User(email='luke@example.com', password='secret', is_active=True))
+    for i in range(3):
+        db.session.add_all([
+            Character(name=f'character {i}', height=i, weigth=i),
+            Planet(name=f'planet {i}', population=i, climate='arid'),
+            Starship(name=f'starship {i}', model='model', manufacturer='manufacturer'),
+        ])
+    db.session.commit()
+    assert client.post('/user/1/favorite/planet/1').status_code == 200
+
+
+def batch(client, operations, user_id=1):
+    # json.dumps y no json=: el proveedor de la app (orjson) no codifica enteros de mas de 64 bits
+    return client.post(f'/user/{user_id}/favorites:batch', data=json.dumps({'operations': operations}),
+                       content_type='application/json')
+
+
+def test_mixed_operations_report_each_result(client, catalog, count_statements):
+    operations = [
+        {'op': 'add', 'type': 'character', 'id': 1},
+        {'op': 'add', 'type': 'character', 'id': 1},
+        {'op': 'add', 'type': 'starship', 'id': 2},
+        {'op': 'remove', 'type': 'planet', 'id': 1},
+        {'op': 'remove', 'type': 'planet', 'id': 2},
+        {'op': 'add', 'type': 'planet', 'id': 99},
+        {'op': 'rename', 'type': 'planet', 'id': 1},
+    ]
+    with count_statements() as statements:
+        response = batch(client, operations)
+
+    assert response.status_code == 200
+    assert [result['status'] for result in response.get_json()['results']] == [
+        'added', 'already_favorite', 'added', 'removed', 'not_favorite', 'not_found', 'invalid',
+    ]
+    # usuario + (entidades, favoritos) por tipo + insert/delete/contadores por tipo con cambios
+    assert len(statements) <= 14, statements
+
+    favorites = client.get('/user_favorites/1').get_json()
+    assert [row['name'] for row in favorites['favorites_characters']] == ['character 0']
+    assert [row['name'] for row in favorites['favorites_starships']] == ['starship 1']
+    assert favorites['favorites_planets'] == []
+    assert db.session.get(Character, 1).favorite_count == 1
+    assert db.session.get(Planet, 1).favorite_count == 0
+
+
+def test_add_then_remove_in_the_same_batch_is_a_no_op(client, catalog):
+    response = batch(client, [
+        {'op': 'add', 'type': 'character', 'id': 2},
+        {'op': 'remove', 'type': 'character', 'id': 2},
+    ])
+
+    assert [result['status'] for result in response.get_json()['results']] == ['added', 'removed']
+    assert client.get('/user_favorites/1').get_json()['favorites_characters'] == []
+
+
+@pytest.mark.parametrize('entity_id', [True, 0, -1, 2 ** 63, 2 ** 70, '1', 1.0, None])
+def test_invalid_ids_are_reported_not_raised(client, catalog, entity_id):
+    response = batch(client, [{'op': 'add', 'type': 'character', 'id': entity_id}])
+
+    assert response.status_code == 200
+    assert response.get_json()['results'] == [{'op': 'add', 'type': 'character', 'id': None, 'status': 'invalid'}]
+
+
+@pytest.mark.parametrize('body', [[], 'operations', 5, {'operations': 'add'}, {}])
+def test_body_must_be_an_object_with_operations(client, catalog, body):
+    assert client.post('/user/1/favorites:batch', json=body).status_code == 400
+
+
+def test_non_object_operations_are_invalid(client, catalog):
+    response = batch(client, [['add', 'character', 1]])
+
+    assert response.get_json()['results'] == [{'status': 'invalid'}]
+
+
+def test_limits(client, catalog):
+    assert batch(client, [{'op': 'add', 'type': 'character', 'id': 1}] * 501).status_code == 400
+    assert batch(client, [], user_id=99).status_code == 404
+    assert client.post(f'/user/{2 ** 70}/favorites:batch', json={'operations': []}).status_code == 404
@@ -0,0 +1,74 @@
+"""El numero de sentencias SQL de los endpoints de favoritos no crece con el numero de favoritos."""
+import pytest
+from models import (
+    db, User, Character, Planet, Starship, FavoriteCharacter, FavoritePlanet, FavoriteStarship,
+)
+
+# usuario + una consulta por cada tipo de favorito (selectinload)
+GET_FAVORITES_STATEMENTS = 4
+# INSERT del favorito + UPDATE del contador de la entidad
+ADD_FAVORITE_STATEMENTS = 2
+
+
+def new_entity(kind, i):
+    if kind == 'character':
+        return Character(name=f'character {i}', height=i, weigth=i)
+    if kind == 'planet':
+        return Planet(name=f'planet {i}', population=i, climate='arid')
+    return Starship(name=f'starship {i}', model='model', manufacturer='manufacturer')
+
+
+def seed_user(favorites):
+    user = User(email=f'user{favorites}@example.com', password='secret', is_active=True)
+    db.session.add(user)
+    for i in range(favorites):
+        character, planet, starship = (new_entity(kind, i) for kind in ('character', 'planet', 'starship'))
+        db.session.add_all([character, planet, starship])
+        db.session.flush()
+        db.session.add_all([
+            FavoriteCharacter(user_id=user.id, character_id=character.id),
+            FavoritePlanet(user_id=user.id, planet_id=planet.id),
+            FavoriteStarship(user_id=user.id, starship_id=starship.id),
+        ])
+    db.session.commit()
+    return user.id
+
+
+@pytest.mark.parametrize('favorites', [1, 20])
+def test_get_favorites_statement_count(client, count_statements, favorites):
+    user_id = seed_user(favorites)
+    db.session.remove()
+
+    with count_statements() as statements:
+        response = client.get(f'/user_favorites/{user_id}')
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert len(body['favorites_characters']) == favorites
+    assert len(body['favorites_planets']) == favorites
+    assert len(body['favorites_starships']) == favorites
+    assert len(statements) == GET_FAVORITES_STATEMENTS, statements
+
+
+def test_get_favorites_unknown_user_statement_count(client, count_statements):
+    with count_statements() as statements:
+        response = client.get('/user_favorites/999')
+
+    assert response.status_code == 404
+    assert len(statements) == 1, statements
+
+
+@pytest.mark.parametrize('kind', ['character', 'planet', 'starship'])
+def test_add_favorite_statement_count(client, count_statements, kind):
+    user_id = seed_user(1)
+    target = new_entity(kind, 99)
+    db.session.add(target)
+    db.session.commit()
+    target_id = target.id
+    db.session.remove()
+
+    with count_statements() as statements:
+        response = client.post(f'/user/{user_id}/favorite/{kind}/{target_id}')
+
+    assert response.status_code == 200
+    assert len(statements) == ADD_FAVORITE_STATEMENTS, statements
@@ -0,0 +1,106 @@
+"""Carga masiva del catalogo: POST /import/<entidad> y `flask import-catalog`."""
+import json
+import pytest
+from importer import MAX_BATCH_SIZE
+from models import db, Planet
+
+
+def planet(name, population=1, climate='arid'):
+    return {'name': name, 'population': population, 'climate': climate}
+
+
+def import_json(client, entity, records, **query):
+    return client.post(f'/import/{entity}', query_string=query, json=records)
+
+
+def import_ndjson(client, entity, lines):
+    return client.post(f'/import/{entity}', data='\n'.join(lines), content_type='application/x-ndjson')
+
+
+def planets():
+    return {row.name: (row.population, row.climate) for row in db.session.query(Planet)}
+
+
+def test_import_inserts_in_batches(client):
+    response = import_json(client, 'planet', [planet(f'planet {i}', i) for i in range(7)], batch_size=3)
+
+    assert response.status_code == 200
+    summary = response.get_json()
+    assert (summary['received'], summary['imported'], summary['invalid']) == (7, 7, 0)
+    assert len(planets()) == 7
+
+
+def test_reimport_updates_existing_rows(client):
+    import_json(client, 'planet', [planet('tatooine', 200000), planet('hoth', 0, 'frozen')])
+
+    import_json(client, 'planet', [planet('tatooine', 250000, 'desert')])
+
+    assert planets() == {'tatooine': (250000, 'desert'), 'hoth': (0, 'frozen')}
+
+
+def test_repeated_name_in_a_batch_keeps_the_last(client):
+    response = import_json(client, 'planet', [planet('tatooine', 1), planet('tatooine', 2)])
+
+    assert response.get_json()['imported'] == 1
+    assert planets() == {'tatooine': (2, 'arid')}
+
+
+def test_ndjson_body(client):
+    response = import_ndjson(client, 'planet', [json.dumps(planet('tatooine')), '', '{not json', json.dumps(planet('hoth'))])
+
+    summary = response.get_json()
+    assert (summary['received'], summary['imported'], summary['invalid']) == (3, 2, 1)
+    assert summary['errors'] == [{'row': 2, 'msg': 'Linea 3: JSON invalido'}]
+
+
+@pytest.mark.parametrize('record', [
+    'tatooine',
+    {'name': 'tatooine', 'population': 1},
+    planet('', 1),
+    planet(5, 1),
+    planet('tatooine', True),
+    planet('tatooine', 1.5),
+    planet('tatooine', '1'),
+    planet('tatooine', 2 ** 40),
+    planet('tatooine', 1, 7),
+    planet('tatooine', 1, 'x' * 121),
+    planet('x' * 81, 1),
+])
+def test_invalid_records_are_reported_and_skipped(client, record):
+    response = import_json(client, 'planet', [record, planet('hoth')])
+
+    assert response.status_code == 200
+    summary = response.get_json()
+    assert (summary['imported'], summary['invalid']) == (1, 1)
+    assert summary['errors'][0]['row'] == 1
+    assert list(planets()) == ['hoth']
+
+
+@pytest.mark.parametrize('batch_size', [0, -1, MAX_BATCH_SIZE + 1])
+def test_batch_size_is_bounded(client, batch_size):
+    assert import_json(client, 'planet', [planet('hoth')], batch_size=batch_size).status_code == 400
+
+
+def test_unknown_entity_and_body(client):
+    assert import_json(client, 'user', [{'name': 'luke'}]).status_code == 404
+    assert import_json(client, 'planet', {'name': 'hoth'}).status_code == 400
+
+
+def test_import_refreshes_cached_rows(client):
+    import_json(client, 'planet', [planet('tatooine', 1)])
+    assert client.get('/planet/1').get_json()['planet']['population'] == 1
+
+    import_json(client, 'planet', [planet('tatooine', 2)])
+
+    assert client.get('/planet/1').get_json()['planet']['population'] == 2
+
+
+def test_cli_command(app, tmp_path):
+    source = tmp_path / 'planets.ndjson'
+    source.write_text('\n'.join(json.dumps(planet(f'planet {i}')) for i in range(3)) + '\n{"name": "broken"}\n')
+
+    result = app.test_cli_runner().invoke(args=['import-catalog', 'planet', str(source), '--batch-size', '2'])
+
+    assert result.exit_code == 0, result.output
+    assert '3 planet importados, 1 invalidos' in result.output
+    assert len(planets()) == 3
@@ -0,0 +1,17 @@
+"""Todos los endpoints con `limit` responden igual ante valores no validos."""
+import pytest
+
+ENDPOINTS = ['/characters', '/users', '/popular/planet', '/changes']
+
+
+@pytest.mark.parametrize('url', ENDPOINTS)
+@pytest.mark.parametrize('limit', ['abc', '0', '-3', '1.5'])
+def test_invalid_limit_is_rejected(client, url, limit):
+    response = client.get(url, query_string={'limit': limit})
+
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('url', ENDPOINTS)
+def test_valid_limit(client, url):
+    assert client.get(url, query_string={'limit': '5'}).status_code == 200
@@ -0,0 +1,72 @@
+"""Filtros, orden y cursores de los listados del catalogo."""
+import base64
+import json
+import pytest
+from models import db, Planet
+
+
+def sort_cursor(value, last_id):
+    return base64.urlsafe_b64encode(json.dumps([value, last_id]).encode()).decode().rstrip('=')
+
+
+@pytest.fixture
+def planets(app):
+    db.session.add_all([Planet(name=f'planet {i}', population=i % 3, climate='arid') for i in range(7)])
+    db.session.add(Planet(name='tatooine', population=5, climate='desert'))
+    db.session.commit()
+
+
+def test_sorted_cursor_walks_every_row(client, planets):
+    seen, cursor = [], None
+    while True:
+        query = {'sort': '-population', 'limit': 3, **({'cursor': cursor} if cursor else {})}
+        body = client.get('/planets', query_string=query).get_json()
+        seen += [(row['population'], row['name']) for row in body['planet']]
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+
+    assert len(seen) == 8
+    assert [population for population, _ in seen] == [5, 2, 2, 1, 1, 0, 0, 0]
+
+
+@pytest.mark.parametrize('cursor', [
+    sort_cursor({'a': 1}, 1),
+    sort_cursor('many', 1),
+    sort_cursor(True, 1),
+    sort_cursor(1.5, 1),
+    sort_cursor(2 ** 70, 1),
+    sort_cursor(1, 2 ** 70),
+    sort_cursor(1, 0),
+    sort_cursor(1, '3'),
+    'not base64!',
+])
+def test_invalid_sort_cursor_is_rejected(client, planets, cursor):
+    response = client.get('/planets', query_string={'sort': 'population', 'limit': 2, 'cursor': cursor})
+
+    assert response.status_code == 400
+
+
+def test_string_sort_cursor_needs_a_string(client, planets):
+    response = client.get('/planets', query_string={'sort': 'name', 'limit': 2, 'cursor': sort_cursor(5, 1)})
+
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('prefix, expected', [
+    ('planet', 7),
+    ('tat', 1),
+    ('%', 0),
+    ('\U0010ffff', 0),
+    ('planet\U0010ffff', 0),
+])
+def test_prefix_filter(client, planets, prefix, expected):
+    response = client.get('/planets', query_string={'name__prefix': prefix})
+
+    assert response.status_code == 200
+    assert len(response.get_json()['planet']) == expected
+
+
+@pytest.mark.parametrize('query', [{'population': 'many'}, {'population__gt': str(2 ** 70)}, {'climate__gt': 'a'}, {'secret': '1'}])
+def test_invalid_filter_is_rejected(client, planets, query):
+    assert client.get('/planets', query_string=query).status_code == 400
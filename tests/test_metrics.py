@@ -0,0 +1,27 @@
+"""Instrumentacion de las consultas SQL."""
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from models import db
+
+
+def test_failed_statement_does_not_leave_its_start_behind(app):
+    connection = db.session.connection()
+    with pytest.raises(OperationalError):
+        connection.execute(text('SELECT * FROM missing_table'))
+
+    assert connection.info.get('query_started') == []
+    db.session.rollback()
+
+
+def test_failed_favorite_insert_is_counted(client, app):
+    app.config['METRICS_SERVER_TIMING'] = True
+    client.post('/user', json={'email': 'luke@example.com', 'password': 'secret'})
+
+    # la clave foranea rechaza el INSERT: la sentencia fallida cuenta y las siguientes tambien
+    response = client.post('/user/1/favorite/planet/99')
+
+    assert response.status_code == 404
+    timing = [value for value in response.headers.getlist('Server-Timing') if value.startswith('db;')]
+    assert 'desc="4 queries"' in timing[0]
+    app.config.pop('METRICS_SERVER_TIMING')
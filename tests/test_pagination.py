@@ -0,0 +1,32 @@
+"""Paginacion por cursor de los listados."""
+import base64
+import pytest
+from models import db, Character
+
+
+def raw_cursor(value):
+    return base64.urlsafe_b64encode(str(value).encode()).decode().rstrip('=')
+
+
+def test_cursor_walks_every_row(app, client):
+    db.session.add_all([Character(name=f'character {i}', height=i, weigth=i) for i in range(5)])
+    db.session.commit()
+
+    names, cursor = [], None
+    while True:
+        response = client.get('/characters', query_string={'limit': 2, **({'cursor': cursor} if cursor else {})})
+        assert response.status_code == 200
+        body = response.get_json()
+        names += [row['name'] for row in body['character']]
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+
+    assert names == [f'character {i}' for i in range(5)]
+
+
+@pytest.mark.parametrize('cursor', ['not base64!', raw_cursor('abc'), raw_cursor(0), raw_cursor(-5), raw_cursor(2 ** 70)])
+def test_invalid_cursor_is_rejected(app, client, cursor):
+    response = client.get('/characters', query_string={'limit': 2, 'cursor': cursor})
+
+    assert response.status_code == 400
@@ -0,0 +1,106 @@
+"""Cache de respuestas de los listados e invalidacion al confirmar escrituras."""
+import pytest
+from sqlalchemy import update
+import app as app_module
+from cache import ResponseCache, version_store_from_url
+from models import db, Planet
+
+
+@pytest.fixture
+def planets(app):
+    db.session.add_all([Planet(name=f'planet {i}', population=i, climate='arid') for i in range(3)])
+    db.session.commit()
+    db.session.remove()
+
+
+def names(response):
+    return sorted(row['name'] for row in response.get_json()['planet'])
+
+
+def test_second_read_is_served_from_memory(client, planets, count_statements):
+    assert client.get('/planets').headers['X-Cache'] == 'MISS'
+    with count_statements() as statements:
+        response = client.get('/planets')
+
+    assert response.headers['X-Cache'] == 'HIT'
+    assert statements == []
+    assert names(response) == ['planet 0', 'planet 1', 'planet 2']
+
+
+def test_query_string_is_part_of_the_key(client, planets):
+    client.get('/planets')
+
+    assert client.get('/planets?climate=arid').headers['X-Cache'] == 'MISS'
+
+
+@pytest.mark.parametrize('write', [
+    lambda client: client.post('/planet', json={'name': 'hoth', 'population': 0, 'climate': 'frozen'}),
+    lambda client: client.put('/planet/1', json={'name': 'hoth'}),
+    lambda client: client.delete('/planet/1'),
+])
+def test_handlers_invalidate_the_listing(client, planets, write):
+    before = names(client.get('/planets'))
+
+    assert write(client).status_code == 200
+
+    response = client.get('/planets')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert names(response) != before
+
+
+def test_orm_bulk_update_invalidates_on_commit(client, planets):
+    client.get('/planets')
+    db.session.execute(update(Planet).where(Planet.id == 1).values(name='hoth'))
+    db.session.commit()
+
+    assert 'hoth' in names(client.get('/planets'))
+
+
+def test_rollback_keeps_the_cached_body(client, planets):
+    client.get('/planets')
+    db.session.execute(update(Planet).where(Planet.id == 1).values(name='hoth'))
+    db.session.rollback()
+
+    assert client.get('/planets').headers['X-Cache'] == 'HIT'
+
+
+def test_write_in_another_worker_invalidates(client, planets):
+    client.get('/planets')
+    # otro proceso con el mismo almacen de versiones
+    other_worker = version_store_from_url(app_module.app.config['CACHE_VERSION_BACKEND'])
+    other_worker.incr('planet')
+
+    assert client.get('/planets').headers['X-Cache'] == 'MISS'
+
+
+def test_stats_count_hits_and_misses(client, planets):
+    before = client.get('/cache/stats').get_json()
+    client.get('/planets?limit=2')
+    client.get('/planets?limit=2')
+    after = client.get('/cache/stats').get_json()
+
+    assert after['hits'] - before['hits'] == 1
+    assert after['misses'] - before['misses'] == 1
+
+
+def test_lru_eviction_by_entries_and_bytes():
+    cache = ResponseCache(max_entries=2, max_bytes=10)
+    for key in 'abc':
+        cache.set('planet', 0, key, b'xx')
+    assert cache.get('planet', 0, 'a') is None
+    assert cache.get('planet', 0, 'c') == b'xx'
+
+    cache.set('planet', 0, 'd', b'x' * 9)
+    assert cache.stats()['bytes'] <= 10
+    # un cuerpo mayor que todo el cache no se guarda
+    cache.set('planet', 0, 'e', b'x' * 11)
+    assert cache.get('planet', 0, 'e') is None
+
+
+def test_body_for_an_old_version_is_not_stored():
+    cache = ResponseCache()
+    cache.invalidate('planet')
+
+    cache.set('planet', 0, 'a', b'old')
+
+    assert cache.get('planet', 0, 'a') is None
@@ -0,0 +1,55 @@
+"""Registro de peticiones lentas y sus planes EXPLAIN."""
+import time
+import pytest
+from sqlalchemy import create_engine
+import app as app_module
+from slowlog import ExplainQueue
+
+
+def wait_for_plans(statements, timeout=5):
+    deadline = time.monotonic() + timeout
+    while any(statement['plan'] is None for statement in statements) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_explain_runs_on_the_engine_that_ran_the_statement(tmp_path):
+    replica = create_engine('sqlite:///' + str(tmp_path / 'replica.db'))
+    with replica.begin() as connection:
+        connection.exec_driver_sql('CREATE TABLE only_on_replica (id INTEGER PRIMARY KEY)')
+    captured = {'plan': None}
+
+    ExplainQueue().submit(replica, captured, 'SELECT id FROM only_on_replica WHERE id = ?', (1,))
+    wait_for_plans([captured])
+
+    assert 'only_on_replica' in captured['plan']
+
+
+def test_writes_are_not_explained(tmp_path):
+    engine = create_engine('sqlite:///' + str(tmp_path / 'db.sqlite'))
+    captured = {'plan': 'pending'}
+    queue = ExplainQueue()
+
+    queue.submit(engine, captured, 'DELETE FROM anything', ())
+    queue.pending.join()
+
+    assert captured['plan'] is None
+
+
+@pytest.fixture
+def slow_log(app):
+    app.config['SLOW_REQUEST_THRESHOLD_MS'] = 0
+    app_module.slow_query_log.clear()
+    yield app_module.slow_query_log
+    app.config['SLOW_REQUEST_THRESHOLD_MS'] = 500
+
+
+def test_slow_request_is_logged_with_redacted_parameters_and_plan(client, slow_log):
+    client.get('/user_favorites/1')
+
+    entry = slow_log.snapshot()[0]
+    assert entry['path'] == '/user_favorites/1'
+    statement = entry['statements'][0]
+    assert set(statement['parameters']) == {'int'}
+    assert statement['database'].startswith('sqlite:///')
+    wait_for_plans(entry['statements'])
+    assert statement['plan']
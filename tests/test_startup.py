@@ -0,0 +1,26 @@
+"""Lo que importa un worker de la API al arrancar."""
+import os
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+CHECK = "import sys, app; print(app.app.config['ENABLE_ADMIN'], 'flask_admin' in sys.modules)"
+
+
+def import_app(module, **env):
+    environ = {key: value for key, value in os.environ.items() if key != 'ENABLE_ADMIN'}
+    environ.update(env)
+    code = CHECK if module == 'app' else f"import {module}; " + CHECK
+    result = subprocess.run([sys.executable, '-c', code], cwd=SRC, env=environ,
+                            capture_output=True, text=True, check=True)
+    return result.stdout.split()
+
+
+def test_admin_is_opt_in():
+    assert import_app('app') == ['False', 'False']
+    assert import_app('app', ENABLE_ADMIN='1') == ['True', 'True']
+
+
+def test_wsgi_admin_enables_admin():
+    assert import_app('wsgi_admin') == ['True', 'True']